@@ -0,0 +1,864 @@
+"""
+Asyncio serving mode for the API
+Same core routes as app.py, served by Quart with the motor async MongoDB driver and
+async Gemini calls, so slow LLM-bound requests share one event loop instead of
+each holding a worker thread. Independent steps inside a request run concurrently.
+
+Run with: hypercorn async_app:app --bind 0.0.0.0:5000
+Bulk import/update endpoints are only served by the synchronous app.
+The synchronous Flask app (app.py / index.py) is unchanged and still available.
+"""
+import asyncio
+import math
+import os
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+from quart import Quart, request, jsonify
+from quart_cors import cors
+
+from utils.db import get_async_db, with_profile
+from utils.auth import hash_password, verify_password, generate_token, get_user_from_token
+from utils.fields import parse_fields, projection_for, select_fields, response_doc, PROVIDER_PROJECTION
+from utils.helpers import format_service_response, calculate_distance, nearest_services, build_service_doc, build_service_update, service_update_pipeline, budget_filter, service_response_doc, price_error
+from utils.geohash import geo_cells, cell_query
+from utils.cache import search_cache, search_cache_key, quantize_location, cell_margin_km, get_catalog_version_async, provider_scope, district_scope
+from utils.conditional import make_etag, etag_matches, etag_headers, not_modified
+from utils.catalog import service_changed_async, service_deleted_async, service_slots_changed_async
+from utils.gazetteer import place_ids_async, user_place_ids_async
+from utils.suggestions import get_suggestions_doc_async
+from utils.autocomplete import autocomplete_async, KINDS, AUTOCOMPLETE_MAX_LIMIT
+from utils.slots import parse_window, window_filter, mark_slots_async, free_windows, SLOT_HORIZON_DAYS
+from utils.admission import ai_search_retry_after
+from utils.singleflight import intent_flight_async, candidates_flight_async, normalize_query
+from utils.ai import extract_intent_async, generate_explanation_async, generate_summary
+from utils.ranking import rank_results, AI_EXPLAIN_TOP_K
+from datetime import datetime
+from bson import ObjectId
+from pymongo import ReturnDocument
+from utils.json_provider import FastJSONProvider
+from utils.metrics import init_metrics_async, metrics_authorized, metrics_text
+from utils.compression import init_compression_async
+
+app = Quart(__name__)
+app.json = FastJSONProvider(app)  # encodes ObjectId/datetime natively
+app = cors(app, allow_origin='*')
+
+# Per-request timings: Server-Timing header and /api/metrics histograms
+init_metrics_async(app)
+
+# Compress large responses (gzip/brotli, negotiated)
+init_compression_async(app)
+
+
+async def _providers_by_id(db, provider_ids):
+    """Providers of the given ids in one query, keyed by id"""
+    provider_ids = list(set(provider_ids))
+    if not provider_ids:
+        return {}
+    providers = await db.users.find({'_id': {'$in': provider_ids}}, PROVIDER_PROJECTION).to_list(length=None)
+    return {provider['_id']: provider for provider in providers}
+
+
+async def _find_providers(db, services):
+    """Load the provider of each service concurrently, in the same order"""
+    return await asyncio.gather(*[
+        db.users.find_one({'_id': ObjectId(service['providerId'])})
+        for service in services
+    ])
+
+
+# Test route
+@app.route('/api/test', methods=['GET'])
+async def test():
+    db = await get_async_db()
+    if db is not None:
+        return jsonify({'message': 'API is working!', 'db_connected': True}), 200
+    return jsonify({'message': 'API is working but DB not connected', 'db_connected': False}), 200
+
+# Prometheus metrics (per-route request, db, llm, auth and serialize histograms)
+@app.route('/api/metrics', methods=['GET'])
+async def metrics():
+    if not metrics_authorized():
+        return jsonify({'message': 'Unauthorized'}), 401
+    return metrics_text(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+# Auth routes
+@app.route('/api/auth/register', methods=['POST', 'OPTIONS'])
+async def register():
+    if request.method == 'OPTIONS':
+        return '', 200
+
+    try:
+        db = await get_async_db('write_majority')
+        if db is None:
+            return jsonify({'message': 'Database connection failed'}), 500
+
+        data = await request.get_json()
+
+        required_fields = ['name', 'email', 'password', 'phone', 'village', 'district', 'role']
+        for field in required_fields:
+            if not data.get(field):
+                return jsonify({'message': f'{field} is required'}), 400
+
+        # bcrypt is CPU-bound: hash in a thread while the duplicate check runs
+        existing, hashed_password = await asyncio.gather(
+            db.users.find_one({'email': data['email']}),
+            asyncio.to_thread(hash_password, data['password'])
+        )
+        if existing:
+            return jsonify({'message': 'User already exists'}), 400
+
+        user_doc = {
+            'name': data['name'],
+            'email': data['email'],
+            'password': hashed_password,
+            'phone': data['phone'],
+            'village': data['village'],
+            'district': data['district'],
+            'role': data['role'],
+            'createdAt': datetime.utcnow()
+        }
+        user_doc.update(await place_ids_async(db, data['village'], data['district']))
+
+        # Optional home location, also stored as geohash cells for proximity lookups
+        if data.get('latitude') and data.get('longitude'):
+            home_lat = float(data['latitude'])
+            home_lng = float(data['longitude'])
+            user_doc['location'] = {'type': 'Point', 'coordinates': [home_lng, home_lat]}
+            user_doc['geoCells'] = geo_cells(home_lat, home_lng)
+
+        result = await db.users.insert_one(user_doc)
+        token = generate_token(result.inserted_id, data['email'], data['role'])
+
+        user_doc['_id'] = result.inserted_id
+        del user_doc['password']
+
+        return jsonify({
+            'message': 'Registration successful',
+            'token': token,
+            'user': response_doc(user_doc)
+        }), 201
+
+    except Exception as e:
+        return jsonify({'message': str(e)}), 500
+
+@app.route('/api/auth/login', methods=['POST', 'OPTIONS'])
+async def login():
+    if request.method == 'OPTIONS':
+        return '', 200
+
+    try:
+        db = await get_async_db()
+        if db is None:
+            return jsonify({'message': 'Database connection failed'}), 500
+
+        data = await request.get_json()
+        if not data.get('email') or not data.get('password'):
+            return jsonify({'message': 'Email and password are required'}), 400
+
+        user = await db.users.find_one({'email': data['email']})
+        if not user or not await asyncio.to_thread(verify_password, data['password'], user['password']):
+            return jsonify({'message': 'Invalid credentials'}), 401
+
+        token = generate_token(user['_id'], user['email'], user['role'])
+        user_doc = {
+            '_id': user['_id'],
+            'name': user['name'],
+            'email': user['email'],
+            'phone': user['phone'],
+            'village': user['village'],
+            'district': user['district'],
+            'role': user['role']
+        }
+
+        return jsonify({
+            'message': 'Login successful',
+            'token': token,
+            'user': user_doc
+        }), 200
+
+    except Exception as e:
+        return jsonify({'message': str(e)}), 500
+
+@app.route('/api/users/me', methods=['GET', 'OPTIONS'])
+async def get_current_user():
+    if request.method == 'OPTIONS':
+        return '', 200
+
+    try:
+        db = await get_async_db()
+        if db is None:
+            return jsonify({'message': 'Database connection failed'}), 500
+
+        payload = get_user_from_token(request)
+        if not payload:
+            return jsonify({'message': 'Unauthorized'}), 401
+
+        user = await db.users.find_one({'_id': ObjectId(payload['user_id'])})
+        if not user:
+            return jsonify({'message': 'User not found'}), 404
+
+        user_doc = {
+            '_id': user['_id'],
+            'name': user['name'],
+            'email': user['email'],
+            'phone': user['phone'],
+            'village': user['village'],
+            'district': user['district'],
+            'role': user['role']
+        }
+
+        return jsonify(user_doc), 200
+
+    except Exception as e:
+        return jsonify({'message': str(e)}), 500
+
+# Services routes
+@app.route('/api/services/search', methods=['GET', 'OPTIONS'])
+async def search_services():
+    if request.method == 'OPTIONS':
+        return '', 200
+
+    try:
+        db = await get_async_db('read_secondary')
+        if db is None:
+            return jsonify({'message': 'Database connection failed'}), 500
+
+        lat = float(request.args.get('lat', 0))
+        lng = float(request.args.get('lng', 0))
+        radius = float(request.args.get('radius', 10))
+        service_type = request.args.get('type', '')
+        search_term = request.args.get('search', '').lower()
+        fields = parse_fields(request.args.get('fields'))
+
+        if not lat or not lng:
+            return jsonify({'message': 'Location coordinates are required'}), 400
+
+        # Optional availability window: only services with every hour of it marked free
+        window = None
+        if request.args.get('from') or request.args.get('to'):
+            try:
+                window = parse_window(request.args.get('from'), request.args.get('to'))
+            except (TypeError, ValueError) as e:
+                return jsonify({'message': f'Invalid availability window: {e}'}), 400
+        slot_filter = window_filter(window) if window else {}
+
+        # Provider lookup and distance always need providerId/location; the search term needs the place names
+        projection = projection_for(fields, ['providerId', 'location'] + (['village', 'district'] if search_term else []))
+
+        # Rows are cached per location cell; distances are recomputed below for the exact caller
+        version = await get_catalog_version_async(db)
+        cache_key = search_cache_key(lat, lng, radius, service_type, search_term, version) + (fields, window)
+        rows = search_cache.get(cache_key)
+
+        if rows is None:
+            # Widen the radius by one cell diagonal so the rows cover any caller in this cell
+            max_distance = radius + cell_margin_km()
+            cell_filter = cell_query(lat, lng, max_distance)
+
+            if cell_filter:
+                # Small radius: indexed equality on geohash cells, ranked in-process
+                query = {'available': True, **cell_filter, **slot_filter}
+                if service_type:
+                    query['type'] = service_type
+                services = await db.services.find(query, projection).to_list(length=None)
+                services = nearest_services(services, lat, lng, max_distance, 50)
+            else:
+                query = {
+                    'available': True,
+                    'location': {
+                        '$near': {
+                            '$geometry': {
+                                'type': 'Point',
+                                'coordinates': [lng, lat]
+                            },
+                            '$maxDistance': max_distance * 1000
+                        }
+                    }
+                }
+
+                if service_type:
+                    query['type'] = service_type
+                query.update(slot_filter)
+
+                services = await db.services.find(query, projection).limit(50).to_list(length=50)
+
+            providers = await _find_providers(db, services)
+
+            rows = []
+            for service, provider in zip(services, providers):
+                if not provider:
+                    continue
+
+                service_data = format_service_response(service)
+                service_data['providerName'] = provider.get('name', 'Unknown')
+                service_data['phone'] = provider.get('phone', '')
+
+                if search_term and not (search_term in service_data['providerName'].lower() or
+                                        search_term in service_data['village'].lower() or
+                                        search_term in service_data['district'].lower()):
+                    continue
+
+                rows.append((service_data, service['location']['coordinates']))
+
+            search_cache.set(cache_key, rows)
+
+        results = []
+        for service_data, coordinates in rows:
+            distance = calculate_distance(lat, lng, coordinates[1], coordinates[0])
+            if distance <= radius:
+                results.append(dict(service_data, distance=distance))
+
+        results.sort(key=lambda x: x.get('distance', float('inf')))
+        return jsonify([select_fields(service_data, fields) for service_data in results]), 200
+
+    except Exception as e:
+        return jsonify({'message': str(e)}), 500
+
+@app.route('/api/services/suggestions', methods=['GET', 'OPTIONS'])
+async def get_suggestions():
+    """Get auto-suggested providers based on customer's location"""
+    if request.method == 'OPTIONS':
+        return '', 200
+
+    try:
+        db = await get_async_db('read_secondary')
+        if db is None:
+            return jsonify({'message': 'Database connection failed'}), 500
+
+        payload = get_user_from_token(request)
+        if not payload:
+            return jsonify({'message': 'Unauthorized'}), 401
+
+        # Get current user's location
+        user = await db.users.find_one({'_id': ObjectId(payload['user_id'])})
+        if not user:
+            return jsonify({'message': 'User not found'}), 404
+
+        user_village = user.get('village', '')
+        user_district = user.get('district', '')
+
+        # One precomputed document per (village, district), shared with the sync app
+        place = await user_place_ids_async(db, user)
+        doc = await get_suggestions_doc_async(db, place['villageId'], place['districtId'])
+        etag = make_etag('suggestions', place['villageId'], place['districtId'], doc['revision'])
+        if etag_matches(etag):
+            return not_modified(etag)
+
+        # Same location first, then nearby, one service per provider
+        suggestions = []
+        seen_providers = set()
+        tiers = (
+            ('same_location', doc['sameLocation'][:10]),
+            ('nearby', doc['nearby'][:10])
+        )
+        for match_type, entries in tiers:
+            for entry in entries:
+                if entry['providerId'] in seen_providers:
+                    continue
+                seen_providers.add(entry['providerId'])
+                if match_type == 'same_location':
+                    match_text = 'Same Location - ' + user_village
+                else:
+                    match_text = 'Nearby - ' + entry.get('village', '') + ', ' + user_district
+                suggestions.append({
+                    '_id': entry['_id'],
+                    'type': entry.get('type', ''),
+                    'providerName': entry.get('providerName', 'Unknown'),
+                    'phone': entry.get('phone', ''),
+                    'village': entry.get('village', ''),
+                    'district': entry.get('district', ''),
+                    'pricePerHour': entry.get('pricePerHour'),
+                    'pricePerTrip': entry.get('pricePerTrip'),
+                    'description': entry.get('description', ''),
+                    'matchType': match_type,
+                    'matchText': match_text
+                })
+
+        return jsonify({
+            'suggestions': suggestions,
+            'userLocation': {
+                'village': user_village,
+                'district': user_district
+            },
+            'total': len(suggestions)
+        }), 200, etag_headers(etag)
+
+    except Exception as e:
+        return jsonify({'message': str(e)}), 500
+
+@app.route('/api/providers/nearby', methods=['GET', 'OPTIONS'])
+async def get_nearby_providers():
+    """Get nearby providers mapped to customer's location"""
+    if request.method == 'OPTIONS':
+        return '', 200
+
+    try:
+        db = await get_async_db('read_secondary')
+        if db is None:
+            return jsonify({'message': 'Database connection failed'}), 500
+
+        payload = get_user_from_token(request)
+        if not payload:
+            return jsonify({'message': 'Unauthorized'}), 401
+
+        # Get current user (customer)
+        customer = await db.users.find_one({'_id': ObjectId(payload['user_id'])})
+        if not customer:
+            return jsonify({'message': 'User not found'}), 404
+
+        customer_village = customer.get('village', '')
+        customer_district = customer.get('district', '')
+        place = await user_place_ids_async(db, customer)
+        service_type = request.args.get('type', '')  # Optional filter by service type
+        fields = parse_fields(request.args.get('fields'))  # Optional sparse fieldset for services
+
+        version = await get_catalog_version_async(db, district_scope(place['districtId']))
+        etag = make_etag('nearby', place['villageId'], place['districtId'], version, request.query_string)
+        if etag_matches(etag):
+            return not_modified(etag)
+
+        # Build query
+        query = {
+            'available': True,
+            'districtId': place['districtId']  # Same district
+        }
+
+        if service_type:
+            query['type'] = service_type
+
+        # Get all services in same district
+        services = await db.services.find(query, projection_for(fields, ['providerId'])).to_list(length=None)
+
+        # Load each distinct provider once, concurrently
+        provider_ids = list(dict.fromkeys(str(service['providerId']) for service in services))
+        providers = await asyncio.gather(*[
+            db.users.find_one({'_id': ObjectId(provider_id)})
+            for provider_id in provider_ids
+        ])
+
+        # Group by provider and format
+        providers_map = {}
+        for provider_id, provider in zip(provider_ids, providers):
+            if provider:
+                providers_map[provider_id] = {
+                    'providerId': provider_id,
+                    'providerName': provider.get('name', 'Unknown'),
+                    'phone': provider.get('phone', ''),
+                    'email': provider.get('email', ''),
+                    'village': provider.get('village', ''),
+                    'district': provider.get('district', ''),
+                    'isSameVillage': provider.get('villageId') == place['villageId'],
+                    'services': []
+                }
+
+        for service in services:
+            provider_id = str(service['providerId'])
+            if provider_id not in providers_map:
+                continue
+
+            # Add service to provider
+            providers_map[provider_id]['services'].append(select_fields({
+                '_id': service['_id'],
+                'type': service.get('type', ''),
+                'pricePerHour': service.get('pricePerHour'),
+                'pricePerTrip': service.get('pricePerTrip'),
+                'description': service.get('description', ''),
+                'available': service.get('available', True)
+            }, fields))
+
+        # Convert to list and sort (same village first)
+        providers_list = list(providers_map.values())
+        providers_list.sort(key=lambda x: (not x['isSameVillage'], x['providerName']))
+
+        return jsonify({
+            'providers': providers_list,
+            'customerLocation': {
+                'village': customer_village,
+                'district': customer_district
+            },
+            'total': len(providers_list)
+        }), 200, etag_headers(etag)
+
+    except Exception as e:
+        return jsonify({'message': str(e)}), 500
+
+@app.route('/api/locations/autocomplete', methods=['GET', 'OPTIONS'])
+async def autocomplete_locations():
+    """Suggest village and district names for a typed prefix, served from memory"""
+    if request.method == 'OPTIONS':
+        return '', 200
+
+    try:
+        text = request.args.get('q', '')
+        kind = request.args.get('kind') or None
+        if kind and kind not in KINDS:
+            return jsonify({'message': f"kind must be one of: {', '.join(KINDS)}"}), 400
+        try:
+            limit = min(int(request.args.get('limit', 10)), AUTOCOMPLETE_MAX_LIMIT)
+        except ValueError:
+            return jsonify({'message': 'limit must be an integer'}), 400
+
+        results = await autocomplete_async(lambda: get_async_db('read_secondary'), text, max(limit, 1), kind,
+                                           request.args.get('district'))
+        return jsonify({
+            'query': text,
+            'results': results,
+            'total': len(results)
+        }), 200
+
+    except Exception as e:
+        return jsonify({'message': str(e)}), 500
+
+@app.route('/api/services', methods=['POST', 'OPTIONS'])
+async def create_service():
+    if request.method == 'OPTIONS':
+        return '', 200
+
+    try:
+        db = await get_async_db('write_majority')
+        if db is None:
+            return jsonify({'message': 'Database connection failed'}), 500
+
+        payload = get_user_from_token(request)
+        if not payload:
+            return jsonify({'message': 'Unauthorized'}), 401
+
+        if payload['role'] != 'provider':
+            return jsonify({'message': 'Only providers can create services'}), 403
+
+        data = await request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({'message': 'Invalid request body'}), 400
+        if not data.get('type'):
+            return jsonify({'message': 'Service type is required'}), 400
+        error = price_error(data)
+        if error:
+            return jsonify({'message': error}), 400
+
+        user = await db.users.find_one({'_id': ObjectId(payload['user_id'])})
+        if not user:
+            return jsonify({'message': 'User not found'}), 404
+        user.update(await user_place_ids_async(db, user))
+
+        service_doc = build_service_doc(data, user)
+
+        result = await db.services.insert_one(service_doc)
+        await service_changed_async(db, service_doc)
+
+        return jsonify({
+            'message': 'Service created successfully',
+            'service': service_response_doc(service_doc)
+        }), 201
+
+    except Exception as e:
+        return jsonify({'message': str(e)}), 500
+
+@app.route('/api/services/my-services', methods=['GET', 'OPTIONS'])
+async def get_my_services():
+    if request.method == 'OPTIONS':
+        return '', 200
+
+    try:
+        db = await get_async_db()
+        if db is None:
+            return jsonify({'message': 'Database connection failed'}), 500
+
+        payload = get_user_from_token(request)
+        if not payload:
+            return jsonify({'message': 'Unauthorized'}), 401
+
+        fields = parse_fields(request.args.get('fields'))
+
+        # Same provider catalog version means the same list: answer 304 before querying
+        version = await get_catalog_version_async(db, provider_scope(payload['user_id']))
+        etag = make_etag('my-services', payload['user_id'], version, request.query_string)
+        if etag_matches(etag):
+            return not_modified(etag)
+
+        services = await db.services.find({
+            'providerId': ObjectId(payload['user_id'])
+        }, projection_for(fields)).sort('createdAt', -1).to_list(length=None)
+
+        results = []
+        for service in services:
+            service_doc = {
+                '_id': service['_id'],
+                'type': service.get('type', ''),
+                'pricePerHour': service.get('pricePerHour'),
+                'pricePerTrip': service.get('pricePerTrip'),
+                'description': service.get('description', ''),
+                'available': service.get('available', True),
+                'village': service.get('village', ''),
+                'district': service.get('district', ''),
+                'createdAt': service.get('createdAt')
+            }
+            results.append(select_fields(service_doc, fields))
+
+        return jsonify(results), 200, etag_headers(etag)
+
+    except Exception as e:
+        return jsonify({'message': str(e)}), 500
+
+@app.route('/api/services/<service_id>', methods=['PATCH', 'DELETE', 'OPTIONS'])
+async def update_or_delete_service(service_id):
+    if request.method == 'OPTIONS':
+        return '', 200
+
+    try:
+        db = await get_async_db('write_majority')
+        if db is None:
+            return jsonify({'message': 'Database connection failed'}), 500
+
+        payload = get_user_from_token(request)
+        if not payload:
+            return jsonify({'message': 'Unauthorized'}), 401
+
+        # Ownership is part of the write filter, so checking and writing is one round trip
+        owned_filter = {'_id': ObjectId(service_id), 'providerId': ObjectId(payload['user_id'])}
+
+        if request.method == 'PATCH':
+            data = await request.get_json(silent=True)
+            if not isinstance(data, dict):
+                return jsonify({'message': 'Invalid request body'}), 400
+            error = price_error(data)
+            if error:
+                return jsonify({'message': error}), 400
+            if set(data) == {'available'}:
+                db = with_profile(db, 'write_fast')  # a bare availability toggle skips majority
+            update_doc = build_service_update(data)
+            service = await db.services.find_one_and_update(
+                owned_filter,
+                service_update_pipeline(update_doc),
+                return_document=ReturnDocument.AFTER
+            )
+        else:
+            service = await db.services.find_one_and_delete(owned_filter)
+
+        if not service:
+            # Only a failed write pays for telling "not yours" from "missing"
+            if await db.services.count_documents({'_id': ObjectId(service_id)}, limit=1):
+                return jsonify({'message': 'Unauthorized'}), 403
+            return jsonify({'message': 'Service not found'}), 404
+
+        if request.method == 'PATCH':
+            await service_changed_async(db, service)
+            return jsonify({'message': 'Service updated successfully'}), 200
+
+        await service_deleted_async(db, service)
+        return jsonify({'message': 'Service deleted successfully'}), 200
+
+    except Exception as e:
+        return jsonify({'message': str(e)}), 500
+
+@app.route('/api/services/<service_id>/slots', methods=['GET', 'PUT', 'DELETE', 'OPTIONS'])
+async def service_slots(service_id):
+    """Read a service's free hours (GET), or mark (PUT) or unmark (DELETE) a window of them"""
+    if request.method == 'OPTIONS':
+        return '', 200
+
+    try:
+        if request.method == 'GET':
+            db = await get_async_db('read_secondary')
+            if db is None:
+                return jsonify({'message': 'Database connection failed'}), 500
+            
+            service = await db.services.find_one({'_id': ObjectId(service_id)}, {'slots': 1, 'slotsStart': 1})
+            if not service:
+                return jsonify({'message': 'Service not found'}), 404
+            
+            return jsonify({
+                'serviceId': service_id,
+                'horizonDays': SLOT_HORIZON_DAYS,
+                'free': [{'start': start, 'end': end} for start, end in free_windows(service.get('slots'), service.get('slotsStart'))]
+            }), 200
+
+        db = await get_async_db('write_majority')
+        if db is None:
+            return jsonify({'message': 'Database connection failed'}), 500
+
+        payload = get_user_from_token(request)
+        if not payload:
+            return jsonify({'message': 'Unauthorized'}), 401
+
+        data = await request.get_json(silent=True) or {}
+        try:
+            window = parse_window(data.get('start'), data.get('end'))
+        except (TypeError, ValueError) as e:
+            return jsonify({'message': f'Invalid slot window: {e}'}), 400
+
+        owned_filter = {'_id': ObjectId(service_id), 'providerId': ObjectId(payload['user_id'])}
+        service = await mark_slots_async(db, owned_filter, window, free=request.method == 'PUT')
+
+        if service is False:
+            return jsonify({'message': 'Slots are being changed concurrently, please retry'}), 409
+        if not service:
+            if await db.services.count_documents({'_id': ObjectId(service_id)}, limit=1):
+                return jsonify({'message': 'Unauthorized'}), 403
+            return jsonify({'message': 'Service not found'}), 404
+
+        await service_slots_changed_async(db, service)
+        return jsonify({
+            'message': 'Slots updated successfully',
+            'free': [{'start': start, 'end': end} for start, end in free_windows(service.get('slots'), service.get('slotsStart'))]
+        }), 200
+
+    except Exception as e:
+        return jsonify({'message': str(e)}), 500
+
+# Stored fields ranking and explanations read, whatever fields= the client asked for
+AI_SEARCH_FIELDS = ['providerId', 'location', 'type', 'pricePerHour', 'pricePerTrip', 'village', 'district',
+                    'description', 'descriptionVector', 'descriptionVectorVersion']
+
+async def _load_ai_services(db, lat, lng, radius, service_type, budget, fields):
+    """
+    Available services near a location cell, as _load_ai_candidates in app.py
+
+    The radius is widened by one cell diagonal so the services cover any
+    caller in the cell; callers filter by their own distance. Providers are
+    left to the caller, which needs the top ones first.
+    """
+    db_query = {
+        'available': True,
+        'location': {
+            '$near': {
+                '$geometry': {
+                    'type': 'Point',
+                    'coordinates': [lng, lat]
+                },
+                '$maxDistance': (radius + cell_margin_km()) * 1000  # Convert km to meters
+            }
+        }
+    }
+
+    # Add service type filter if extracted
+    if service_type:
+        db_query['type'] = service_type
+
+    # Over-budget services never count against the limit
+    if budget:
+        db_query.update(budget_filter(budget))
+
+    return await db.services.find(db_query, projection_for(fields, AI_SEARCH_FIELDS)).limit(50).to_list(length=50)
+
+@app.route('/api/services/ai-search', methods=['POST', 'OPTIONS'])
+async def ai_search_services():
+    """AI-powered natural language service search"""
+    if request.method == 'OPTIONS':
+        return '', 200
+
+    # Per-user and per-IP token buckets keep one client from monopolising the LLM
+    retry_after = ai_search_retry_after(request)
+    if retry_after:
+        return jsonify({'message': 'Too many AI searches, please try again shortly'}), 429, {'Retry-After': str(math.ceil(retry_after))}
+
+    try:
+        data = await request.get_json()
+        if not data or not data.get('query'):
+            return jsonify({'message': 'Query is required'}), 400
+
+        query_text = data.get('query', '').strip()
+        lat = float(data.get('location', {}).get('lat', 0))
+        lng = float(data.get('location', {}).get('lng', 0))
+        radius = float(data.get('radius', 50))  # Default 50km
+        fields = parse_fields(request.args.get('fields') or data.get('fields'))
+
+        if not lat or not lng:
+            return jsonify({'message': 'Location coordinates are required'}), 400
+
+        # Intent extraction (LLM) and connection setup are independent
+        db, extracted_intent = await asyncio.gather(
+            get_async_db('read_secondary'),
+            # Identical queries in flight share one LLM call
+            intent_flight_async.do(normalize_query(query_text), lambda: extract_intent_async(query_text))
+        )
+        if db is None:
+            return jsonify({'message': 'Database connection failed'}), 500
+
+        # Callers in the same location cell with the same intent share one geo query
+        service_type = extracted_intent.get('serviceType') or ''
+        customer_budget = extracted_intent.get('budget')
+        services = await candidates_flight_async.do(
+            (quantize_location(lat, lng), radius, service_type, customer_budget, fields),
+            lambda: _load_ai_services(db, lat, lng, radius, service_type, customer_budget, fields)
+        )
+
+        results = []
+        documents = []
+        provider_ids = {}
+        for service in services:
+            service_data = format_service_response(service, lat, lng)
+            if service_data.get('distance', 0) > radius:
+                continue
+            provider_ids[service_data['_id']] = ObjectId(service['providerId'])
+            results.append(service_data)
+            documents.append(service)
+
+        # Score every candidate, query text against descriptions included. Scores
+        # do not depend on the provider, so ranking comes before provider lookups.
+        ranked = rank_results(results, extracted_intent, query_text, documents)
+
+        # The explanations need only the top results' providers; the rest are
+        # looked up while the LLM calls run. Services without a provider are dropped.
+        providers = {}
+        top_results = []
+        position = 0
+        while len(top_results) < AI_EXPLAIN_TOP_K and position < len(ranked):
+            batch = ranked[position:position + AI_EXPLAIN_TOP_K - len(top_results)]
+            position += len(batch)
+            providers.update(await _providers_by_id(db, [provider_ids[service_data['_id']] for service_data in batch]))
+            top_results.extend(service_data for service_data in batch if provider_ids[service_data['_id']] in providers)
+        for service_data in top_results:
+            provider = providers[provider_ids[service_data['_id']]]
+            service_data['providerName'] = provider.get('name', 'Unknown')
+            service_data['phone'] = provider.get('phone', '')
+
+        explanations, rest_providers = await asyncio.gather(
+            asyncio.gather(
+                *[generate_explanation_async(service_data, extracted_intent) for service_data in top_results],
+                return_exceptions=True
+            ),
+            _providers_by_id(db, [provider_ids[service_data['_id']] for service_data in ranked[position:]])
+        )
+        for service_data, explanation in zip(top_results, explanations):
+            if isinstance(explanation, Exception):
+                print(f"Error generating explanation: {explanation}")
+                service_data['aiExplanation'] = "Good match based on location and availability."
+                continue
+            service_data['aiExplanation'] = explanation
+
+        # Add explanations to remaining results (simple)
+        results = list(top_results)
+        for service_data in ranked[position:]:
+            provider = rest_providers.get(provider_ids[service_data['_id']])
+            if not provider:
+                continue
+            service_data['providerName'] = provider.get('name', 'Unknown')
+            service_data['phone'] = provider.get('phone', '')
+            service_data['aiExplanation'] = "Good match based on location and availability."
+            results.append(service_data)
+
+        # Generate summary
+        summary = generate_summary(results, extracted_intent)
+
+        return jsonify({
+            'extractedIntent': extracted_intent,
+            'results': [select_fields(service_data, fields) for service_data in results],
+            'summary': summary,
+            'total': len(results)
+        }), 200
+
+    except Exception as e:
+        print(f"AI search error: {e}")
+        return jsonify({'message': str(e)}), 500
+
+if __name__ == '__main__':
+    print("🚀 Starting async (Quart) server...")
+    print("   For production use: hypercorn async_app:app --bind 0.0.0.0:5000")
+    print()
+
+    port = int(os.getenv('PORT', 5000))
+    app.run(debug=True, host='0.0.0.0', port=port)
@@ -0,0 +1,143 @@
+"""
+Benchmark the local description embeddings: recall and latency
+Usage: python -m benchmarks.bench_embeddings [--sizes 1000 10000] [--dims 64 128 256 512] [--queries 50]
+
+Recall@K compares the hashed float32 vectors against exact cosine similarity
+over the same, unhashed features, so it measures what hashing into `dim`
+buckets loses; a hashed hit counts if its exact score ties the exact K-th.
+Latency covers embedding a query, scoring ai-search's 50 candidates from
+their stored bytes, and a brute-force scan of the whole catalog.
+"""
+import argparse
+import math
+import random
+from collections import defaultdict
+
+import numpy as np
+
+from utils.embeddings import embed, feature_weight, features, pack
+from benchmarks.common import SERVICE_TYPES, measure, print_table
+
+K = 10
+CANDIDATES = 50
+
+PURPOSES = ['plowing', 'ploughing', 'harvesting', 'sowing', 'levelling', 'transport', 'digging', 'spraying',
+            'threshing', 'irrigation', 'land clearing', 'loading']
+CROPS = ['rice', 'paddy', 'wheat', 'cotton', 'maize', 'sugarcane', 'chilli', 'groundnut', 'turmeric', 'soybean']
+EQUIPMENT = ['rotavator', 'cultivator', 'disc harrow', 'trolley', 'seed drill', 'sprayer', 'bucket', 'breaker',
+             'thresher', 'water tanker', 'combine harvester', 'laser leveller']
+EXTRAS = ['experienced driver', 'available on weekends', 'night work possible', 'diesel included',
+          'per acre pricing', 'same day service', 'new machine', 'women operators', 'cash or UPI',
+          'free transport within village', 'large fields only', 'small plots welcome']
+
+
+def synthetic_description(rng):
+    parts = [
+        f"{rng.choice(SERVICE_TYPES).replace('_', ' ')} with {rng.choice(EQUIPMENT)}",
+        f"for {rng.choice(PURPOSES)} of {rng.choice(CROPS)} fields",
+    ]
+    parts.extend(rng.sample(EXTRAS, rng.randint(0, 3)))
+    if rng.random() < 0.5:
+        parts.append(f"{rng.randint(2, 25)} years experience")
+    return ', '.join(parts)
+
+
+def synthetic_query(rng):
+    words = [rng.choice(['need', 'looking for', 'want', 'urgent']), rng.choice(EQUIPMENT + SERVICE_TYPES[:2])]
+    words.append(f"for {rng.choice(PURPOSES)}")
+    if rng.random() < 0.7:
+        words.append(rng.choice(CROPS))
+    if rng.random() < 0.3:
+        words.append(rng.choice(EXTRAS))
+    return ' '.join(words)
+
+
+def exact_vectors(texts):
+    """Unhashed, L2-normalized sparse feature vectors"""
+    vectors = []
+    for text in texts:
+        weights = {feature: feature_weight(count) for feature, count in features(text).items()}
+        norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+        vectors.append({feature: w / norm for feature, w in weights.items()})
+    return vectors
+
+
+def exact_scores(query_vector, postings, size):
+    """Exact cosine of one query against every document, via an inverted index"""
+    scores = np.zeros(size)
+    for feature, weight in query_vector.items():
+        for row, doc_weight in postings.get(feature, ()):
+            scores[row] += weight * doc_weight
+    return scores
+
+
+def top_k(scores, k):
+    rows = np.argpartition(-scores, k)[:k]
+    return rows[np.argsort(-scores[rows])]
+
+
+def recall_at_k(corpus_exact, query_texts, matrix, dim):
+    postings = defaultdict(list)
+    for row, vector in enumerate(corpus_exact):
+        for feature, weight in vector.items():
+            postings[feature].append((row, weight))
+
+    recalls = []
+    for query_vector, text in zip(exact_vectors(query_texts), query_texts):
+        exact = exact_scores(query_vector, postings, len(corpus_exact))
+        threshold = np.sort(exact)[-K]
+        hashed = matrix @ np.asarray(embed(text, dim), dtype=np.float32)
+        hits = top_k(hashed, K)
+        recalls.append(float(np.mean(exact[hits] >= threshold - 1e-9)))
+    return float(np.mean(recalls))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--dims', type=int, nargs='+', default=[64, 128, 256, 512])
+    parser.add_argument('--queries', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    query_texts = [synthetic_query(rng) for _ in range(args.queries)]
+    query = iter(query_texts * (args.repeat * 4))
+
+    recall_rows = []
+    latency_rows = []
+    for size in args.sizes:
+        texts = [synthetic_description(rng) for _ in range(size)]
+        corpus_exact = exact_vectors(texts)
+
+        for dim in args.dims:
+            blobs = [pack(embed(text, dim)) for text in texts]
+            matrix = np.frombuffer(b''.join(blobs), dtype='<f4').reshape(size, dim)
+            recall_rows.append({'services': size, 'dim': dim, 'bytes/vector': dim * 4,
+                                f'recall@{K}': f'{recall_at_k(corpus_exact, query_texts, matrix, dim):.3f}'})
+
+            candidates = blobs[:CANDIDATES]
+
+            def embed_query():
+                embed(next(query), dim)
+
+            def score_candidates():
+                q = np.asarray(embed(next(query), dim), dtype=np.float32)
+                np.frombuffer(b''.join(candidates), dtype='<f4').reshape(len(candidates), dim) @ q
+
+            def scan_catalog():
+                q = np.asarray(embed(next(query), dim), dtype=np.float32)
+                top_k(matrix @ q, K)
+
+            for name, fn in (('embed query', embed_query), (f'score {CANDIDATES} candidates', score_candidates),
+                             ('scan catalog, top 10', scan_catalog)):
+                stats = measure(fn, args.repeat)
+                latency_rows.append({'services': size, 'dim': dim, 'operation': name,
+                                     'p50_us': stats['p50_us'], 'p95_us': stats['p95_us']})
+
+    print_table(f"Recall@{K} of hashed vectors vs exact cosine", recall_rows)
+    print_table("Latency (query embedding included in scoring and scan)", latency_rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+"""
+Microbenchmarks for the per-request helper functions
+Usage: python -m benchmarks.bench_helpers [--sizes 1 50 500] [--save-baseline]
+                                          [--baseline PATH] [--tolerance 0.25]
+
+Each case is timed over a batch of `size` inputs. With --save-baseline the
+results are written to the baseline file; otherwise they are compared with
+it and the run exits non-zero if any case is slower than the tolerance allows.
+Baselines are machine specific: record them on the machine that compares.
+"""
+import argparse
+import os
+import random
+import sys
+from datetime import datetime
+
+from utils.ai import _extract_intent_fallback, _normalize_intent, _generate_explanation_fallback, generate_summary
+from utils.auth import generate_token, verify_token, hash_password
+from utils.helpers import calculate_distance, format_service_response
+from benchmarks.common import (
+    measure, synthetic_services, print_table, save_baseline, load_baseline, compare_to_baseline
+)
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), 'baselines', 'helpers.json')
+
+QUERIES = [
+    'Need tractor for plowing 5 acres of rice field urgently, budget 800',
+    'jcb for digging this week',
+    'auto to carry cotton to market, price 300',
+    'farm service for wheat harvest next month 12 acres',
+    'I want a tractor now',
+]
+
+# bcrypt is deliberately slow; keep its batches small
+HASH_SIZES = (1, 4)
+
+
+def _long_query(rng, words):
+    """A query padded with filler words, to see how extraction scales with length"""
+    filler = ['please', 'my', 'field', 'near', 'village', 'road', 'good', 'quickly']
+    return ' '.join([rng.choice(QUERIES)] + [rng.choice(filler) for _ in range(words)])
+
+
+def build_cases(size, rng):
+    """(name, fn) pairs that each process `size` inputs per call"""
+    services = synthetic_services(size, seed=size)
+    for service in services:
+        service['createdAt'] = datetime(2024, 6, 1, 12, 30)
+    points = [(17.97 + rng.uniform(-1, 1), 79.59 + rng.uniform(-1, 1)) for _ in range(size)]
+    queries = [_long_query(rng, rng.randrange(0, 40)) for _ in range(size)]
+    intents = [_extract_intent_fallback(query) for query in queries]
+    rows = [dict(format_service_response(s, 17.9, 79.5), providerName='Provider') for s in services]
+    tokens = [generate_token(s['providerId'], f'user{i}@example.com', 'provider') for i, s in enumerate(services)]
+
+    def distance():
+        for (lat, lng), service in zip(points, services):
+            lng2, lat2 = service['location']['coordinates']
+            calculate_distance(lat, lng, lat2, lng2)
+
+    def format_rows():
+        for service in services:
+            format_service_response(service, 17.9, 79.5)
+
+    def extract_intent():
+        for query in queries:
+            _extract_intent_fallback(query)
+
+    def normalize_intent():
+        for intent in intents:
+            _normalize_intent(intent)
+
+    def summary():
+        generate_summary(rows, intents[0])
+
+    def explanation():
+        for row, intent in zip(rows, intents):
+            _generate_explanation_fallback(row, intent)
+
+    def issue_tokens():
+        for i, service in enumerate(services):
+            generate_token(service['providerId'], f'user{i}@example.com', 'provider')
+
+    def check_tokens():
+        for token in tokens:
+            verify_token(token)
+
+    return [
+        ('calculate_distance', distance),
+        ('format_service_response', format_rows),
+        ('_extract_intent_fallback', extract_intent),
+        ('_normalize_intent', normalize_intent),
+        ('generate_summary', summary),
+        ('_generate_explanation_fallback', explanation),
+        ('generate_token', issue_tokens),
+        ('verify_token', check_tokens),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 50, 500])
+    parser.add_argument('--repeat', type=int, default=100)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help='record this run as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed p50 slowdown (0.25 = 25%%)')
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    results = {}
+    for size in args.sizes:
+        repeat = args.repeat if size <= 50 else max(args.repeat // 5, 10)
+        for name, fn in build_cases(size, rng):
+            results[f'{name}[{size}]'] = measure(fn, repeat)
+
+    for size in HASH_SIZES:
+        passwords = [f'password-{i}' for i in range(size)]
+        results[f'hash_password[{size}]'] = measure(lambda: [hash_password(p) for p in passwords], 5, warmup=1)
+
+    rows = [
+        {'case': case, 'p50_us': stats['p50_us'], 'p95_us': stats['p95_us'], 'runs': stats['runs']}
+        for case, stats in results.items()
+    ]
+    print_table('Helper functions (time per batch)', rows)
+
+    if args.save_baseline:
+        save_baseline(args.baseline, results)
+        print(f'\nBaseline written to {args.baseline}')
+        return
+
+    baseline = load_baseline(args.baseline)
+    if baseline is None:
+        print(f'\nNo baseline at {args.baseline}; run with --save-baseline to record one')
+        return
+
+    regressions = compare_to_baseline(results, baseline, args.tolerance)
+    if not regressions:
+        print(f'\nNo regressions beyond {args.tolerance:.0%} of the baseline ({baseline["recorded"]})')
+        return
+
+    print(f'\nRegressions beyond {args.tolerance:.0%}:')
+    for case, previous, current in regressions:
+        print(f'  {case}: {previous:.1f}us -> {current:.1f}us ({current / previous - 1:+.0%})')
+    sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
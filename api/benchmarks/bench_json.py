@@ -0,0 +1,72 @@
+"""
+Benchmark response serialization for search-shaped payloads
+Usage: python -m benchmarks.bench_json [--sizes 50 5000]
+
+Compares the previous path (formatter builds str()/isoformat() strings, then
+Flask's stdlib provider encodes) with the raw-value formatter encoded by
+FastJSONProvider, with orjson and with its stdlib fallback.
+"""
+import argparse
+import json
+from datetime import datetime
+
+from flask import Flask
+
+import utils.json_provider as json_provider
+from utils.helpers import format_service_response
+from utils.json_provider import FastJSONProvider, json_default
+from benchmarks.common import measure, synthetic_services, print_table
+
+
+def legacy_format(service, user_lat, user_lng):
+    """The formatter as it was before raw values were handed to the encoder"""
+    response = format_service_response(service, user_lat, user_lng)
+    response['_id'] = str(service['_id'])
+    response['createdAt'] = service['createdAt'].isoformat() if service.get('createdAt') else None
+    return response
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[50, 5000])
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    legacy_app = Flask('legacy')
+    fast_app = Flask('fast')
+    fast_app.json = FastJSONProvider(fast_app)
+
+    rows = []
+    for size in args.sizes:
+        services = synthetic_services(size)
+        for service in services:
+            service['createdAt'] = datetime(2024, 6, 1, 12, 30)
+        repeat = args.repeat if size <= 1000 else max(args.repeat // 5, 5)
+
+        def legacy():
+            payload = [legacy_format(s, 17.9, 79.5) for s in services]
+            with legacy_app.app_context():
+                legacy_app.json.response(payload).get_data()
+
+        def fast():
+            payload = [format_service_response(s, 17.9, 79.5) for s in services]
+            with fast_app.app_context():
+                fast_app.json.response(payload).get_data()
+
+        def fast_stdlib():
+            payload = [format_service_response(s, 17.9, 79.5) for s in services]
+            json.dumps(payload, default=json_default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+        results = {'str()+stdlib jsonify': measure(legacy, repeat)}
+        if json_provider.ORJSON_AVAILABLE:
+            results['raw+orjson provider'] = measure(fast, repeat)
+        results['raw+stdlib fallback'] = measure(fast_stdlib, repeat)
+
+        for name, stats in results.items():
+            rows.append({'results': size, 'path': name, 'p50_us': stats['p50_us'], 'p95_us': stats['p95_us']})
+
+    print_table('Format + serialize search results', rows)
+
+
+if __name__ == '__main__':
+    main()
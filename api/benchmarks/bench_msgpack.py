@@ -0,0 +1,61 @@
+"""
+Compare MessagePack with JSON for search-shaped payloads
+Usage: python -m benchmarks.bench_msgpack [--sizes 20 50 500]
+
+Encodes format_service_response rows (as returned by search) both ways and
+reports body size, gzip'd size and encode time.
+"""
+import argparse
+import gzip
+from datetime import datetime
+
+import utils.json_provider as json_provider
+from utils.helpers import format_service_response
+from utils.json_provider import dumps_bytes
+from benchmarks.common import measure, synthetic_services, print_table
+
+
+def search_payload(size):
+    """Rows shaped like a /api/services/search response"""
+    services = synthetic_services(size)
+    payload = []
+    for service in services:
+        service['createdAt'] = datetime(2024, 6, 1, 12, 30)
+        row = format_service_response(service, 17.9, 79.5)
+        row['providerName'] = 'Ramesh Kumar'
+        row['phone'] = '9876543210'
+        payload.append(row)
+    return payload
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[20, 50, 500])
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    if not json_provider.MSGPACK_AVAILABLE:
+        raise SystemExit('msgpack is not installed')
+
+    rows = []
+    for size in args.sizes:
+        payload = search_payload(size)
+        encoders = {'json': dumps_bytes, 'msgpack': json_provider.packb}
+
+        for name, encode in encoders.items():
+            body = encode(payload)
+            stats = measure(lambda: encode(payload), args.repeat)
+            rows.append({
+                'results': size,
+                'format': name,
+                'bytes': len(body),
+                'gzip_bytes': len(gzip.compress(body)),
+                'p50_us': stats['p50_us'],
+                'p95_us': stats['p95_us']
+            })
+
+    print_table('Encode search results (JSON vs MessagePack)', rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+Benchmark the in-process spatial index against MongoDB $near
+Usage: python -m benchmarks.bench_spatial_index [--sizes 1000 10000 100000] [--mongo-uri URI]
+
+Without --mongo-uri only the index (and a brute-force scan for reference) is
+measured. With it, services are seeded into a scratch collection and the same
+queries are run through $near.
+"""
+import argparse
+import random
+
+from utils.helpers import calculate_distance
+from utils.spatial_index import SpatialIndex
+from benchmarks.common import measure, synthetic_services, print_table
+
+RADIUS_KM = 10
+K = 50
+
+
+def brute_force(services, lat, lng, radius_km):
+    hits = []
+    for service in services:
+        lng2, lat2 = service['location']['coordinates']
+        distance = calculate_distance(lat, lng, lat2, lng2)
+        if distance <= radius_km:
+            hits.append((distance, service['_id']))
+    hits.sort()
+    return hits[:K]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--mongo-uri', help='scratch MongoDB to compare against $near')
+    parser.add_argument('--repeat', type=int, default=100)
+    args = parser.parse_args()
+
+    collection = None
+    if args.mongo_uri:
+        from pymongo import MongoClient
+        collection = MongoClient(args.mongo_uri).bench_rural_services.services
+
+    rows = []
+    for size in args.sizes:
+        services = synthetic_services(size)
+        rng = random.Random(size)
+        points = [(17.97 + rng.uniform(-1, 1), 79.59 + rng.uniform(-1, 1)) for _ in range(64)]
+        point = iter(points * (args.repeat * 2))
+
+        index = SpatialIndex()
+        index.load(services)
+
+        def index_radius():
+            lat, lng = next(point)
+            index.radius_query(lat, lng, RADIUS_KM, limit=K)
+
+        def index_knn():
+            lat, lng = next(point)
+            index.nearest(lat, lng, K, max_km=RADIUS_KM)
+
+        def scan():
+            lat, lng = next(point)
+            brute_force(services, lat, lng, RADIUS_KM)
+
+        results = {
+            'index radius': measure(index_radius, args.repeat),
+            'index k-nearest': measure(index_knn, args.repeat),
+        }
+        if size <= 10000:
+            results['brute force'] = measure(scan, min(args.repeat, 20))
+
+        if collection is not None:
+            collection.drop()
+            for start in range(0, size, 5000):
+                collection.insert_many(services[start:start + 5000])
+            collection.create_index([('location', '2dsphere')])
+
+            def near():
+                lat, lng = next(point)
+                list(collection.find({
+                    'available': True,
+                    'location': {'$near': {
+                        '$geometry': {'type': 'Point', 'coordinates': [lng, lat]},
+                        '$maxDistance': RADIUS_KM * 1000
+                    }}
+                }, {'_id': 1}).limit(K))
+
+            results['mongo $near'] = measure(near, args.repeat)
+
+        for name, stats in results.items():
+            rows.append({'services': size, 'query': name, 'p50_us': stats['p50_us'], 'p95_us': stats['p95_us']})
+
+    if collection is not None:
+        collection.drop()
+
+    print_table(f"Radius {RADIUS_KM} km, top {K}", rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""
+Shared helpers for the benchmark scripts
+Run benchmarks from the api/ directory, e.g. python -m benchmarks.bench_spatial_index
+"""
+import json
+import os
+import platform
+import random
+import statistics
+import time
+
+from bson import ObjectId
+
+SERVICE_TYPES = ['tractor', 'jcb', 'auto', 'farm_service']
+
+
+def measure(fn, repeat=200, warmup=5):
+    """Call fn repeatedly and return timing stats in microseconds"""
+    for _ in range(warmup):
+        fn()
+
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1e6)
+
+    samples.sort()
+    return {
+        'mean_us': statistics.fmean(samples),
+        'p50_us': samples[len(samples) // 2],
+        'p95_us': samples[int(len(samples) * 0.95) - 1],
+        'runs': repeat
+    }
+
+
+def synthetic_services(count, center=(17.97, 79.59), spread_deg=1.5, seed=42):
+    """Service documents scattered around a district centre"""
+    rng = random.Random(seed)
+    services = []
+    for i in range(count):
+        lat = center[0] + rng.uniform(-spread_deg, spread_deg)
+        lng = center[1] + rng.uniform(-spread_deg, spread_deg)
+        services.append({
+            '_id': ObjectId(),
+            'providerId': ObjectId(),
+            'type': rng.choice(SERVICE_TYPES),
+            'pricePerHour': rng.choice([None, rng.randrange(300, 2000, 50)]),
+            'pricePerTrip': rng.randrange(100, 1500, 50),
+            'description': f'Service {i}',
+            'available': True,
+            'village': f'Village {i % 200}',
+            'district': 'Warangal',
+            'location': {'type': 'Point', 'coordinates': [lng, lat]}
+        })
+    return services
+
+
+def save_baseline(path, results):
+    """Write benchmark results ({case: stats}) as a JSON baseline"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump({
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'recorded': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'results': results
+        }, f, indent=2, sort_keys=True)
+
+
+def load_baseline(path):
+    """Read a baseline written by save_baseline, or None if there is none"""
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare_to_baseline(results, baseline, tolerance, metric='p50_us', min_delta_us=5.0):
+    """
+    Regressions of `metric` beyond `tolerance` (0.25 = 25% slower)
+
+    Returns (case, baseline_value, current_value) for every case that got
+    slower than allowed; cases missing from the baseline are skipped, and so
+    are slowdowns under min_delta_us, which are timer noise on tiny cases.
+    """
+    regressions = []
+    for case, stats in results.items():
+        previous = baseline['results'].get(case)
+        if previous is None:
+            continue
+        slower_by = stats[metric] - previous[metric]
+        if slower_by > previous[metric] * tolerance and slower_by > min_delta_us:
+            regressions.append((case, previous[metric], stats[metric]))
+    return regressions
+
+
+def print_table(title, rows):
+    """Print benchmark rows as an aligned table"""
+    print(f"\n{title}")
+    if not rows:
+        return
+    headers = list(rows[0])
+    widths = [max(len(h), *(len(_fmt(r[h])) for r in rows)) for h in headers]
+    print('  '.join(h.ljust(w) for h, w in zip(headers, widths)))
+    for row in rows:
+        print('  '.join(_fmt(row[h]).ljust(w) for h, w in zip(headers, widths)))
+
+
+def _fmt(value):
+    return f"{value:.1f}" if isinstance(value, float) else str(value)
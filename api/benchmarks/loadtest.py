@@ -0,0 +1,365 @@
+"""
+End-to-end load test of the Flask app against a seeded local MongoDB
+Usage: python -m benchmarks.loadtest [--services 10000 100000 1000000]
+                                     [--concurrency 16] [--requests 500]
+                                     [--mongo-uri mongodb://localhost:27017]
+
+For each catalog size a scratch database (rural_services_loadtest) is seeded
+with a synthetic state: districts of skewed size, villages clustered around
+district centres, providers owning one to several services, and customers
+living in the villages. The app is then driven in-process from worker
+threads with Gemini replaced by a stub, and every endpoint reports
+p50/p95/p99 latency, throughput and MongoDB commands per request.
+
+Seeded data is reused when the database already holds the requested size;
+pass --reseed to rebuild it.
+
+Every request comes from one client address, so the AI search rate limits
+(AI_SEARCH_IP_RATE/_BURST, AI_SEARCH_USER_RATE/_BURST) are raised out of the
+way unless already set in the environment; pass --rate-limits to keep the
+configured ones. Rate-limited (429) responses are reported separately and
+left out of the latency and throughput figures.
+"""
+import argparse
+import json
+import math
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from types import SimpleNamespace
+
+from bson import ObjectId
+from pymongo import monitoring
+
+from utils.geohash import geo_cells
+from benchmarks.common import print_table, SERVICE_TYPES
+
+DB_NAME = 'rural_services_loadtest'
+SEED_BATCH = 5000
+
+# Rough bounding box of one state; district centres are scattered inside it
+STATE_BOUNDS = ((15.8, 19.9), (77.2, 81.3))
+DISTRICTS = 33
+DISTRICT_SKEW = 1.1   # Zipf exponent for district sizes
+VILLAGE_SPREAD_DEG = 0.25   # village scatter around the district centre
+SERVICE_SPREAD_DEG = 0.01   # service scatter around the village (~1 km)
+SERVICES_PER_VILLAGE = 20
+MAX_SERVICES_PER_PROVIDER = 8
+
+QUERIES = [
+    'Need tractor for plowing 5 acres of rice field urgently, budget 800',
+    'jcb for digging a pond this week',
+    'auto to carry cotton to market, price 300',
+    'farm service for wheat harvest next month 12 acres',
+    'tractor for harvest tomorrow',
+]
+
+ENDPOINTS = ('search', 'ai-search', 'suggestions', 'nearby')
+
+# Rate and burst used to lift the AI search limits for a single-address load test
+UNLIMITED_RATE = 1e9
+
+
+class CommandCounter(monitoring.CommandListener):
+    """Counts MongoDB commands per thread, i.e. per in-flight request"""
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def reset(self):
+        self._local.count = 0
+
+    @property
+    def count(self):
+        return getattr(self._local, 'count', 0)
+
+    def started(self, event):
+        self._local.count = self.count + 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+class StubModel:
+    """Stands in for the Gemini model: fixed answers after a fixed delay"""
+
+    def __init__(self, latency_s):
+        self.latency_s = latency_s
+
+    def generate_content(self, prompt, generation_config=None):
+        time.sleep(self.latency_s)
+        if 'Return ONLY the explanation' in prompt:
+            return SimpleNamespace(text='Nearby provider with a fair price for your field.')
+        return SimpleNamespace(text=json.dumps({
+            'serviceType': 'tractor', 'purpose': 'plowing', 'crop': 'rice', 'acreage': 5,
+            'urgency': 'immediate', 'budget': 800, 'specialRequirements': []
+        }))
+
+
+def _district_weights():
+    weights = [1 / (rank + 1) ** DISTRICT_SKEW for rank in range(DISTRICTS)]
+    total = sum(weights)
+    return [weight / total for weight in weights]
+
+
+def build_geography(service_count, rng):
+    """Villages as (name, district, lat, lng), denser in the bigger districts"""
+    (lat_min, lat_max), (lng_min, lng_max) = STATE_BOUNDS
+    village_count = max(DISTRICTS, service_count // SERVICES_PER_VILLAGE)
+
+    villages = []
+    for rank, weight in enumerate(_district_weights()):
+        district = f'District {rank + 1}'
+        center = (rng.uniform(lat_min, lat_max), rng.uniform(lng_min, lng_max))
+        for i in range(max(1, round(village_count * weight))):
+            villages.append((
+                f'{district} Village {i + 1}',
+                district,
+                rng.gauss(center[0], VILLAGE_SPREAD_DEG),
+                rng.gauss(center[1], VILLAGE_SPREAD_DEG)
+            ))
+    return villages
+
+
+def _user_doc(role, index, village, place, password_hash, rng):
+    name, district, lat, lng = village
+    lat = rng.gauss(lat, SERVICE_SPREAD_DEG)
+    lng = rng.gauss(lng, SERVICE_SPREAD_DEG)
+    return {
+        '_id': ObjectId(),
+        'name': f'{role.title()} {index}',
+        'email': f'{role}{index}@loadtest.local',
+        'password': password_hash,
+        'phone': f'9{index:09d}'[-10:],
+        'village': name,
+        'district': district,
+        **place,
+        'role': role,
+        'location': {'type': 'Point', 'coordinates': [lng, lat]},
+        'geoCells': geo_cells(lat, lng),
+        'createdAt': datetime.utcnow()
+    }
+
+
+def seed(db, service_count, customer_count, rng):
+    """Replace the scratch catalog with a synthetic one of service_count services"""
+    from utils.auth import hash_password
+    from utils.db import _ensure_indexes
+    from utils.gazetteer import place_ids, reset_cache
+    from utils.helpers import build_service_doc
+
+    for name in ('users', 'services', 'catalog_versions', 'suggestions', 'places', 'counters', 'loadtest_meta'):
+        db[name].drop()
+    # Cached ids point at the dropped places; the new counter would hand them out again
+    reset_cache()
+    _ensure_indexes(db)
+
+    villages = build_geography(service_count, rng)
+    places = {village[0]: place_ids(db, village[0], village[1]) for village in villages}
+    password_hash = hash_password('loadtest')  # one bcrypt call, shared by every user
+
+    users, services = [], []
+    provider_index = 0
+    remaining = service_count
+    while remaining > 0:
+        village = villages[rng.randrange(len(villages))]
+        provider = _user_doc('provider', provider_index, village, places[village[0]], password_hash, rng)
+        provider_index += 1
+        users.append(provider)
+
+        # Geometric fan-out: most providers own one or two services, a few own many
+        fan_out = 1
+        while fan_out < MAX_SERVICES_PER_PROVIDER and rng.random() < 0.5:
+            fan_out += 1
+        lng, lat = provider['location']['coordinates']
+        for _ in range(min(fan_out, remaining)):
+            services.append(build_service_doc({
+                'type': rng.choice(SERVICE_TYPES),
+                'pricePerHour': rng.choice([None, rng.randrange(300, 2000, 50)]),
+                'pricePerTrip': rng.randrange(100, 1500, 50),
+                'description': 'Synthetic load test service',
+                'available': rng.random() < 0.9,
+                'latitude': rng.gauss(lat, SERVICE_SPREAD_DEG),
+                'longitude': rng.gauss(lng, SERVICE_SPREAD_DEG)
+            }, provider))
+            remaining -= 1
+
+        if len(services) >= SEED_BATCH or remaining == 0:
+            db.users.insert_many(users, ordered=False)
+            db.services.insert_many(services, ordered=False)
+            users, services = [], []
+
+    # Customers land in villages with the same district skew as the catalog
+    customers = []
+    for i in range(customer_count):
+        village = rng.choice(villages)
+        customers.append(_user_doc('customer', i, village, places[village[0]], password_hash, rng))
+    for start in range(0, len(customers), SEED_BATCH):
+        db.users.insert_many(customers[start:start + SEED_BATCH], ordered=False)
+
+
+def catalog_size(db):
+    meta = db.loadtest_meta.find_one({'_id': 'seed'})
+    return meta['services'] if meta else None
+
+
+def _percentile(samples, q):
+    return samples[min(len(samples) - 1, math.ceil(len(samples) * q) - 1)]
+
+
+def run_endpoint(app, counter, make_request, total, concurrency):
+    """Issue `total` requests from `concurrency` threads; return summary stats"""
+    latencies = []
+    db_ops = []
+    errors = 0
+    rate_limited = 0
+    lock = threading.Lock()
+    remaining = iter(range(total))
+
+    def worker():
+        nonlocal errors, rate_limited
+        client = app.test_client()
+        for _ in iter(lambda: next(remaining, None), None):
+            method, url, kwargs = make_request()
+            counter.reset()
+            started = time.perf_counter()
+            response = client.open(url, method=method, **kwargs)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            with lock:
+                if response.status_code == 429:
+                    rate_limited += 1
+                    continue
+                latencies.append(elapsed_ms)
+                db_ops.append(counter.count)
+                if response.status_code >= 400:
+                    errors += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for future in [pool.submit(worker) for _ in range(concurrency)]:
+            future.result()
+    wall_s = time.perf_counter() - started
+
+    latencies.sort()
+    if not latencies:
+        return {'p50_ms': None, 'p95_ms': None, 'p99_ms': None, 'req_per_s': 0.0, 'db_ops_per_req': None,
+                'errors': errors, 'rate_limited': rate_limited}
+    return {
+        'p50_ms': _percentile(latencies, 0.50),
+        'p95_ms': _percentile(latencies, 0.95),
+        'p99_ms': _percentile(latencies, 0.99),
+        'req_per_s': len(latencies) / wall_s,
+        'db_ops_per_req': sum(db_ops) / len(db_ops),
+        'errors': errors,
+        'rate_limited': rate_limited
+    }
+
+
+def request_factories(db, rng, customer_sample):
+    """One callable per endpoint producing (method, url, kwargs) for a random customer"""
+    from utils.auth import generate_token
+
+    customers = list(db.users.aggregate([
+        {'$match': {'role': 'customer'}},
+        {'$sample': {'size': customer_sample}},
+        {'$project': {'email': 1, 'location': 1}}
+    ]))
+    tokens = [generate_token(c['_id'], c['email'], 'customer') for c in customers]
+
+    def customer():
+        i = rng.randrange(len(customers))
+        lng, lat = customers[i]['location']['coordinates']
+        return lat, lng, {'Authorization': f'Bearer {tokens[i]}'}
+
+    def search():
+        lat, lng, _ = customer()
+        service_type = rng.choice([''] + SERVICE_TYPES)
+        radius = rng.choice([5, 10, 25])
+        return 'GET', f'/api/services/search?lat={lat}&lng={lng}&radius={radius}&type={service_type}', {}
+
+    def ai_search():
+        lat, lng, headers = customer()
+        body = {'query': rng.choice(QUERIES), 'location': {'lat': lat, 'lng': lng}, 'radius': 50}
+        return 'POST', '/api/services/ai-search', {'json': body, 'headers': headers}
+
+    def suggestions():
+        _, _, headers = customer()
+        return 'GET', '/api/services/suggestions', {'headers': headers}
+
+    def nearby():
+        _, _, headers = customer()
+        return 'GET', '/api/providers/nearby', {'headers': headers}
+
+    return {'search': search, 'ai-search': ai_search, 'suggestions': suggestions, 'nearby': nearby}
+
+
+def _database_uri(mongo_uri):
+    """Point the app at the scratch database (the name must contain /rural_services)"""
+    base, _, options = mongo_uri.partition('?')
+    base = base.rstrip('/')
+    if base.count('/') > 2:
+        base = base.rsplit('/', 1)[0]
+    return f'{base}/{DB_NAME}' + (f'?{options}' if options else '')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--services', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--customers', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=500, help='requests per endpoint')
+    parser.add_argument('--endpoints', nargs='+', choices=ENDPOINTS, default=list(ENDPOINTS))
+    parser.add_argument('--llm-latency-ms', type=float, default=300, help='stub Gemini response time')
+    parser.add_argument('--mongo-uri', default='mongodb://localhost:27017')
+    parser.add_argument('--reseed', action='store_true')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--rate-limits', action='store_true', help='keep the configured AI search rate limits')
+    args = parser.parse_args()
+
+    # The listener must be registered before the app creates its client
+    counter = CommandCounter()
+    monitoring.register(counter)
+    os.environ['MONGODB_URI'] = _database_uri(args.mongo_uri)
+    os.environ.setdefault('MONGODB_TLS', 'false')
+    if not args.rate_limits:
+        # Read at import: one client address would otherwise get 429 for nearly every ai-search
+        for name in ('AI_SEARCH_IP_RATE', 'AI_SEARCH_IP_BURST', 'AI_SEARCH_USER_RATE', 'AI_SEARCH_USER_BURST'):
+            os.environ.setdefault(name, str(UNLIMITED_RATE))
+
+    import utils.ai as ai
+    from utils.cache import search_cache
+    from utils.db import get_db
+    from app import app
+
+    ai.model = StubModel(args.llm_latency_ms / 1000)
+    db = get_db()
+    if db is None:
+        raise SystemExit(f'Cannot connect to {os.environ["MONGODB_URI"]}')
+
+    rows = []
+    for size in args.services:
+        rng = random.Random(args.seed)
+        if args.reseed or catalog_size(db) != size:
+            started = time.perf_counter()
+            seed(db, size, args.customers, rng)
+            db.loadtest_meta.insert_one({'_id': 'seed', 'services': size, 'customers': args.customers})
+            print(f'Seeded {size} services in {time.perf_counter() - started:.0f}s')
+        search_cache.clear()
+
+        factories = request_factories(db, rng, min(args.customers, 1000))
+        for endpoint in args.endpoints:
+            stats = run_endpoint(app, counter, factories[endpoint], args.requests, args.concurrency)
+            rows.append({'services': size, 'endpoint': endpoint, **stats})
+
+    print_table(f'Concurrency {args.concurrency}, {args.requests} requests per endpoint, '
+                f'stub LLM {args.llm_latency_ms:.0f} ms', rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -4,6 +4,7 @@ Main Vercel serverless function - handles all API routes
 import sys
 import os
 import json
+import math
 from io import BytesIO
 
 # Load environment variables
@@ -16,18 +17,39 @@ except:
 # Add utils to path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 
-from utils.db import get_db
+from utils.db import get_db, with_profile
 from utils.auth import hash_password, verify_password, generate_token, get_user_from_token
-from utils.helpers import format_service_response
+from utils.fields import parse_fields, projection_for, select_fields, response_doc, PROVIDER_PROJECTION
+from utils.helpers import format_service_response, calculate_distance, nearest_services, build_service_doc, build_service_update, service_update_pipeline, budget_filter, service_response_doc, price_error
+from utils.geohash import geo_cells, cell_query
+from utils.cache import search_cache, search_cache_key, quantize_location, cell_margin_km, get_catalog_version, provider_scope
+from utils.conditional import make_etag, etag_matches, etag_headers, not_modified
+from utils.compression import init_compression
+from utils.metrics import init_metrics, metrics_authorized, metrics_text
+from utils.catalog import service_changed, service_deleted, service_slots_changed
+from utils.suggestions import get_suggestions_doc
+from utils.gazetteer import place_ids, user_place_ids
+from utils.autocomplete import autocomplete, KINDS, AUTOCOMPLETE_MAX_LIMIT
+from utils.slots import parse_window, window_filter, mark_slots, free_windows, SLOT_HORIZON_DAYS
+from utils.bulk import import_services, update_services, is_ndjson, iter_json_array_rows, iter_ndjson_rows, stream_import_summary
+from utils.spatial_index import get_spatial_index
+from utils.admission import ai_search_retry_after
+from utils.singleflight import search_flight, intent_flight, candidates_flight, explanation_flight, normalize_query
 from utils.ai import extract_intent, generate_explanation, generate_summary
+from utils.ranking import rank_results, AI_EXPLAIN_TOP_K
 from datetime import datetime
 from bson import ObjectId
+from pymongo import ReturnDocument
+from utils.json_provider import FastJSONProvider, dumps_bytes
 
 app = Flask(__name__)
+app.json = FastJSONProvider(app)  # encodes ObjectId/datetime natively
 CORS(app)
+init_metrics(app)  # Server-Timing header and /api/metrics histograms
+init_compression(app)
 
 # Test route - also handle root path for debugging
 @app.route('/api/test', methods=['GET'])
@@ -38,6 +60,13 @@ def test():
         return jsonify({'message': 'API is working!', 'db_connected': True}), 200
     return jsonify({'message': 'API is working but DB not connected', 'db_connected': False}), 200
 
+# Prometheus metrics (per-route request, db, llm, auth and serialize histograms)
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    if not metrics_authorized():
+        return jsonify({'message': 'Unauthorized'}), 401
+    return metrics_text(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
 # Auth routes
 @app.route('/api/auth/register', methods=['POST', 'OPTIONS'])
 def register():
@@ -45,7 +74,7 @@ def register():
         return '', 200
     
     try:
-        db = get_db()
+        db = get_db('write_majority')
         if db is None:
             return jsonify({'message': 'Database connection failed'}), 500
         
@@ -70,17 +99,25 @@ def register():
             'role': data['role'],
             'createdAt': datetime.utcnow()
         }
+        user_doc.update(place_ids(db, data['village'], data['district']))
+        
+        # Optional home location, also stored as geohash cells for proximity lookups
+        if data.get('latitude') and data.get('longitude'):
+            home_lat = float(data['latitude'])
+            home_lng = float(data['longitude'])
+            user_doc['location'] = {'type': 'Point', 'coordinates': [home_lng, home_lat]}
+            user_doc['geoCells'] = geo_cells(home_lat, home_lng)
         
         result = db.users.insert_one(user_doc)
         token = generate_token(result.inserted_id, data['email'], data['role'])
         
-        user_doc['_id'] = str(result.inserted_id)
+        user_doc['_id'] = result.inserted_id
         del user_doc['password']
         
         return jsonify({
             'message': 'Registration successful',
             'token': token,
-            'user': user_doc
+            'user': response_doc(user_doc)
         }), 201
         
     except Exception as e:
@@ -106,7 +143,7 @@ def login():
         
         token = generate_token(user['_id'], user['email'], user['role'])
         user_doc = {
-            '_id': str(user['_id']),
+            '_id': user['_id'],
             'name': user['name'],
             'email': user['email'],
             'phone': user['phone'],
@@ -143,7 +180,7 @@ def get_current_user():
             return jsonify({'message': 'User not found'}), 404
         
         user_doc = {
-            '_id': str(user['_id']),
+            '_id': user['_id'],
             'name': user['name'],
             'email': user['email'],
             'phone': user['phone'],
@@ -157,6 +194,76 @@ def get_current_user():
     except Exception as e:
         return jsonify({'message': str(e)}), 500
 
+def _load_search_rows(db, cache_key, lat, lng, radius, service_type, search_term, projection, window=None):
+    """
+    Query and cache the search rows of one location cell
+    
+    Rows are (service_data, coordinates) pairs covering any caller in the cell.
+    With a slot window only services free for all of it are kept.
+    """
+    slot_filter = window_filter(window) if window else {}
+    # Widen the radius by one cell diagonal so the rows cover any caller in this cell
+    max_distance = radius + cell_margin_km()
+    spatial_index = get_spatial_index(db)
+    cell_filter = cell_query(lat, lng, max_distance)
+    
+    if spatial_index is not None:
+        # In-process grid answers the geo part; fetch the hits in one round trip
+        hits = spatial_index.radius_query(lat, lng, max_distance, service_type, limit=50, window=window)
+        found = {
+            service['_id']: service
+            for service in db.services.find(
+                {'_id': {'$in': [service_id for _, service_id in hits]}, 'available': True, **slot_filter},
+                projection
+            )
+        }
+        services = [found[service_id] for _, service_id in hits if service_id in found]
+    elif cell_filter:
+        # Small radius: indexed equality on geohash cells, ranked in-process
+        query = {'available': True, **cell_filter, **slot_filter}
+        if service_type:
+            query['type'] = service_type
+        services = nearest_services(db.services.find(query, projection), lat, lng, max_distance, 50)
+    else:
+        query = {
+            'available': True,
+            'location': {
+                '$near': {
+                    '$geometry': {
+                        'type': 'Point',
+                        'coordinates': [lng, lat]
+                    },
+                    '$maxDistance': max_distance * 1000
+                }
+            }
+        }
+        
+        if service_type:
+            query['type'] = service_type
+        query.update(slot_filter)
+        
+        services = list(db.services.find(query, projection).limit(50))
+    
+    rows = []
+    for service in services:
+        provider = db.users.find_one({'_id': ObjectId(service['providerId'])}, PROVIDER_PROJECTION)
+        if not provider:
+            continue
+        
+        service_data = format_service_response(service)
+        service_data['providerName'] = provider.get('name', 'Unknown')
+        service_data['phone'] = provider.get('phone', '')
+        
+        if search_term and not (search_term in service_data['providerName'].lower() or
+                                search_term in service_data['village'].lower() or
+                                search_term in service_data['district'].lower()):
+            continue
+        
+        rows.append((service_data, service['location']['coordinates']))
+    
+    search_cache.set(cache_key, rows)
+    return rows
+
 # Services routes
 @app.route('/api/services/search', methods=['GET', 'OPTIONS'])
 def search_services():
@@ -164,7 +271,7 @@ def search_services():
         return '', 200
     
     try:
-        db = get_db()
+        db = get_db('read_secondary')
         if db is None:
             return jsonify({'message': 'Database connection failed'}), 500
         
@@ -173,60 +280,97 @@ def search_services():
         radius = float(request.args.get('radius', 10))
         service_type = request.args.get('type', '')
         search_term = request.args.get('search', '').lower()
+        fields = parse_fields(request.args.get('fields'))
         
         if not lat or not lng:
             return jsonify({'message': 'Location coordinates are required'}), 400
         
-        query = {
-            'available': True,
-            'location': {
-                '$near': {
-                    '$geometry': {
-                        'type': 'Point',
-                        'coordinates': [lng, lat]
-                    },
-                    '$maxDistance': radius * 1000
-                }
-            }
-        }
-        
-        if service_type:
-            query['type'] = service_type
-        
-        services = list(db.services.find(query).limit(50))
+        # Optional availability window: only services with every hour of it marked free
+        window = None
+        if request.args.get('from') or request.args.get('to'):
+            try:
+                window = parse_window(request.args.get('from'), request.args.get('to'))
+            except (TypeError, ValueError) as e:
+                return jsonify({'message': f'Invalid availability window: {e}'}), 400
+        
+        # Provider lookup and distance always need providerId/location; the search term needs the place names
+        projection = projection_for(fields, ['providerId', 'location'] + (['village', 'district'] if search_term else []))
+        
+        # Rows are cached per location cell; distances are recomputed below for the exact caller
+        cache_key = search_cache_key(lat, lng, radius, service_type, search_term, get_catalog_version(db)) + (fields, window)
+        rows = search_cache.get(cache_key)
+        
+        if rows is None:
+            # Identical concurrent misses (a busy cell right after a catalog change) share one query
+            rows = search_flight.do(
+                cache_key,
+                lambda: _load_search_rows(db, cache_key, lat, lng, radius, service_type, search_term, projection, window)
+            )
         
         results = []
-        for service in services:
-            provider = db.users.find_one({'_id': ObjectId(service['providerId'])})
-            if not provider:
-                continue
-            
-            service_data = format_service_response(service, lat, lng)
-            service_data['providerName'] = provider.get('name', 'Unknown')
-            service_data['phone'] = provider.get('phone', '')
-            
-            if search_term:
-                if (search_term in service_data['providerName'].lower() or
-                    search_term in service_data['village'].lower() or
-                    search_term in service_data['district'].lower()):
-                    results.append(service_data)
-            else:
-                results.append(service_data)
+        for service_data, coordinates in rows:
+            distance = calculate_distance(lat, lng, coordinates[1], coordinates[0])
+            if distance <= radius:
+                results.append(dict(service_data, distance=distance))
         
         results.sort(key=lambda x: x.get('distance', float('inf')))
-        return jsonify(results), 200
+        return jsonify([select_fields(service_data, fields) for service_data in results]), 200
         
     except Exception as e:
         return jsonify({'message': str(e)}), 500
 
+# Stored fields ranking and explanations read, whatever fields= the client asked for
+AI_SEARCH_FIELDS = ['providerId', 'location', 'type', 'pricePerHour', 'pricePerTrip', 'village', 'district',
+                    'description', 'descriptionVector', 'descriptionVectorVersion']
+
+def _load_ai_candidates(db, lat, lng, radius, service_type, budget, fields):
+    """
+    Available services near a location cell with their providers
+    
+    The radius is widened by one cell diagonal so the candidates cover any
+    caller in the cell; callers filter by their own distance.
+    """
+    db_query = {
+        'available': True,
+        'location': {
+            '$near': {
+                '$geometry': {
+                    'type': 'Point',
+                    'coordinates': [lng, lat]
+                },
+                '$maxDistance': (radius + cell_margin_km()) * 1000  # Convert km to meters
+            }
+        }
+    }
+    
+    # Add service type filter if extracted
+    if service_type:
+        db_query['type'] = service_type
+    
+    # Over-budget services never count against the limit
+    if budget:
+        db_query.update(budget_filter(budget))
+    
+    candidates = []
+    for service in db.services.find(db_query, projection_for(fields, AI_SEARCH_FIELDS)).limit(50):
+        provider = db.users.find_one({'_id': ObjectId(service['providerId'])}, PROVIDER_PROJECTION)
+        if provider:
+            candidates.append((service, provider))
+    return candidates
+
 @app.route('/api/services/ai-search', methods=['POST', 'OPTIONS'])
 def ai_search_services():
     """AI-powered natural language service search"""
     if request.method == 'OPTIONS':
         return '', 200
     
+    # Per-user and per-IP token buckets keep one client from monopolising the LLM
+    retry_after = ai_search_retry_after(request)
+    if retry_after:
+        return jsonify({'message': 'Too many AI searches, please try again shortly'}), 429, {'Retry-After': str(math.ceil(retry_after))}
+    
     try:
-        db = get_db()
+        db = get_db('read_secondary')
         if db is None:
             return jsonify({'message': 'Database connection failed'}), 500
         
@@ -238,92 +382,60 @@ def ai_search_services():
         lat = float(data.get('location', {}).get('lat', 0))
         lng = float(data.get('location', {}).get('lng', 0))
         radius = float(data.get('radius', 50))  # Default 50km
+        fields = parse_fields(request.args.get('fields') or data.get('fields'))
         
         if not lat or not lng:
             return jsonify({'message': 'Location coordinates are required'}), 400
         
-        # Extract intent using AI
-        extracted_intent = extract_intent(query_text)
-        
-        # Build database query based on extracted intent
-        db_query = {
-            'available': True,
-            'location': {
-                '$near': {
-                    '$geometry': {
-                        'type': 'Point',
-                        'coordinates': [lng, lat]
-                    },
-                    '$maxDistance': radius * 1000  # Convert km to meters
-                }
-            }
-        }
-        
-        # Add service type filter if extracted
-        if extracted_intent.get('serviceType'):
-            db_query['type'] = extracted_intent['serviceType']
+        # Extract intent using AI; identical queries in flight share one LLM call
+        extracted_intent = intent_flight.do(normalize_query(query_text), lambda: extract_intent(query_text))
         
-        # Query database
-        services = list(db.services.find(db_query).limit(50))
+        # Callers in the same location cell with the same intent share one geo query
+        service_type = extracted_intent.get('serviceType') or ''
+        customer_budget = extracted_intent.get('budget')
+        candidates = candidates_flight.do(
+            (quantize_location(lat, lng), radius, service_type, customer_budget, fields),
+            lambda: _load_ai_candidates(db, lat, lng, radius, service_type, customer_budget, fields)
+        )
         
         # Format results and add provider info
         results = []
-        for service in services:
-            provider = db.users.find_one({'_id': ObjectId(service['providerId'])})
-            if not provider:
-                continue
-            
+        documents = []
+        for service, provider in candidates:
             service_data = format_service_response(service, lat, lng)
+            if service_data.get('distance', 0) > radius:
+                continue
             service_data['providerName'] = provider.get('name', 'Unknown')
             service_data['phone'] = provider.get('phone', '')
-            
-            # Filter by budget if specified
-            customer_budget = extracted_intent.get('budget')
-            if customer_budget:
-                service_price = service_data.get('pricePerHour') or service_data.get('pricePerTrip', 0)
-                # Allow ±200 range for budget matching
-                if service_price > customer_budget + 200:
-                    continue
-            
             results.append(service_data)
+            documents.append(service)
         
-        # Sort by distance
-        results.sort(key=lambda x: x.get('distance', float('inf')))
+        # Score every candidate, query text against descriptions included, then explain only the best few
+        results = rank_results(results, extracted_intent, query_text, documents)
         
-        # Generate AI explanations for top results (limit to top 5 for cost efficiency)
-        top_results = results[:5]
-        for service_data in top_results:
+        intent_key = json.dumps(extracted_intent, sort_keys=True)
+        for service_data in results[:AI_EXPLAIN_TOP_K]:
             try:
-                explanation = generate_explanation(service_data, extracted_intent)
+                # The same service explained for the same intent is generated once
+                explanation = explanation_flight.do(
+                    (service_data['_id'], intent_key, round(service_data.get('distance', 0))),
+                    lambda: generate_explanation(service_data, extracted_intent)
+                )
                 service_data['aiExplanation'] = explanation
-                # Calculate relevance score (0-1) based on distance and price match
-                distance_score = 1.0 / (1.0 + service_data.get('distance', 10))
-                price_score = 1.0
-                customer_budget = extracted_intent.get('budget')
-                if customer_budget:
-                    service_price = service_data.get('pricePerHour') or service_data.get('pricePerTrip', 0)
-                    price_diff = abs(service_price - customer_budget)
-                    price_score = max(0, 1.0 - (price_diff / customer_budget))
-                service_data['relevanceScore'] = round((distance_score * 0.6 + price_score * 0.4), 2)
             except Exception as e:
                 print(f"Error generating explanation: {e}")
                 service_data['aiExplanation'] = "Good match based on location and availability."
-                service_data['relevanceScore'] = 0.5
         
         # Add explanations to remaining results (simple)
-        for service_data in results[5:]:
+        for service_data in results[AI_EXPLAIN_TOP_K:]:
             service_data['aiExplanation'] = "Good match based on location and availability."
-            service_data['relevanceScore'] = 0.4
-        
-        # Re-sort by relevance score
-        results.sort(key=lambda x: x.get('relevanceScore', 0), reverse=True)
         
         # Generate summary
         summary = generate_summary(results, extracted_intent)
         
         return jsonify({
             'extractedIntent': extracted_intent,
-            'results': results,
+            'results': [select_fields(service_data, fields) for service_data in results],
             'summary': summary,
             'total': len(results)
         }), 200
@@ -338,7 +450,7 @@ def get_suggestions():
         return '', 200
     
     try:
-        db = get_db()
+        db = get_db('read_secondary')
         if db is None:
             return jsonify({'message': 'Database connection failed'}), 500
         
@@ -353,51 +465,54 @@ def get_suggestions():
         user_village = user.get('village', '')
         user_district = user.get('district', '')
         
+        # One precomputed document per (village, district); its revision moves with every change
+        place = user_place_ids(db, user)
+        doc = get_suggestions_doc(db, place['villageId'], place['districtId'])
+        etag = make_etag('suggestions', place['villageId'], place['districtId'], user_id, doc['revision'])
+        if etag_matches(etag):
+            return not_modified(etag)
+        
         suggestions = []
+        tiers = (
+            ('same_location', f'Same Location - {user_village}', doc['sameLocation']),
+            ('nearby', f'Nearby - {user_district}', doc['nearby'])
+        )
+        for match_type, match_text, entries in tiers:
+            for entry in entries:
+                if entry['providerId'] == user['_id']:
+                    continue
+                service_data = format_service_response(entry, 0, 0)
+                service_data['matchType'] = match_type
+                service_data['matchText'] = match_text
+                suggestions.append(service_data)
         
-        # Find providers in same village
-        if user_village:
-            same_village_providers = db.users.find({
-                'role': 'provider',
-                'village': user_village,
-                '_id': {'$ne': ObjectId(user_id)}
-            })
-            for provider in same_village_providers:
-                provider_services = db.services.find({
-                    'providerId': provider['_id'],
-                    'available': True
-                })
-                for service in provider_services:
-                    service_data = format_service_response(service, 0, 0)
-                    service_data['providerName'] = provider.get('name', 'Unknown')
-                    service_data['phone'] = provider.get('phone', '')
-                    service_data['matchType'] = 'same_location'
-                    service_data['matchText'] = f'Same Location - {user_village}'
-                    suggestions.append(service_data)
-        
-        # Find providers in same district
-        if user_district:
-            same_district_providers = db.users.find({
-                'role': 'provider',
-                'district': user_district,
-                '_id': {'$ne': ObjectId(user_id)}
-            })
-            for provider in same_district_providers:
-                already_suggested = any(s.get('providerId') == str(provider['_id']) for s in suggestions)
-                if not already_suggested:
-                    provider_services = db.services.find({
-                        'providerId': provider['_id'],
-                        'available': True
-                    })
-                    for service in provider_services:
-                        service_data = format_service_response(service, 0, 0)
-                        service_data['providerName'] = provider.get('name', 'Unknown')
-                        service_data['phone'] = provider.get('phone', '')
-                        service_data['matchType'] = 'nearby'
-                        service_data['matchText'] = f'Nearby - {user_district}'
-                        suggestions.append(service_data)
-        
-        return jsonify(suggestions), 200
+        return jsonify(suggestions), 200, etag_headers(etag)
+        
+    except Exception as e:
+        return jsonify({'message': str(e)}), 500
+
+@app.route('/api/locations/autocomplete', methods=['GET', 'OPTIONS'])
+def autocomplete_locations():
+    """Suggest village and district names for a typed prefix, served from memory"""
+    if request.method == 'OPTIONS':
+        return '', 200
+    
+    try:
+        text = request.args.get('q', '')
+        kind = request.args.get('kind') or None
+        if kind and kind not in KINDS:
+            return jsonify({'message': f"kind must be one of: {', '.join(KINDS)}"}), 400
+        try:
+            limit = min(int(request.args.get('limit', 10)), AUTOCOMPLETE_MAX_LIMIT)
+        except ValueError:
+            return jsonify({'message': 'limit must be an integer'}), 400
+        
+        results = autocomplete(lambda: get_db('read_secondary'), text, max(limit, 1), kind, request.args.get('district'))
+        return jsonify({
+            'query': text,
+            'results': results,
+            'total': len(results)
+        }), 200
         
     except Exception as e:
         return jsonify({'message': str(e)}), 500
@@ -408,7 +523,7 @@ def create_service():
         return '', 200
     
     try:
-        db = get_db()
+        db = get_db('write_majority')
         if db is None:
             return jsonify({'message': 'Database connection failed'}), 500
         
@@ -419,48 +534,109 @@ def create_service():
         if payload['role'] != 'provider':
             return jsonify({'message': 'Only providers can create services'}), 403
         
-        data = request.get_json()
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({'message': 'Invalid request body'}), 400
         if not data.get('type'):
             return jsonify({'message': 'Service type is required'}), 400
+        error = price_error(data)
+        if error:
+            return jsonify({'message': error}), 400
         
         user = db.users.find_one({'_id': ObjectId(payload['user_id'])})
         if not user:
             return jsonify({'message': 'User not found'}), 404
+        user.update(user_place_ids(db, user))
         
-        service_doc = {
-            'providerId': ObjectId(payload['user_id']),
-            'type': data['type'],
-            'pricePerHour': data.get('pricePerHour'),
-            'pricePerTrip': data.get('pricePerTrip'),
-            'description': data.get('description', ''),
-            'available': data.get('available', True),
-            'village': user['village'],
-            'district': user['district'],
-            'location': {
-                'type': 'Point',
-                'coordinates': [0, 0]
-            },
-            'createdAt': datetime.utcnow()
-        }
-        
-        if data.get('latitude') and data.get('longitude'):
-            service_doc['location']['coordinates'] = [
-                float(data['longitude']),
-                float(data['latitude'])
-            ]
+        service_doc = build_service_doc(data, user)
         
         result = db.services.insert_one(service_doc)
-        service_doc['_id'] = str(result.inserted_id)
-        service_doc['providerId'] = str(service_doc['providerId'])
+        service_changed(db, service_doc)
         
         return jsonify({
             'message': 'Service created successfully',
-            'service': service_doc
+            'service': service_response_doc(service_doc)
         }), 201
         
     except Exception as e:
         return jsonify({'message': str(e)}), 500
 
+@app.route('/api/services/bulk', methods=['POST', 'OPTIONS'])
+def bulk_create_services():
+    """Create many services in one call from a JSON array or streamed NDJSON"""
+    if request.method == 'OPTIONS':
+        return '', 200
+    
+    try:
+        db = get_db('write_majority')
+        if db is None:
+            return jsonify({'message': 'Database connection failed'}), 500
+        
+        payload = get_user_from_token(request)
+        if not payload:
+            return jsonify({'message': 'Unauthorized'}), 401
+        
+        if payload['role'] != 'provider':
+            return jsonify({'message': 'Only providers can create services'}), 403
+        
+        user = db.users.find_one({'_id': ObjectId(payload['user_id'])})
+        if not user:
+            return jsonify({'message': 'User not found'}), 404
+        
+        if is_ndjson(request):
+            # Stream one result line per row while the body is still being read
+            results = import_services(db, user, iter_ndjson_rows(request.stream))
+            return Response(
+                stream_with_context(dumps_bytes(result) + b'\n' for result in results),
+                mimetype='application/x-ndjson'
+            ), 200
+        
+        rows = iter_json_array_rows(request.stream)
+        if rows is None:
+            return jsonify({'message': 'Expected a JSON array of services'}), 400
+        
+        # Parsed one row at a time; the summary follows the streamed results
+        results = import_services(db, user, rows)
+        return Response(
+            stream_with_context(stream_import_summary(results, dumps_bytes)),
+            mimetype='application/json'
+        ), 200
+        
+    except Exception as e:
+        return jsonify({'message': str(e)}), 500
+
+@app.route('/api/services/bulk', methods=['PATCH', 'OPTIONS'])
+def bulk_update_services():
+    """Apply many availability/price changes in one call"""
+    if request.method == 'OPTIONS':
+        return '', 200
+    
+    try:
+        db = get_db('write_majority')
+        if db is None:
+            return jsonify({'message': 'Database connection failed'}), 500
+        
+        payload = get_user_from_token(request)
+        if not payload:
+            return jsonify({'message': 'Unauthorized'}), 401
+        
+        data = request.get_json()
+        if not isinstance(data, list):
+            return jsonify({'message': 'Expected a JSON array of updates'}), 400
+        
+        results = update_services(db, ObjectId(payload['user_id']), data)
+        updated = sum(1 for result in results if result['status'] == 'updated')
+        
+        return jsonify({
+            'message': f'{updated} of {len(results)} services updated',
+            'updated': updated,
+            'failed': len(results) - updated,
+            'results': results
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'message': str(e)}), 500
+
 @app.route('/api/services/my-services', methods=['GET', 'OPTIONS'])
 def get_my_services():
     if request.method == 'OPTIONS':
@@ -475,14 +651,22 @@ def get_my_services():
         if not payload:
             return jsonify({'message': 'Unauthorized'}), 401
         
+        fields = parse_fields(request.args.get('fields'))
+        
+        # Same provider catalog version means the same list: answer 304 before querying
+        version = get_catalog_version(db, provider_scope(payload['user_id']))
+        etag = make_etag('my-services', payload['user_id'], version, request.query_string)
+        if etag_matches(etag):
+            return not_modified(etag)
+        
         services = list(db.services.find({
             'providerId': ObjectId(payload['user_id'])
-        }).sort('createdAt', -1))
+        }, projection_for(fields)).sort('createdAt', -1))
         
         results = []
         for service in services:
             service_doc = {
-                '_id': str(service['_id']),
+                '_id': service['_id'],
                 'type': service.get('type', ''),
                 'pricePerHour': service.get('pricePerHour'),
                 'pricePerTrip': service.get('pricePerTrip'),
@@ -490,11 +674,11 @@ def get_my_services():
                 'available': service.get('available', True),
                 'village': service.get('village', ''),
                 'district': service.get('district', ''),
-                'createdAt': service.get('createdAt', '').isoformat() if service.get('createdAt') else None
+                'createdAt': service.get('createdAt')
             }
-            results.append(service_doc)
+            results.append(select_fields(service_doc, fields))
         
-        return jsonify(results), 200
+        return jsonify(results), 200, etag_headers(etag)
         
     except Exception as e:
         return jsonify({'message': str(e)}), 500
@@ -505,7 +689,7 @@ def update_or_delete_service(service_id):
         return '', 200
     
     try:
-        db = get_db()
+        db = get_db('write_majority')
         if db is None:
             return jsonify({'message': 'Database connection failed'}), 500
         
@@ -513,34 +697,94 @@ def update_or_delete_service(service_id):
         if not payload:
             return jsonify({'message': 'Unauthorized'}), 401
         
-        service = db.services.find_one({'_id': ObjectId(service_id)})
+        # Ownership is part of the write filter, so checking and writing is one round trip
+        owned_filter = {'_id': ObjectId(service_id), 'providerId': ObjectId(payload['user_id'])}
+        
+        if request.method == 'PATCH':
+            data = request.get_json(silent=True)
+            if not isinstance(data, dict):
+                return jsonify({'message': 'Invalid request body'}), 400
+            error = price_error(data)
+            if error:
+                return jsonify({'message': error}), 400
+            if set(data) == {'available'}:
+                db = with_profile(db, 'write_fast')  # a bare availability toggle skips majority
+            update_doc = build_service_update(data)
+            service = db.services.find_one_and_update(
+                owned_filter,
+                service_update_pipeline(update_doc),
+                return_document=ReturnDocument.AFTER
+            )
+        else:
+            service = db.services.find_one_and_delete(owned_filter)
+        
         if not service:
+            # Only a failed write pays for telling "not yours" from "missing"
+            if db.services.count_documents({'_id': ObjectId(service_id)}, limit=1):
+                return jsonify({'message': 'Unauthorized'}), 403
             return jsonify({'message': 'Service not found'}), 404
         
-        if str(service['providerId']) != payload['user_id']:
-            return jsonify({'message': 'Unauthorized'}), 403
-        
         if request.method == 'PATCH':
-            data = request.get_json()
-            update_doc = {}
-            if 'available' in data:
-                update_doc['available'] = data['available']
-            if 'pricePerHour' in data:
-                update_doc['pricePerHour'] = data['pricePerHour']
-            if 'pricePerTrip' in data:
-                update_doc['pricePerTrip'] = data['pricePerTrip']
-            if 'description' in data:
-                update_doc['description'] = data['description']
-            
-            db.services.update_one(
-                {'_id': ObjectId(service_id)},
-                {'$set': update_doc}
-            )
+            service_changed(db, service)
             return jsonify({'message': 'Service updated successfully'}), 200
         
-        elif request.method == 'DELETE':
-            db.services.delete_one({'_id': ObjectId(service_id)})
-            return jsonify({'message': 'Service deleted successfully'}), 200
+        service_deleted(db, service)
+        return jsonify({'message': 'Service deleted successfully'}), 200
+        
+    except Exception as e:
+        return jsonify({'message': str(e)}), 500
+
+@app.route('/api/services/<service_id>/slots', methods=['GET', 'PUT', 'DELETE', 'OPTIONS'])
+def service_slots(service_id):
+    """Read a service's free hours (GET), or mark (PUT) or unmark (DELETE) a window of them"""
+    if request.method == 'OPTIONS':
+        return '', 200
+    
+    try:
+        if request.method == 'GET':
+            db = get_db('read_secondary')
+            if db is None:
+                return jsonify({'message': 'Database connection failed'}), 500
+            
+            service = db.services.find_one({'_id': ObjectId(service_id)}, {'slots': 1, 'slotsStart': 1})
+            if not service:
+                return jsonify({'message': 'Service not found'}), 404
+            
+            return jsonify({
+                'serviceId': service_id,
+                'horizonDays': SLOT_HORIZON_DAYS,
+                'free': [{'start': start, 'end': end} for start, end in free_windows(service.get('slots'), service.get('slotsStart'))]
+            }), 200
+        
+        db = get_db('write_majority')
+        if db is None:
+            return jsonify({'message': 'Database connection failed'}), 500
+        
+        payload = get_user_from_token(request)
+        if not payload:
+            return jsonify({'message': 'Unauthorized'}), 401
+        
+        data = request.get_json(silent=True) or {}
+        try:
+            window = parse_window(data.get('start'), data.get('end'))
+        except (TypeError, ValueError) as e:
+            return jsonify({'message': f'Invalid slot window: {e}'}), 400
+        
+        owned_filter = {'_id': ObjectId(service_id), 'providerId': ObjectId(payload['user_id'])}
+        service = mark_slots(db, owned_filter, window, free=request.method == 'PUT')
+        
+        if service is False:
+            return jsonify({'message': 'Slots are being changed concurrently, please retry'}), 409
+        if not service:
+            if db.services.count_documents({'_id': ObjectId(service_id)}, limit=1):
+                return jsonify({'message': 'Unauthorized'}), 403
+            return jsonify({'message': 'Service not found'}), 404
+        
+        service_slots_changed(db, service)
+        return jsonify({
+            'message': 'Slots updated successfully',
+            'free': [{'start': start, 'end': end} for start, end in free_windows(service.get('slots'), service.get('slotsStart'))]
+        }), 200
         
     except Exception as e:
         return jsonify({'message': str(e)}), 500
@@ -0,0 +1,143 @@
+"""
+Maintenance commands for the database
+Usage: python manage.py <command>
+"""
+import argparse
+from dotenv import load_dotenv
+load_dotenv()
+
+from pymongo import UpdateOne
+from pymongo.errors import OperationFailure
+
+from utils.db import get_db
+from utils.embeddings import EMBEDDING_VERSION, vector_fields
+from utils.gazetteer import place_ids
+from utils.geohash import geo_cells
+from utils.helpers import EFFECTIVE_PRICE_EXPR, PRICE_FIELDS
+from utils.suggestions import rebuild_district
+
+BATCH_SIZE = 1000
+
+
+def _flush(collection, ops):
+    """Write a batch of updates and return how many were applied"""
+    if not ops:
+        return 0
+    collection.bulk_write(ops, ordered=False)
+    return len(ops)
+
+
+def backfill_geocells(db):
+    """Store geoCells on every service and user that has a location but no cells"""
+    for collection in (db.services, db.users):
+        ops = []
+        updated = 0
+        cursor = collection.find(
+            {'location.coordinates': {'$exists': True}, 'geoCells': {'$exists': False}},
+            {'location': 1}
+        )
+        for doc in cursor:
+            lng, lat = doc['location']['coordinates']
+            if lat == 0 and lng == 0:
+                continue  # placeholder location, never matched by proximity search
+            ops.append(UpdateOne({'_id': doc['_id']}, {'$set': {'geoCells': geo_cells(lat, lng)}}))
+            if len(ops) >= BATCH_SIZE:
+                updated += _flush(collection, ops)
+                ops = []
+        updated += _flush(collection, ops)
+        print(f"  {collection.name}: {updated} documents updated")
+
+
+def backfill_effective_price(db):
+    """
+    Store effectivePrice (the price ai-search filters on) on services without it
+
+    Prices saved as strings by older dashboard builds are converted to numbers
+    first (unparseable ones to null), since the budget filter compares numbers.
+    """
+    string_price = [{field: {'$type': 'string'}} for field in PRICE_FIELDS]
+    result = db.services.update_many(
+        {'$or': [{'effectivePrice': {'$exists': False}}, {'effectivePrice': {'$type': 'string'}}, *string_price]},
+        [
+            {'$set': {
+                field: {'$convert': {'input': f'${field}', 'to': 'double', 'onError': None, 'onNull': None}}
+                for field in PRICE_FIELDS
+            }},
+            {'$set': {'effectivePrice': EFFECTIVE_PRICE_EXPR}}
+        ]
+    )
+    print(f"  services: {result.modified_count} documents updated")
+
+
+def build_embeddings(db):
+    """(Re)compute description vectors of services missing one or built by an older EMBEDDING_VERSION"""
+    ops = []
+    updated = 0
+    cursor = db.services.find({'descriptionVectorVersion': {'$ne': EMBEDDING_VERSION}}, {'description': 1})
+    for doc in cursor:
+        ops.append(UpdateOne({'_id': doc['_id']}, {'$set': vector_fields(doc.get('description', ''))}))
+        if len(ops) >= BATCH_SIZE:
+            updated += _flush(db.services, ops)
+            ops = []
+    updated += _flush(db.services, ops)
+    print(f"  services: {updated} documents updated")
+
+
+def migrate_places(db):
+    """Store gazetteer villageId/districtId on every user and service, then rebuild suggestions"""
+    for collection in (db.users, db.services):
+        ops = []
+        updated = 0
+        cursor = collection.find({}, {'village': 1, 'district': 1, 'villageId': 1, 'districtId': 1})
+        for doc in cursor:
+            ids = place_ids(db, doc.get('village', ''), doc.get('district', ''))
+            if ids['villageId'] == doc.get('villageId') and ids['districtId'] == doc.get('districtId'):
+                continue
+            ops.append(UpdateOne({'_id': doc['_id']}, {'$set': ids}))
+            if len(ops) >= BATCH_SIZE:
+                updated += _flush(collection, ops)
+                ops = []
+        updated += _flush(collection, ops)
+        print(f"  {collection.name}: {updated} documents updated")
+
+    # Suggestion documents keyed by village/district names predate the gazetteer
+    db.suggestions.delete_many({'districtId': {'$exists': False}})
+    try:
+        db.suggestions.drop_index('district_1_village_1')
+    except OperationFailure:
+        pass  # never created
+    rebuild_suggestions(db)
+
+
+def rebuild_suggestions(db):
+    """Rebuild the materialized suggestions of every district with users or services"""
+    district_ids = set(db.services.distinct('districtId')) | set(db.users.distinct('districtId'))
+    district_ids.discard(None)
+    for district_id in sorted(district_ids):
+        village_ids = [village_id for village_id in db.users.distinct('villageId', {'districtId': district_id})
+                       if village_id is not None]
+        rebuilt = rebuild_district(db, district_id, village_ids)
+        print(f"  district {district_id}: {rebuilt} villages")
+
+
+COMMANDS = {
+    'backfill-geocells': backfill_geocells,
+    'backfill-effective-price': backfill_effective_price,
+    'build-embeddings': build_embeddings,
+    'migrate-places': migrate_places,
+    'rebuild-suggestions': rebuild_suggestions,
+}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('command', choices=sorted(COMMANDS))
+    args = parser.parse_args()
+
+    db = get_db()
+    if db is None:
+        print('Database not connected')
+    else:
+        print(f"Running {args.command}...")
+        COMMANDS[args.command](db)
+        print('Done')
@@ -0,0 +1,191 @@
+"""
+Admission control for LLM-backed endpoints
+AI search is rate limited per user and per client IP with token buckets, and
+all Gemini calls share a global concurrency cap with a short wait queue.
+A call that cannot get a slot in time is not failed: callers fall back to
+the keyword/template paths, so a burst degrades answers instead of pinning
+every worker on the LLM. Limits are per process.
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+
+from utils.auth import get_user_from_token
+from utils.metrics import Counter
+
+AI_SEARCH_USER_RATE = float(os.getenv('AI_SEARCH_USER_RATE', 10))  # requests per minute
+AI_SEARCH_USER_BURST = float(os.getenv('AI_SEARCH_USER_BURST', 5))
+AI_SEARCH_IP_RATE = float(os.getenv('AI_SEARCH_IP_RATE', 30))  # requests per minute
+AI_SEARCH_IP_BURST = float(os.getenv('AI_SEARCH_IP_BURST', 10))
+RATE_LIMIT_KEYS = int(os.getenv('RATE_LIMIT_KEYS', 10000))  # buckets kept in memory
+
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', 8))
+LLM_QUEUE_SIZE = int(os.getenv('LLM_QUEUE_SIZE', 16))  # callers allowed to wait for a slot
+LLM_QUEUE_TIMEOUT = float(os.getenv('LLM_QUEUE_TIMEOUT', 2.0))  # seconds before degrading
+
+# Behind Vercel's proxy the client address is the first X-Forwarded-For entry
+TRUST_FORWARDED_FOR = os.getenv('TRUST_FORWARDED_FOR', '1' if os.getenv('VERCEL') else '0') == '1'
+
+ai_search_admission = Counter(
+    'ai_search_admission_total', 'AI search requests by rate limit decision', ('outcome',)
+)
+llm_admission = Counter(
+    'llm_call_admission_total', 'LLM calls run (admitted) or answered by the fallback (degraded)', ('kind', 'outcome')
+)
+
+
+class TokenBucket:
+    """Refills `rate` tokens per second up to `burst`"""
+
+    __slots__ = ('rate', 'burst', 'tokens', 'updated')
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self, now):
+        """Spend one token; return 0 on success or the seconds until one is available"""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """Token buckets per key, least recently used keys evicted past max_keys"""
+
+    def __init__(self, max_keys):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def check(self, limits):
+        """
+        Take a token from every (key, per_minute, burst) bucket
+
+        Returns 0 if all had one, else the seconds to wait. Nothing is spent
+        unless every bucket admits the request.
+        """
+        now = time.monotonic()
+        with self._lock:
+            buckets = [self._bucket(key, per_minute / 60, burst) for key, per_minute, burst in limits]
+            saved = [(bucket.tokens, bucket.updated) for bucket in buckets]
+            waits = [bucket.take(now) for bucket in buckets]
+            if any(waits):
+                for bucket, (tokens, updated) in zip(buckets, saved):
+                    bucket.tokens, bucket.updated = tokens, updated
+                return max(waits)
+            return 0
+
+    def _bucket(self, key, rate, burst):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(rate, burst)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+
+
+ai_search_limiter = RateLimiter(RATE_LIMIT_KEYS)
+
+
+def client_ip(request):
+    if TRUST_FORWARDED_FOR and request.headers.get('X-Forwarded-For'):
+        return request.headers['X-Forwarded-For'].split(',')[0].strip()
+    return request.remote_addr or 'unknown'
+
+
+def ai_search_retry_after(request):
+    """
+    Apply the AI search rate limits to this request
+
+    Returns 0 when admitted, else the seconds the client should wait
+    (for a 429 with Retry-After).
+    """
+    limits = [(f'ip:{client_ip(request)}', AI_SEARCH_IP_RATE, AI_SEARCH_IP_BURST)]
+    payload = get_user_from_token(request)
+    if payload:
+        limits.append((f"user:{payload['user_id']}", AI_SEARCH_USER_RATE, AI_SEARCH_USER_BURST))
+
+    retry_after = ai_search_limiter.check(limits)
+    ai_search_admission.inc(('rejected' if retry_after else 'admitted',))
+    return retry_after
+
+
+class LLMGate:
+    """Global cap on concurrent LLM calls with a bounded, time-limited wait queue"""
+
+    def __init__(self, max_concurrency, queue_size, timeout):
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._waiting = 0
+        self._lock = threading.Lock()
+        self._async_slots = None
+        self._max_concurrency = max_concurrency
+
+    def _join_queue(self):
+        with self._lock:
+            if self._waiting >= self.queue_size:
+                return False
+            self._waiting += 1
+            return True
+
+    def _leave_queue(self):
+        with self._lock:
+            self._waiting -= 1
+
+    @contextmanager
+    def slot(self, kind):
+        """Yield True while holding an LLM slot, or False if the caller should degrade"""
+        admitted = self._slots.acquire(blocking=False)
+        if not admitted and self._join_queue():
+            try:
+                admitted = self._slots.acquire(timeout=self.timeout)
+            finally:
+                self._leave_queue()
+
+        llm_admission.inc((kind, 'admitted' if admitted else 'degraded'))
+        try:
+            yield admitted
+        finally:
+            if admitted:
+                self._slots.release()
+
+    @asynccontextmanager
+    async def slot_async(self, kind):
+        """asyncio variant of slot(), for the async serving mode's single event loop"""
+        if self._async_slots is None:
+            self._async_slots = asyncio.Semaphore(self._max_concurrency)
+
+        admitted = False
+        if not self._async_slots.locked():
+            await self._async_slots.acquire()
+            admitted = True
+        elif self._join_queue():
+            try:
+                await asyncio.wait_for(self._async_slots.acquire(), self.timeout)
+                admitted = True
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                self._leave_queue()
+
+        llm_admission.inc((kind, 'admitted' if admitted else 'degraded'))
+        try:
+            yield admitted
+        finally:
+            if admitted:
+                self._async_slots.release()
+
+
+llm_gate = LLMGate(LLM_MAX_CONCURRENCY, LLM_QUEUE_SIZE, LLM_QUEUE_TIMEOUT)
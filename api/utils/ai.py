@@ -7,6 +7,9 @@ import json
 import re
 from typing import Dict, List, Optional
 
+from utils.admission import llm_gate
+from utils.metrics import timed
+
 try:
     import google.generativeai as genai
     GEMINI_AVAILABLE = True
@@ -49,7 +52,61 @@ def extract_intent(query: str) -> Dict:
         return _extract_intent_fallback(query)
     
     try:
-        prompt = f"""You are an AI assistant for RuralConnect, a rural services marketplace.
+        with llm_gate.slot('intent') as admitted:
+            if not admitted:
+                return _extract_intent_fallback(query)  # LLM saturated: fall back instead of failing
+            with timed('llm'):
+                response = model.generate_content(
+                    _build_intent_prompt(query),
+                    generation_config=genai.types.GenerationConfig(
+                        temperature=0.3,
+                        max_output_tokens=500,
+                    )
+                )
+        
+        return _parse_intent_response(response.text)
+        
+    except Exception as e:
+        print(f"Error in LLM intent extraction: {e}")
+        # Fallback to keyword extraction
+        return _extract_intent_fallback(query)
+
+
+async def extract_intent_async(query: str) -> Dict:
+    """
+    Async variant of extract_intent for the asyncio serving mode
+    
+    Awaits the Gemini call instead of blocking, so many LLM-bound
+    requests can share one event loop.
+    """
+    if not model:
+        return _extract_intent_fallback(query)
+    
+    try:
+        async with llm_gate.slot_async('intent') as admitted:
+            if not admitted:
+                return _extract_intent_fallback(query)  # LLM saturated: fall back instead of failing
+            with timed('llm'):
+                response = await model.generate_content_async(
+                    _build_intent_prompt(query),
+                    generation_config=genai.types.GenerationConfig(
+                        temperature=0.3,
+                        max_output_tokens=500,
+                    )
+                )
+        
+        return _parse_intent_response(response.text)
+        
+    except Exception as e:
+        print(f"Error in LLM intent extraction: {e}")
+        return _extract_intent_fallback(query)
+
+
+def _build_intent_prompt(query: str) -> str:
+    """
+    Build the intent extraction prompt for a customer query
+    """
+    return f"""You are an AI assistant for RuralConnect, a rural services marketplace.
 
 Extract service requirements from the customer's query and return structured JSON.
 
@@ -76,35 +133,22 @@ Return ONLY valid JSON in this exact format (no markdown, no explanation):
 }}
 
 If information is not mentioned, use empty string for strings, null for numbers."""
-        
-        response = model.generate_content(
-            prompt,
-            generation_config=genai.types.GenerationConfig(
-                temperature=0.3,
-                max_output_tokens=500,
-            )
-        )
-        
-        # Extract JSON from response
-        response_text = response.text.strip()
-        
-        # Remove markdown code blocks if present
-        response_text = re.sub(r'```json\s*', '', response_text)
-        response_text = re.sub(r'```\s*', '', response_text)
-        response_text = response_text.strip()
-        
-        # Parse JSON
-        intent = json.loads(response_text)
-        
-        # Validate and normalize
-        intent = _normalize_intent(intent)
-        
-        return intent
-        
-    except Exception as e:
-        print(f"Error in LLM intent extraction: {e}")
-        # Fallback to keyword extraction
-        return _extract_intent_fallback(query)
+
+
+def _parse_intent_response(response_text: str) -> Dict:
+    """
+    Parse and normalize the JSON returned by the intent extraction prompt
+    """
+    response_text = response_text.strip()
+    
+    # Remove markdown code blocks if present
+    response_text = re.sub(r'```json\s*', '', response_text)
+    response_text = re.sub(r'```\s*', '', response_text)
+    response_text = response_text.strip()
+    
+    # Parse JSON and validate
+    intent = json.loads(response_text)
+    return _normalize_intent(intent)
 
 
 def _extract_intent_fallback(query: str) -> Dict:
@@ -207,7 +251,57 @@ def generate_explanation(service_data: Dict, customer_intent: Dict) -> str:
         return _generate_explanation_fallback(service_data, customer_intent)
     
     try:
-        prompt = f"""You are an AI assistant explaining service matches to customers in RuralConnect.
+        with llm_gate.slot('explanation') as admitted:
+            if not admitted:
+                return _generate_explanation_fallback(service_data, customer_intent)  # LLM saturated: fall back instead of failing
+            with timed('llm'):
+                response = model.generate_content(
+                    _build_explanation_prompt(service_data, customer_intent),
+                    generation_config=genai.types.GenerationConfig(
+                        temperature=0.7,
+                        max_output_tokens=200,
+                    )
+                )
+        
+        return response.text.strip()
+        
+    except Exception as e:
+        print(f"Error in LLM explanation generation: {e}")
+        return _generate_explanation_fallback(service_data, customer_intent)
+
+
+async def generate_explanation_async(service_data: Dict, customer_intent: Dict) -> str:
+    """
+    Async variant of generate_explanation for the asyncio serving mode
+    """
+    if not model:
+        return _generate_explanation_fallback(service_data, customer_intent)
+    
+    try:
+        async with llm_gate.slot_async('explanation') as admitted:
+            if not admitted:
+                return _generate_explanation_fallback(service_data, customer_intent)  # LLM saturated: fall back instead of failing
+            with timed('llm'):
+                response = await model.generate_content_async(
+                    _build_explanation_prompt(service_data, customer_intent),
+                    generation_config=genai.types.GenerationConfig(
+                        temperature=0.7,
+                        max_output_tokens=200,
+                    )
+                )
+        
+        return response.text.strip()
+        
+    except Exception as e:
+        print(f"Error in LLM explanation generation: {e}")
+        return _generate_explanation_fallback(service_data, customer_intent)
+
+
+def _build_explanation_prompt(service_data: Dict, customer_intent: Dict) -> str:
+    """
+    Build the match explanation prompt for one service
+    """
+    return f"""You are an AI assistant explaining service matches to customers in RuralConnect.
 
 Service Provider: {service_data.get('providerName', 'Unknown')}
 Service Type: {service_data.get('type', '')}
@@ -226,20 +320,6 @@ Focus on: location match, price fit, availability, and any unique advantages.
 Be friendly, helpful, and conversational. Suitable for rural Indian customers.
 
 Return ONLY the explanation text, no additional formatting."""
-        
-        response = model.generate_content(
-            prompt,
-            generation_config=genai.types.GenerationConfig(
-                temperature=0.7,
-                max_output_tokens=200,
-            )
-        )
-        
-        return response.text.strip()
-        
-    except Exception as e:
-        print(f"Error in LLM explanation generation: {e}")
-        return _generate_explanation_fallback(service_data, customer_intent)
 
 
 def _generate_explanation_fallback(service_data: Dict, customer_intent: Dict) -> str:
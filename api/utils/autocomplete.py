@@ -0,0 +1,241 @@
+"""
+Village and district autocomplete
+An in-memory index over the gazetteer (`places`): normalized names in one
+sorted list, searched by bisect, so a keystroke never reaches MongoDB.
+Typed text matches names it is a prefix of, and, from AUTOCOMPLETE_FUZZY_MIN
+characters on, names it is one edit (substitution, insertion, deletion or
+adjacent transposition) away from being a prefix of.
+
+The index is loaded on first use and rebuilt in the background once older
+than AUTOCOMPLETE_REFRESH_SECONDS, so names registered since then appear
+after at most that long.
+"""
+import asyncio
+import os
+import threading
+import time
+from bisect import bisect_left
+
+from utils.gazetteer import PLACES, normalize_place
+
+AUTOCOMPLETE_REFRESH_SECONDS = float(os.getenv('AUTOCOMPLETE_REFRESH_SECONDS', 300))
+AUTOCOMPLETE_FUZZY_MIN = int(os.getenv('AUTOCOMPLETE_FUZZY_MIN', 3))
+AUTOCOMPLETE_MAX_LIMIT = 25
+
+KINDS = ('district', 'village')
+PLACE_PROJECTION = {'kind': 1, 'parent': 1, 'name': 1}
+
+
+class PlaceIndex:
+    """
+    Sorted normalized names with their places
+
+    `keys[i]` is the normalized name of `places[i]`, a (kind, name, district
+    name, place id, district id) tuple; a name shared by several places
+    appears once per place.
+    """
+
+    def __init__(self, places=()):
+        rows = sorted(places, key=lambda place: (normalize_place(place[1]), place[0], place[3]))
+        self.keys = [normalize_place(place[1]) for place in rows]
+        self.places = rows
+        self.districts = {key: place[3] for key, place in zip(self.keys, rows) if place[0] == 'district'}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _range(self, prefix):
+        """Index range of keys starting with prefix"""
+        return bisect_left(self.keys, prefix), bisect_left(self.keys, prefix + '\U0010ffff')
+
+    def _next_chars(self, prefix):
+        """Each distinct character that follows prefix in some key, one bisect per character"""
+        keys = self.keys
+        size = len(prefix)
+        i = bisect_left(keys, prefix)
+        while i < len(keys) and keys[i].startswith(prefix):
+            if len(keys[i]) == size:
+                i += 1
+                continue
+            char = keys[i][size]
+            yield char
+            i = bisect_left(keys, prefix[:size] + chr(ord(char) + 1), i)
+
+    def _one_edit_prefixes(self, text):
+        """Prefixes one edit away from text that some key starts with"""
+        variants = set()
+        for i in range(len(text)):
+            variants.add(text[:i] + text[i + 1:])
+            if i + 1 < len(text):
+                variants.add(text[:i] + text[i + 1] + text[i] + text[i + 2:])
+            for char in self._next_chars(text[:i]):
+                variants.add(text[:i] + char + text[i:])
+                if char != text[i]:
+                    variants.add(text[:i] + char + text[i + 1:])
+        variants.update(text + char for char in self._next_chars(text))
+        variants.discard(text)
+        return variants
+
+    def search(self, text, limit=10, kind=None, district_id=None):
+        """
+        Places whose name starts with text, then one-edit matches
+
+        Returns (place tuple, 'prefix' | 'fuzzy') pairs, shortest names first
+        within each group.
+        """
+        text = normalize_place(text)
+        if not text:
+            return []
+
+        def wanted(row):
+            _, place_kind, _, _, _, place_district = row
+            return (not kind or place_kind == kind) and (district_id is None or place_district == district_id)
+
+        matches = {}
+        for match, prefixes in (('prefix', (text,)), ('fuzzy', None)):
+            if match == 'fuzzy':
+                if len(matches) >= limit or len(text) < AUTOCOMPLETE_FUZZY_MIN:
+                    break
+                prefixes = self._one_edit_prefixes(text)
+            for prefix in prefixes:
+                lo, hi = self._range(prefix)
+                for i in range(lo, hi):
+                    row = (self.keys[i],) + self.places[i]
+                    if i not in matches and wanted(row):
+                        matches[i] = (match, row)
+
+        ranked = sorted(matches.values(), key=lambda item: (item[0] == 'fuzzy', len(item[1][0]), item[1][0]))
+        return [(row[1:], match) for match, row in ranked[:limit]]
+
+
+def _place_index(places):
+    district_names = {place['_id']: place['name'] for place in places if place['kind'] == 'district'}
+    rows = []
+    for place in places:
+        if place['kind'] == 'district':
+            rows.append(('district', place['name'], place['name'], place['_id'], place['_id']))
+        else:
+            rows.append(('village', place['name'], district_names.get(place['parent'], ''), place['_id'], place['parent']))
+    return PlaceIndex(rows)
+
+
+def load_place_index(db):
+    """Build a PlaceIndex from every place in the gazetteer"""
+    return _place_index(list(db[PLACES].find({}, PLACE_PROJECTION)))
+
+
+async def load_place_index_async(db):
+    """Async (motor) variant of load_place_index"""
+    return _place_index(await db[PLACES].find({}, PLACE_PROJECTION).to_list(length=None))
+
+
+def _results(index, text, limit, kind, district):
+    district_id = None
+    if district:
+        district_id = index.districts.get(normalize_place(district))
+        if district_id is None:
+            return []
+    return [
+        {'name': name, 'kind': place_kind, 'district': district_name, 'id': place_id, 'match': match}
+        for (place_kind, name, district_name, place_id, _), match in index.search(text, limit, kind, district_id)
+    ]
+
+
+def autocomplete(connect, text, limit=10, kind=None, district=None):
+    """
+    Result entries for the autocomplete endpoint, best first
+
+    `connect` returns the database and is only called to load or refresh the
+    index, so answering from a loaded index makes no database round trip.
+    """
+    return _results(get_place_index(connect), text, limit, kind, district)
+
+
+async def autocomplete_async(connect, text, limit=10, kind=None, district=None):
+    """Async (motor) variant of autocomplete; `connect` is a coroutine function"""
+    return _results(await get_place_index_async(connect), text, limit, kind, district)
+
+
+_index = None
+_loaded_at = 0.0
+_refreshing = False
+_lock = threading.Lock()
+_refresh_task = None  # held so the event loop does not drop a running async refresh
+
+
+def get_place_index(connect):
+    """The process-wide index: loaded on first use, refreshed in the background when old"""
+    global _index, _loaded_at
+
+    if _index is None:
+        with _lock:
+            if _index is None:
+                _index = load_place_index(_connected(connect))
+                _loaded_at = time.monotonic()
+        return _index
+
+    if _refresh_due():
+        threading.Thread(target=_refresh, args=(connect,), daemon=True, name='place-index').start()
+    return _index
+
+
+async def get_place_index_async(connect):
+    """Async (motor) variant of get_place_index; the refresh runs as a task on the loop"""
+    global _index, _loaded_at, _refresh_task
+
+    if _index is None:
+        # Concurrent first requests may each load it; the last one wins
+        _index = await load_place_index_async(await _connected_async(connect))
+        _loaded_at = time.monotonic()
+        return _index
+
+    if _refresh_due():
+        _refresh_task = asyncio.get_running_loop().create_task(_refresh_async(connect))
+    return _index
+
+
+def _refresh_due():
+    """True, once per refresh, when the index is old and no refresh is running"""
+    global _refreshing
+    if time.monotonic() - _loaded_at <= AUTOCOMPLETE_REFRESH_SECONDS:
+        return False
+    with _lock:
+        start = not _refreshing
+        _refreshing = True
+    return start
+
+
+def _connected(connect):
+    db = connect()
+    if db is None:
+        raise ConnectionError('Database connection failed')
+    return db
+
+
+async def _connected_async(connect):
+    db = await connect()
+    if db is None:
+        raise ConnectionError('Database connection failed')
+    return db
+
+
+def _refresh(connect):
+    global _index, _loaded_at, _refreshing
+    try:
+        _index = load_place_index(_connected(connect))
+        _loaded_at = time.monotonic()
+    except Exception as e:
+        print(f"Place index refresh error: {e}")
+    finally:
+        _refreshing = False
+
+
+async def _refresh_async(connect):
+    global _index, _loaded_at, _refreshing
+    try:
+        _index = await load_place_index_async(await _connected_async(connect))
+        _loaded_at = time.monotonic()
+    except Exception as e:
+        print(f"Place index refresh error: {e}")
+    finally:
+        _refreshing = False
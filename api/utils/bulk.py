@@ -0,0 +1,324 @@
+"""
+Bulk service import and update
+Imported rows arrive as a JSON array or as NDJSON (one object per line) and are
+written with unordered insert_many in fixed-size chunks, so a single call can
+carry tens of thousands of rows while memory stays bounded by the chunk size.
+Both forms are parsed one row at a time as the body is read, and results are
+streamed back as rows are written.
+Updates are applied with unordered bulk_write, ownership checked in the filter.
+"""
+import codecs
+import json
+import os
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from utils.gazetteer import user_place_ids
+from utils.helpers import build_service_doc, build_service_update, service_update_pipeline, price_error
+from utils.catalog import services_changed
+
+UPDATABLE_FIELDS = ('available', 'pricePerHour', 'pricePerTrip', 'description')
+
+BULK_CHUNK_SIZE = int(os.getenv('BULK_CHUNK_SIZE', 500))
+NDJSON_MIMETYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl')
+
+# A JSON array element larger than this is rejected instead of buffered
+BULK_MAX_ROW_BYTES = int(os.getenv('BULK_MAX_ROW_BYTES', 64 * 1024))
+READ_BYTES = 64 * 1024
+
+
+def is_ndjson(request):
+    """True if the request body is newline-delimited JSON"""
+    return request.mimetype in NDJSON_MIMETYPES
+
+
+class JSONArrayReader:
+    """
+    Parse a JSON array from a byte stream one element at a time
+
+    Only the unparsed tail of the body is buffered, so memory is bounded by
+    BULK_MAX_ROW_BYTES plus one read, however long the array.
+    """
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._decoder = json.JSONDecoder()
+        self._utf8 = codecs.getincrementaldecoder('utf-8')()
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self):
+        """Append the next read to the buffer; False once the stream is exhausted"""
+        if self._eof:
+            return False
+        data = self._stream.read(READ_BYTES)
+        self._eof = not data
+        self._buffer = self._buffer[self._pos:] + self._utf8.decode(data, final=self._eof)
+        self._pos = 0
+        return not self._eof
+
+    def _peek(self):
+        """Next non-whitespace character, or None at the end of the body"""
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in ' \t\r\n':
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                return None
+
+    def start(self):
+        """Consume the opening bracket; False if the body is not a JSON array"""
+        if self._peek() != '[':
+            return False
+        self._pos += 1
+        return True
+
+    def _element(self):
+        self._peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except ValueError as e:
+                if len(self._buffer) - self._pos > BULK_MAX_ROW_BYTES:
+                    raise ValueError(f'Row exceeds {BULK_MAX_ROW_BYTES} bytes') from None
+                if not self._fill():
+                    raise ValueError(f'Invalid JSON: {e}') from None
+                continue
+            # A number or literal cut at the end of a read may continue in the next one
+            if end == len(self._buffer) and self._fill():
+                continue
+            self._pos = end
+            return value
+
+    def rows(self):
+        """(row, parse_error) pairs; a syntax error ends the array"""
+        if self._peek() == ']':
+            return
+        while True:
+            try:
+                yield self._element(), None
+            except ValueError as e:
+                yield None, str(e)
+                return
+            separator = self._peek()
+            if separator == ']':
+                return
+            if separator != ',':
+                yield None, "Invalid JSON: expected ',' or ']' after a row"
+                return
+            self._pos += 1
+
+
+def iter_json_array_rows(stream):
+    """
+    Read a JSON array lazily from a stream as (row, parse_error) pairs
+
+    Returns None, having read only leading whitespace, if the body does not
+    start with '['.
+    """
+    reader = JSONArrayReader(stream)
+    return reader.rows() if reader.start() else None
+
+
+def stream_import_summary(results, dumps):
+    """
+    The JSON array import response, encoded piece by piece
+
+    Same object as a buffered response ('results', 'created', 'failed',
+    'message'), with the counts after the results since they are only known
+    once every row is written. `dumps` encodes one value to bytes.
+    """
+    created = total = 0
+    yield b'{"results":['
+    for result in results:
+        if total:
+            yield b','
+        yield dumps(result)
+        total += 1
+        created += result['status'] == 'created'
+    summary = dumps({
+        'created': created,
+        'failed': total - created,
+        'message': f'{created} of {total} services created'
+    })
+    yield b'],' + summary[1:]
+
+
+def iter_ndjson_rows(stream):
+    """Read NDJSON lazily from a stream as (row, parse_error) pairs"""
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line), None
+        except ValueError as e:
+            yield None, f'Invalid JSON: {e}'
+
+
+def validate_service_row(row):
+    """Return an error message for an invalid service row, or None"""
+    if not isinstance(row, dict):
+        return 'Row must be a JSON object'
+
+    if not row.get('type'):
+        return 'Service type is required'
+
+    error = price_error(row)
+    if error:
+        return error
+
+    if 'available' in row and not isinstance(row['available'], bool):
+        return 'available must be true or false'
+
+    if row.get('latitude') or row.get('longitude'):
+        try:
+            lat = float(row.get('latitude'))
+            lng = float(row.get('longitude'))
+        except (TypeError, ValueError):
+            return 'latitude and longitude must both be numbers'
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+            return 'latitude/longitude out of range'
+
+    return None
+
+
+def import_services(db, provider, rows):
+    """
+    Validate and insert service rows for one provider
+
+    `rows` yields (row, parse_error) pairs. Yields one result per row, tagged
+    with the row's input index; invalid rows are reported as soon as they are
+    read, valid ones once their chunk has been written.
+    """
+    provider = {**provider, **user_place_ids(db, provider)}
+    chunk = []
+    for index, (row, error) in enumerate(rows):
+        error = error or validate_service_row(row)
+        if error:
+            yield {'index': index, 'status': 'error', 'message': error}
+            continue
+
+        chunk.append((index, build_service_doc(row, provider)))
+        if len(chunk) >= BULK_CHUNK_SIZE:
+            yield from _insert_chunk(db, chunk)
+            chunk = []
+
+    if chunk:
+        yield from _insert_chunk(db, chunk)
+
+
+def _insert_chunk(db, chunk):
+    """Insert one chunk unordered and map write errors back to rows"""
+    failed = {}
+    try:
+        db.services.insert_many([doc for _, doc in chunk], ordered=False)
+    except BulkWriteError as e:
+        for write_error in e.details.get('writeErrors', []):
+            failed[write_error['index']] = write_error.get('errmsg', 'Write failed')
+
+    results = []
+    inserted = []
+    for position, (index, doc) in enumerate(chunk):
+        if position in failed:
+            results.append({'index': index, 'status': 'error', 'message': failed[position]})
+        else:
+            inserted.append(doc)
+            results.append({'index': index, 'status': 'created', '_id': doc['_id']})
+
+    services_changed(db, inserted)
+    return results
+
+
+def update_services(db, provider_id, items):
+    """
+    Apply many availability/price changes for one provider
+
+    Ownership is part of each write filter ({_id, providerId}), so the whole
+    batch is one bulk_write per chunk plus one read of the touched services.
+    Returns one result per item, in input order.
+    """
+    results = [None] * len(items)
+    pending = []
+    for index, item in enumerate(items):
+        error = _validate_update_item(item)
+        if error:
+            results[index] = {'index': index, 'status': 'error', 'message': error}
+            continue
+        update_doc = build_service_update({k: item[k] for k in UPDATABLE_FIELDS if k in item})
+        pending.append((index, ObjectId(item['_id']), update_doc))
+
+    for start in range(0, len(pending), BULK_CHUNK_SIZE):
+        for index, result in _update_chunk(db, provider_id, pending[start:start + BULK_CHUNK_SIZE]):
+            results[index] = result
+
+    return results
+
+
+def _validate_update_item(item):
+    """Return an error message for an invalid bulk update item, or None"""
+    if not isinstance(item, dict):
+        return 'Item must be a JSON object'
+
+    try:
+        ObjectId(item.get('_id'))
+    except (InvalidId, TypeError):
+        return '_id must be a valid service id'
+
+    if not any(field in item for field in UPDATABLE_FIELDS):
+        return 'Nothing to update'
+
+    error = price_error(item)
+    if error:
+        return error
+
+    if 'available' in item and not isinstance(item['available'], bool):
+        return 'available must be true or false'
+
+    return None
+
+
+def _update_chunk(db, provider_id, chunk):
+    """Write one chunk and classify every item as updated/forbidden/not_found/error"""
+    failed = {}
+    try:
+        db.services.bulk_write([
+            UpdateOne({'_id': service_id, 'providerId': provider_id}, service_update_pipeline(update_doc))
+            for _, service_id, update_doc in chunk
+        ], ordered=False)
+    except BulkWriteError as e:
+        for write_error in e.details.get('writeErrors', []):
+            failed[write_error['index']] = write_error.get('errmsg', 'Write failed')
+
+    # bulk_write only reports totals: one read tells which items hit an owned service
+    service_ids = [service_id for _, service_id, _ in chunk]
+    owned = {
+        service['_id']: service
+        for service in db.services.find({'_id': {'$in': service_ids}, 'providerId': provider_id})
+    }
+
+    # Only when something missed, one more read separates "not yours" from "missing"
+    missing = [service_id for service_id in service_ids if service_id not in owned]
+    existing = set()
+    if missing:
+        existing = {service['_id'] for service in db.services.find({'_id': {'$in': missing}}, {'_id': 1})}
+
+    results = []
+    for position, (index, service_id, _) in enumerate(chunk):
+        if position in failed:
+            result = {'index': index, '_id': service_id, 'status': 'error', 'message': failed[position]}
+        elif service_id in owned:
+            result = {'index': index, '_id': service_id, 'status': 'updated'}
+        elif service_id in existing:
+            result = {'index': index, '_id': service_id, 'status': 'forbidden'}
+        else:
+            result = {'index': index, '_id': service_id, 'status': 'not_found'}
+        results.append((index, result))
+
+    services_changed(db, [owned[service_id] for service_id in service_ids if service_id in owned])
+    return results
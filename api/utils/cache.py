@@ -0,0 +1,155 @@
+"""
+In-process response caching for location search
+Entries are keyed on a quantized location cell so nearby callers share them,
+and on the catalog version so provider writes invalidate them immediately.
+Versions are kept per scope (global, per provider, per district) so
+conditional GETs can be validated without running the underlying query.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from math import cos, floor, radians, sqrt
+
+from pymongo import UpdateOne
+
+from utils.db import with_profile
+
+SEARCH_CACHE_TTL = float(os.getenv('SEARCH_CACHE_TTL', 30))  # seconds
+SEARCH_CACHE_SIZE = int(os.getenv('SEARCH_CACHE_SIZE', 1024))  # entries
+SEARCH_CACHE_CELL_KM = float(os.getenv('SEARCH_CACHE_CELL_KM', 1.0))  # cell edge
+
+# Catalog versions live in MongoDB so every process/serverless instance sees a bump
+CATALOG_VERSIONS = 'catalog_versions'
+GLOBAL_SCOPE = 'global'
+
+KM_PER_DEGREE = 111.32
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire after a fixed TTL"""
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached value, or None if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        """Store a value, evicting the least recently used entry if full"""
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+search_cache = TTLCache(SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL)
+
+
+def quantize_location(lat, lng, cell_km=SEARCH_CACHE_CELL_KM):
+    """
+    Map a coordinate to the integer (row, col) of a roughly square grid cell
+    of cell_km per side
+    """
+    lat_step = cell_km / KM_PER_DEGREE
+    row = floor(lat / lat_step)
+
+    # Use the cell's centre latitude so every point in the row shares a column width
+    center_lat = (row + 0.5) * lat_step
+    lng_step = cell_km / (KM_PER_DEGREE * max(cos(radians(center_lat)), 0.01))
+    col = floor(lng / lng_step)
+
+    return row, col
+
+
+def cell_margin_km(cell_km=SEARCH_CACHE_CELL_KM):
+    """Farthest two points of one cell can be apart (the cell diagonal)"""
+    return cell_km * sqrt(2)
+
+
+def search_cache_key(lat, lng, radius, service_type, search_term, version):
+    """Cache key for /api/services/search"""
+    return ('search', quantize_location(lat, lng), radius, service_type, search_term, version)
+
+
+def get_catalog_version(db, scope=GLOBAL_SCOPE):
+    """
+    Read the current catalog version for a scope (0 if never bumped)
+
+    Always from the primary, whatever profile `db` carries: a version read
+    from a lagging secondary would serve entries or 304s a write already
+    invalidated.
+    """
+    doc = with_profile(db, 'read_primary')[CATALOG_VERSIONS].find_one({'_id': scope})
+    return doc['v'] if doc else 0
+
+
+def provider_scope(provider_id):
+    """Version scope covering one provider's services"""
+    return f'provider:{provider_id}'
+
+
+def district_scope(district_id):
+    """Version scope covering the services of one district (by gazetteer id)"""
+    return f'district:{district_id}'
+
+
+def service_scopes(service):
+    """Every version scope a change to this service invalidates"""
+    return [GLOBAL_SCOPE, provider_scope(service['providerId']), district_scope(service.get('districtId'))]
+
+
+def bump_catalog_version(db, scope=GLOBAL_SCOPE):
+    """Invalidate every cache entry built from the scope's previous version"""
+    db[CATALOG_VERSIONS].update_one({'_id': scope}, {'$inc': {'v': 1}}, upsert=True)
+
+
+def bump_catalog_versions(db, scopes):
+    """Bump several scopes in one round trip"""
+    scopes = list(dict.fromkeys(scopes))
+    if scopes:
+        db[CATALOG_VERSIONS].bulk_write(
+            [UpdateOne({'_id': scope}, {'$inc': {'v': 1}}, upsert=True) for scope in scopes],
+            ordered=False
+        )
+
+
+async def get_catalog_version_async(db, scope=GLOBAL_SCOPE):
+    """Async (motor) variant of get_catalog_version"""
+    doc = await with_profile(db, 'read_primary')[CATALOG_VERSIONS].find_one({'_id': scope})
+    return doc['v'] if doc else 0
+
+
+async def bump_catalog_version_async(db, scope=GLOBAL_SCOPE):
+    """Async (motor) variant of bump_catalog_version"""
+    await db[CATALOG_VERSIONS].update_one({'_id': scope}, {'$inc': {'v': 1}}, upsert=True)
+
+
+async def bump_catalog_versions_async(db, scopes):
+    """Async (motor) variant of bump_catalog_versions"""
+    scopes = list(dict.fromkeys(scopes))
+    if scopes:
+        await db[CATALOG_VERSIONS].bulk_write(
+            [UpdateOne({'_id': scope}, {'$inc': {'v': 1}}, upsert=True) for scope in scopes],
+            ordered=False
+        )
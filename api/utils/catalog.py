@@ -0,0 +1,69 @@
+"""
+Service catalog write hooks
+Handlers call these after writing a service so caches and in-process indexes
+derived from the catalog stay consistent with the database.
+"""
+from utils.cache import bump_catalog_versions, bump_catalog_versions_async, service_scopes
+from utils.spatial_index import get_spatial_index
+from utils.suggestions import (mark_districts_stale, service_suggestions_changed, service_suggestions_changed_async,
+                               service_suggestions_deleted, service_suggestions_deleted_async)
+
+
+def service_changed(db, service):
+    """A service was created or updated; `service` is its current document"""
+    services_changed(db, [service])
+
+
+def services_changed(db, services):
+    """Several services were created or updated in one batch"""
+    if not services:
+        return
+
+    bump_catalog_versions(db, [scope for service in services for scope in service_scopes(service)])
+
+    spatial_index = get_spatial_index(db)
+    if spatial_index is not None:
+        for service in services:
+            spatial_index.upsert(service)
+
+    if len(services) == 1:
+        service_suggestions_changed(db, services[0])
+    else:
+        mark_districts_stale(db, [service.get('districtId') for service in services])
+
+
+def service_slots_changed(db, service):
+    """A service's availability slots changed; suggestion lists do not carry slots"""
+    bump_catalog_versions(db, service_scopes(service))
+
+    spatial_index = get_spatial_index(db)
+    if spatial_index is not None:
+        spatial_index.upsert(service)
+
+
+def service_deleted(db, service):
+    """A service was deleted; `service` is its last known document"""
+    bump_catalog_versions(db, service_scopes(service))
+
+    spatial_index = get_spatial_index(db)
+    if spatial_index is not None:
+        spatial_index.remove(service['_id'])
+
+    service_suggestions_deleted(db, service)
+
+
+async def service_changed_async(db, service):
+    """Async (motor) variant of service_changed"""
+    await bump_catalog_versions_async(db, service_scopes(service))
+    await service_suggestions_changed_async(db, service)
+
+
+async def service_slots_changed_async(db, service):
+    """Async (motor) variant of service_slots_changed"""
+    await bump_catalog_versions_async(db, service_scopes(service))
+
+
+async def service_deleted_async(db, service):
+    """Async (motor) variant of service_deleted"""
+    await bump_catalog_versions_async(db, service_scopes(service))
+    await service_suggestions_deleted_async(db, service)
@@ -0,0 +1,106 @@
+"""
+Negotiated response compression
+Large responses are compressed with brotli (when installed) or gzip according
+to the client's Accept-Encoding. Small bodies are sent as-is because the
+framing overhead outweighs the savings on tiny payloads.
+"""
+import gzip
+import os
+
+from flask import request
+
+try:
+    from quart import request as quart_request
+    from quart.wrappers.response import DataBody
+    QUART_AVAILABLE = True
+except ImportError:
+    QUART_AVAILABLE = False
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+COMPRESS_MIN_BYTES = int(os.getenv('COMPRESS_MIN_BYTES', 1024))
+GZIP_LEVEL = int(os.getenv('GZIP_LEVEL', 6))
+BROTLI_QUALITY = int(os.getenv('BROTLI_QUALITY', 5))
+
+COMPRESSIBLE_MIMETYPES = ('application/json', 'application/x-ndjson', 'application/msgpack', 'text/plain')
+
+
+def _choose_encoding(accepted):
+    """Best encoding the client accepts (an Accept-Encoding header), or None"""
+    options = []
+    if BROTLI_AVAILABLE and accepted['br']:
+        options.append((accepted['br'], 1, 'br'))
+    if accepted['gzip']:
+        options.append((accepted['gzip'], 0, 'gzip'))
+    if not options:
+        return None
+    return max(options)[2]
+
+
+def _skip(response):
+    """True for responses never compressed, whatever their size"""
+    return (response.status_code != 200 or 'Content-Encoding' in response.headers or
+            response.mimetype not in COMPRESSIBLE_MIMETYPES)
+
+
+def _encode(response, body, encoding):
+    """Replace the body with its `encoding` form and label the response"""
+    if encoding == 'br':
+        response.set_data(brotli.compress(body, quality=BROTLI_QUALITY))
+    else:
+        response.set_data(gzip.compress(body, compresslevel=GZIP_LEVEL))
+    response.headers['Content-Encoding'] = encoding
+
+    # A strong ETag must differ between encodings of the same entity
+    etag = response.headers.get('ETag')
+    if etag and etag.endswith('"'):
+        response.headers['ETag'] = f'{etag[:-1]}-{encoding}"'
+
+
+def compress_response(response):
+    """after_request hook: compress the body if worthwhile and accepted"""
+    response.vary.add('Accept-Encoding')
+
+    if response.direct_passthrough or response.is_streamed or _skip(response):
+        return response
+
+    body = response.get_data()
+    if len(body) < COMPRESS_MIN_BYTES:
+        return response
+
+    encoding = _choose_encoding(request.accept_encodings)
+    if encoding is not None:
+        _encode(response, body, encoding)
+    return response
+
+
+async def compress_response_async(response):
+    """Async (Quart) variant of compress_response"""
+    response.vary.add('Accept-Encoding')
+
+    # Streamed and file bodies are not DataBody
+    if not isinstance(response.response, DataBody) or _skip(response):
+        return response
+
+    body = await response.get_data()
+    if len(body) < COMPRESS_MIN_BYTES:
+        return response
+
+    encoding = _choose_encoding(quart_request.accept_encodings)
+    if encoding is not None:
+        _encode(response, body, encoding)
+    return response
+
+
+def init_compression(app):
+    """Register response compression on a Flask app"""
+    app.after_request(compress_response)
+
+
+def init_compression_async(app):
+    """Register response compression on a Quart app"""
+    app.after_request(compress_response_async)
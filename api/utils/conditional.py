@@ -0,0 +1,52 @@
+"""
+Conditional GET support for catalog endpoints
+ETags are derived from catalog versions (see utils.cache), so a request whose
+If-None-Match still matches can be answered with 304 before any query runs.
+Works in both the Flask and the Quart (async) app.
+"""
+import hashlib
+
+from utils.json_provider import current_request, response_mimetype
+
+# Suffixes the compression layer appends to ETags of encoded representations
+ENCODING_SUFFIXES = ('-gzip', '-br')
+
+
+def make_etag(*parts):
+    """Strong ETag from the values that determine a response body"""
+    # JSON and MessagePack bodies of the same entity need distinct validators
+    parts = parts + (response_mimetype(),)
+    digest = hashlib.sha1('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+    return f'"{digest[:24]}"'
+
+
+def etag_matches(etag):
+    """True if the request's If-None-Match already names this representation"""
+    request = current_request()
+    header = request.headers.get('If-None-Match') if request is not None else None
+    if not header:
+        return False
+
+    if header.strip() == '*':
+        return True
+
+    for candidate in header.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        for suffix in ENCODING_SUFFIXES:
+            if candidate.endswith(suffix + '"'):
+                candidate = candidate[:-len(suffix) - 1] + '"'
+        if candidate == etag:
+            return True
+    return False
+
+
+def etag_headers(etag):
+    """Headers for a response validated by the given ETag"""
+    return {'ETag': etag, 'Cache-Control': 'private, no-cache', 'Vary': 'Accept'}
+
+
+def not_modified(etag):
+    """Empty 304 response carrying the ETag"""
+    return '', 304, etag_headers(etag)
@@ -1,11 +1,70 @@
 import os
-from pymongo import MongoClient
+from pymongo import MongoClient, ReadPreference, WriteConcern
+from pymongo.read_preferences import SecondaryPreferred
 from pymongo.errors import ConnectionFailure, ServerSelectionTimeoutError
 
+from utils.metrics import db_timing_listener, pool_wait_listener
+from utils.slow_queries import slow_query_listener
+
+try:
+    from motor.motor_asyncio import AsyncIOMotorClient
+    MOTOR_AVAILABLE = True
+except ImportError:
+    MOTOR_AVAILABLE = False
+
 # Global connection variables
 _client = None
 _db = None
 
+# Async (motor) connection variables, used by the asyncio serving mode
+_async_client = None
+_async_db = None
+
+# Connection pool defaults per deployment mode. Serverless instances serve one
+# request at a time and are frozen between invocations, so they keep a small
+# pool and let idle sockets go; a long-running server keeps warm connections.
+POOL_DEFAULTS = {
+    'serverless': {'maxPoolSize': 10, 'minPoolSize': 0, 'maxIdleTimeMS': 10000, 'waitQueueTimeoutMS': 2000},
+    'server': {'maxPoolSize': 100, 'minPoolSize': 5, 'maxIdleTimeMS': 300000, 'waitQueueTimeoutMS': 5000},
+}
+
+# Bounded staleness for secondary reads; MongoDB rejects values under 90 seconds
+READ_MAX_STALENESS_SECONDS = int(os.getenv('READ_MAX_STALENESS_SECONDS', 90))
+if READ_MAX_STALENESS_SECONDS < 90:
+    raise ValueError(f"READ_MAX_STALENESS_SECONDS must be at least 90, got {READ_MAX_STALENESS_SECONDS}")
+
+# Operation profiles handlers pick with get_db(profile); None keeps the client
+# settings (primary reads, majority writes)
+DB_PROFILES = {
+    # Search, suggestions and nearby: keep catalog reads off the primary
+    'read_secondary': {'read_preference': SecondaryPreferred(max_staleness=READ_MAX_STALENESS_SECONDS)},
+    # Reads that must see the caller's own writes
+    'read_primary': {'read_preference': ReadPreference.PRIMARY},
+    # Registration and service writes: survive a failover
+    'write_majority': {'write_concern': WriteConcern(w='majority')},
+    # Availability toggles: cheap, easily repeated, acknowledged by the primary only
+    'write_fast': {'write_concern': WriteConcern(w=1)},
+}
+
+# Wire compressors pymongo supports, and the module each one needs
+COMPRESSOR_MODULES = {'zstd': 'zstandard', 'snappy': 'snappy', 'zlib': 'zlib'}
+
+# Indexes used by the API routes: (collection, keys, extra options)
+INDEXES = [
+    ('services', [("location", "2dsphere")], {}),
+    ('services', [("location", "2dsphere"), ("available", 1), ("type", 1), ("effectivePrice", 1)], {}),
+    ('services', [("type", 1)], {}),
+    ('services', [("providerId", 1)], {}),
+    ('services', [("available", 1), ("type", 1), ("geoCells", 1)], {}),
+    ('services', [("updatedAt", 1)], {}),
+    ('services', [("districtId", 1), ("available", 1)], {}),
+    ('users', [("email", 1)], {'unique': True}),
+    ('users', [("geoCells", 1)], {}),
+    ('users', [("districtId", 1), ("role", 1)], {}),
+    ('suggestions', [("districtId", 1), ("villageId", 1)], {'unique': True}),
+    ('places', [("kind", 1), ("parent", 1), ("key", 1)], {'unique': True}),
+]
+
 # Load environment variables (for Vercel)
 try:
     from dotenv import load_dotenv
@@ -13,64 +72,44 @@ try:
 except:
     pass  # dotenv not available in Vercel, use env vars directly
 
-def get_db():
-    """Get database connection (lazy initialization for serverless)"""
+def get_db(profile=None):
+    """
+    Get database connection (lazy initialization for serverless)
+    
+    `profile` names an entry of DB_PROFILES to route the handler's reads and
+    writes; by default the client's primary/majority settings apply.
+    """
     global _client, _db
     
     if _db is not None:
         try:
             # Test connection
             _client.admin.command('ping')
-            return _db
+            return with_profile(_db, profile)
         except:
             # Connection lost, reconnect
             _client = None
             _db = None
     
-    # Get MongoDB URI from environment
-    MONGODB_URI = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/rural_services')
-    
-    if not MONGODB_URI or MONGODB_URI == 'mongodb://localhost:27017/rural_services':
-        print("Warning: MONGODB_URI not set, using default (will fail if not local MongoDB)")
+    MONGODB_URI = _get_mongodb_uri()
     
     try:
         # Create connection with SSL/TLS configuration for MongoDB Atlas
-        _client = MongoClient(
-            MONGODB_URI,
-            serverSelectionTimeoutMS=10000,  # 10 second timeout
-            connectTimeoutMS=10000,
-            tls=True,
-            tlsAllowInvalidCertificates=False,
-            retryWrites=True,
-            w='majority'
-        )
+        _client = MongoClient(MONGODB_URI, **_client_options())
         
         # Test connection
         _client.admin.command('ping')
         
         # Get database (extract from URI or use default)
-        if 'mongodb+srv://' in MONGODB_URI or 'mongodb://' in MONGODB_URI:
-            # Extract database name from URI or use default
-            if '/rural_services' in MONGODB_URI:
-                db_name = MONGODB_URI.split('/')[-1].split('?')[0]
-            else:
-                db_name = 'rural_services'
-            _db = _client[db_name]
-        else:
-            _db = _client.get_database()
+        db_name = _get_db_name(MONGODB_URI)
+        _db = _client[db_name] if db_name else _client.get_database()
+        slow_query_listener.attach(_db)  # explains and the slow_queries collection use this database
         
         # Create indexes (only if they don't exist - safe to call multiple times)
-        try:
-            _db.services.create_index([("location", "2dsphere")], background=True)
-            _db.services.create_index([("type", 1)], background=True)
-            _db.services.create_index([("providerId", 1)], background=True)
-            _db.users.create_index([("email", 1)], unique=True, background=True)
-        except Exception as idx_error:
-            # Index creation might fail if already exists, that's okay
-            print(f"Index creation note: {idx_error}")
+        _ensure_indexes(_db)
         
         print("✅ Connected to MongoDB successfully")
-        return _db
+        return with_profile(_db, profile)
         
     except (ConnectionFailure, ServerSelectionTimeoutError) as e:
         print(f"❌ Failed to connect to MongoDB: {e}")
@@ -80,3 +119,177 @@ def get_db():
         print(f"❌ Unexpected error connecting to MongoDB: {e}")
         return None
 
+
+async def get_async_db(profile=None):
+    """
+    Get async (motor) database connection for the asyncio serving mode
+    
+    Returns None if motor is not installed or the connection fails.
+    `profile` works as for get_db.
+    """
+    global _async_client, _async_db
+    
+    if not MOTOR_AVAILABLE:
+        print("❌ motor is not installed, async serving mode is unavailable")
+        return None
+    
+    if _async_db is not None:
+        return with_profile(_async_db, profile)
+    
+    MONGODB_URI = _get_mongodb_uri()
+    
+    try:
+        _async_client = AsyncIOMotorClient(MONGODB_URI, **_client_options())
+        await _async_client.admin.command('ping')
+        
+        db_name = _get_db_name(MONGODB_URI)
+        _async_db = _async_client[db_name] if db_name else _async_client.get_database()
+        # The slow-query log writes and explains from its own thread, so it
+        # gets the pymongo database motor wraps rather than the motor one
+        slow_query_listener.attach(_async_db.delegate)
+        print("✅ Slow query log attached to the async client's database")
+        
+        await _ensure_indexes_async(_async_db)
+        
+        print("✅ Connected to MongoDB (async) successfully")
+        return with_profile(_async_db, profile)
+        
+    except (ConnectionFailure, ServerSelectionTimeoutError) as e:
+        print(f"❌ Failed to connect to MongoDB (async): {e}")
+        _async_client = None
+        return None
+    except Exception as e:
+        print(f"❌ Unexpected error connecting to MongoDB (async): {e}")
+        _async_client = None
+        return None
+
+
+def with_profile(db, profile):
+    """The same database with a DB_PROFILES entry's read preference/write concern"""
+    if profile is None:
+        return db
+    if profile not in DB_PROFILES:
+        raise ValueError(f"Unknown database profile {profile!r}; choose from {', '.join(DB_PROFILES)}")
+    return db.with_options(**DB_PROFILES[profile])
+
+
+def _get_mongodb_uri():
+    """Read MongoDB URI from environment"""
+    MONGODB_URI = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/rural_services')
+    
+    if not MONGODB_URI or MONGODB_URI == 'mongodb://localhost:27017/rural_services':
+        print("Warning: MONGODB_URI not set, using default (will fail if not local MongoDB)")
+    
+    return MONGODB_URI
+
+
+def _client_options():
+    """Client options shared by the sync and async clients"""
+    return {
+        'serverSelectionTimeoutMS': 10000,  # 10 second timeout
+        'connectTimeoutMS': 10000,
+        'tls': os.getenv('MONGODB_TLS', 'true').lower() != 'false',  # false for a local mongod
+        'retryWrites': True,
+        'w': 'majority',
+        **_pool_options(),
+        # Per-request DB time for Server-Timing/metrics, pool waits, and the slow-query log
+        'event_listeners': [db_timing_listener, pool_wait_listener, slow_query_listener]
+    }
+
+
+def _deployment_mode():
+    """'serverless' on Vercel (or when DEPLOYMENT_MODE says so), else 'server'"""
+    mode = os.getenv('DEPLOYMENT_MODE', 'serverless' if os.getenv('VERCEL') else 'server').lower()
+    if mode not in POOL_DEFAULTS:
+        raise ValueError(f"DEPLOYMENT_MODE must be one of {', '.join(POOL_DEFAULTS)}, got {mode!r}")
+    return mode
+
+
+def _env_int(name, default, minimum=0):
+    """Read a non-negative integer setting, failing loudly on bad values"""
+    value = os.getenv(name)
+    if value is None or value == '':
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        raise ValueError(f"{name} must be an integer, got {value!r}")
+    if number < minimum:
+        raise ValueError(f"{name} must be >= {minimum}, got {number}")
+    return number
+
+
+def _compressors():
+    """Validated MONGODB_COMPRESSORS list, dropping codecs whose module is missing"""
+    value = os.getenv('MONGODB_COMPRESSORS')
+    names = [name.strip() for name in value.split(',') if name.strip()] if value else ['zstd', 'snappy', 'zlib']
+
+    unknown = [name for name in names if name not in COMPRESSOR_MODULES]
+    if unknown:
+        raise ValueError(f"MONGODB_COMPRESSORS: unknown compressor(s) {', '.join(unknown)}; "
+                         f"choose from {', '.join(COMPRESSOR_MODULES)}")
+
+    available = []
+    for name in names:
+        try:
+            __import__(COMPRESSOR_MODULES[name])
+            available.append(name)
+        except ImportError:
+            if value:
+                print(f"Warning: {name} compression needs the {COMPRESSOR_MODULES[name]} package, skipping it")
+    return available
+
+
+def _pool_options():
+    """Pool size, idle, wait queue, compression and app name settings from the environment"""
+    mode = _deployment_mode()
+    defaults = POOL_DEFAULTS[mode]
+
+    options = {
+        'maxPoolSize': _env_int('MONGODB_MAX_POOL_SIZE', defaults['maxPoolSize'], minimum=1),
+        'minPoolSize': _env_int('MONGODB_MIN_POOL_SIZE', defaults['minPoolSize']),
+        'maxIdleTimeMS': _env_int('MONGODB_MAX_IDLE_TIME_MS', defaults['maxIdleTimeMS']) or None,  # 0 = never
+        'waitQueueTimeoutMS': _env_int('MONGODB_WAIT_QUEUE_TIMEOUT_MS', defaults['waitQueueTimeoutMS']) or None,
+        'appname': os.getenv('MONGODB_APPNAME', f'ruralconnect-api-{mode}')[:128],
+    }
+    if options['minPoolSize'] > options['maxPoolSize']:
+        raise ValueError(f"MONGODB_MIN_POOL_SIZE ({options['minPoolSize']}) exceeds "
+                         f"MONGODB_MAX_POOL_SIZE ({options['maxPoolSize']})")
+
+    compressors = _compressors()
+    if compressors:
+        options['compressors'] = ','.join(compressors)
+    return options
+
+
+def _get_db_name(uri):
+    """Extract database name from URI, or None to use the client default"""
+    if 'mongodb+srv://' in uri or 'mongodb://' in uri:
+        # Extract database name from URI or use default
+        if '/rural_services' in uri:
+            return uri.split('/')[-1].split('?')[0]
+        return 'rural_services'
+    return None
+
+
+def _ensure_indexes(db):
+    """Create indexes used by the API routes; one failing index does not stop the rest"""
+    for collection, keys, options in INDEXES:
+        try:
+            db[collection].create_index(keys, background=True, **options)
+        except Exception as idx_error:
+            _index_failed(collection, keys, idx_error)
+
+
+async def _ensure_indexes_async(db):
+    """Async (motor) variant of _ensure_indexes"""
+    for collection, keys, options in INDEXES:
+        try:
+            await db[collection].create_index(keys, background=True, **options)
+        except Exception as idx_error:
+            _index_failed(collection, keys, idx_error)
+
+
+def _index_failed(collection, keys, error):
+    # Typically an existing index with the same keys and different options
+    print(f"⚠️ Index {collection} {keys} not created: {error}")
@@ -0,0 +1,114 @@
+"""
+Local embeddings of service descriptions
+A hashing vectorizer maps text to a fixed-size float32 vector with no model
+download and no network call: word unigrams, word bigrams and character
+trigrams are hashed (crc32, signed) into EMBEDDING_DIM buckets with
+sublinear term frequency, then L2-normalized, so a dot product is the cosine
+similarity.
+
+Each service stores its vector as packed little-endian float32 bytes in
+`descriptionVector`, written with the service and rebuilt offline by
+`python manage.py build-embeddings`. AI search stacks its candidates' vectors
+into one matrix and scores them against the embedded query. Uses NumPy for
+scoring when installed.
+"""
+import math
+import os
+import re
+import sys
+import zlib
+from array import array
+from collections import Counter
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+EMBEDDING_DIM = int(os.getenv('EMBEDDING_DIM', 256))
+# Bump when the features change so build-embeddings rewrites every vector
+EMBEDDING_VERSION = f'hash-v1-{EMBEDDING_DIM}'
+
+VECTOR_FIELDS = ('descriptionVector', 'descriptionVectorVersion')
+
+# Character trigrams catch inflections (harvest/harvesting) at a lower weight than whole words
+TRIGRAM_WEIGHT = 0.5
+BIGRAM_WEIGHT = 0.7
+
+_WORD = re.compile(r'\w+')
+
+
+def features(text):
+    """Weighted hashed-feature counts of a text"""
+    words = [word for word in _WORD.findall((text or '').casefold()) if len(word) > 1]
+    counts = Counter()
+    for word in words:
+        counts['w:' + word] += 1.0
+        padded = f'<{word}>'
+        for i in range(len(padded) - 2):
+            counts['c:' + padded[i:i + 3]] += TRIGRAM_WEIGHT
+    for first, second in zip(words, words[1:]):
+        counts[f'b:{first} {second}'] += BIGRAM_WEIGHT
+    return counts
+
+
+def feature_weight(count):
+    """Sublinear term frequency"""
+    return 1.0 + math.log(count) if count >= 1 else count
+
+
+def embed(text, dim=EMBEDDING_DIM):
+    """Unit-length float32 vector (array('f')) of a text; all zeros for empty text"""
+    vector = array('f', bytes(4 * dim))
+    for feature, count in features(text).items():
+        digest = zlib.crc32(feature.encode('utf-8'))
+        weight = feature_weight(count)
+        vector[digest % dim] += weight if digest & 0x80000000 else -weight
+
+    norm = math.sqrt(sum(value * value for value in vector))
+    if norm:
+        for i in range(dim):
+            vector[i] /= norm
+    return vector
+
+
+def pack(vector):
+    """Little-endian float32 bytes of a vector, as stored in descriptionVector"""
+    if sys.byteorder == 'big':
+        vector = array('f', vector)
+        vector.byteswap()
+    return vector.tobytes()
+
+
+def vector_fields(description):
+    """Fields to store with a service whose description is `description`"""
+    return {'descriptionVector': pack(embed(description)), 'descriptionVectorVersion': EMBEDDING_VERSION}
+
+
+def _stored_vector(service):
+    """The service's stored vector bytes, or a fresh embedding if missing or outdated"""
+    data = service.get('descriptionVector')
+    if data and service.get('descriptionVectorVersion') == EMBEDDING_VERSION:
+        return bytes(data)
+    return pack(embed(service.get('description', '')))
+
+
+def similarities(query, services):
+    """Cosine similarity of `query` text to each service's description, in input order"""
+    if not services:
+        return []
+    query_vector = embed(query)
+    blobs = [_stored_vector(service) for service in services]
+
+    if NUMPY_AVAILABLE:
+        matrix = np.frombuffer(b''.join(blobs), dtype='<f4').reshape(len(blobs), EMBEDDING_DIM)
+        return (matrix @ np.asarray(query_vector, dtype=np.float32)).tolist()
+
+    scores = []
+    for blob in blobs:
+        vector = array('f', blob)
+        if sys.byteorder == 'big':
+            vector.byteswap()
+        scores.append(sum(a * b for a, b in zip(vector, query_vector)))
+    return scores
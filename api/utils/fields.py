@@ -0,0 +1,66 @@
+"""
+Sparse fieldsets for list endpoints
+`?fields=_id,type,distance,pricePerHour` narrows both the Mongo projection and
+the serialized output. `_id` is always returned.
+"""
+
+# Response fields built from other stored fields
+FIELD_SOURCES = {
+    'providerName': ('providerId',),
+    'phone': ('providerId',),
+    'distance': ('location',),
+}
+
+# Stored fields no response shows; whole-document reads skip them unless required
+INTERNAL_FIELDS = ('descriptionVector', 'slots')
+
+# Stored for queries and indexes only; responses built from whole documents drop them
+STORAGE_FIELDS = ('villageId', 'districtId', 'geoCells', 'effectivePrice', 'updatedAt', 'slotsStart')
+
+# Provider fields needed for the providerName/phone response fields
+PROVIDER_PROJECTION = {'name': 1, 'phone': 1}
+
+
+def parse_fields(value):
+    """
+    Parse a fields parameter (comma-separated string or list) into a
+    frozenset, or None when every field is wanted
+    """
+    if not value:
+        return None
+    if isinstance(value, str):
+        value = value.split(',')
+
+    fields = {str(field).strip() for field in value if str(field).strip()}
+    if not fields:
+        return None
+
+    fields.add('_id')
+    return frozenset(fields)
+
+
+def projection_for(fields, required=()):
+    """
+    Mongo projection covering the requested fields plus fields the handler
+    itself needs; without fields, whole documents minus INTERNAL_FIELDS
+    """
+    if fields is None:
+        return {field: 0 for field in INTERNAL_FIELDS if field not in required} or None
+
+    projection = {}
+    for field in set(fields) | set(required):
+        for source in FIELD_SOURCES.get(field, (field,)):
+            projection[source] = 1
+    return projection
+
+
+def select_fields(doc, fields):
+    """Drop the keys the client did not ask for"""
+    if fields is None:
+        return doc
+    return {key: value for key, value in doc.items() if key in fields}
+
+
+def response_doc(doc):
+    """A just-written document as the create/register responses show it"""
+    return {key: value for key, value in doc.items() if key not in INTERNAL_FIELDS and key not in STORAGE_FIELDS}
@@ -0,0 +1,123 @@
+"""
+Gazetteer of village and district identifiers
+Village and district names are free text typed at registration. Each
+normalized name (case-folded, whitespace collapsed) gets a compact integer id
+in the `places` collection, resolved once when a user or service is written,
+so "Warangal" and "warangal " land in the same district. Villages are scoped
+to their district: the same village name in two districts gets two ids.
+
+Ids never change once assigned, so resolutions are cached per process.
+"""
+import re
+import threading
+import unicodedata
+
+from pymongo import ReadPreference, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+PLACES = 'places'
+COUNTERS = 'counters'
+PLACE_CACHE_SIZE = 100000
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def normalize_place(name):
+    """Canonical form of a place name used for matching"""
+    name = unicodedata.normalize('NFKC', name or '')
+    return re.sub(r'\s+', ' ', name).strip().casefold()
+
+
+def _cached(key):
+    with _cache_lock:
+        return _cache.get(key)
+
+
+def _remember(key, place_id):
+    with _cache_lock:
+        if len(_cache) >= PLACE_CACHE_SIZE:
+            _cache.clear()
+        _cache[key] = place_id
+    return place_id
+
+
+def reset_cache():
+    """Forget cached resolutions; call after dropping or replacing `places`"""
+    with _cache_lock:
+        _cache.clear()
+
+
+def _resolve(db, kind, parent, name):
+    key = normalize_place(name)
+    if not key:
+        return None
+    cache_key = (kind, parent, key)
+    place_id = _cached(cache_key)
+    if place_id is not None:
+        return place_id
+
+    place_filter = {'kind': kind, 'parent': parent, 'key': key}
+    place = db[PLACES].find_one(place_filter, {'_id': 1})
+    if place is None:
+        counter = db[COUNTERS].find_one_and_update(
+            {'_id': PLACES}, {'$inc': {'seq': 1}}, upsert=True, return_document=ReturnDocument.AFTER
+        )
+        try:
+            db[PLACES].insert_one({'_id': counter['seq'], **place_filter, 'name': name.strip()})
+            place = {'_id': counter['seq']}
+        except DuplicateKeyError:
+            # Another writer registered the same name first; its id wins and ours is skipped
+            place = db[PLACES].with_options(read_preference=ReadPreference.PRIMARY).find_one(place_filter, {'_id': 1})
+    return _remember(cache_key, place['_id'])
+
+
+async def _resolve_async(db, kind, parent, name):
+    key = normalize_place(name)
+    if not key:
+        return None
+    cache_key = (kind, parent, key)
+    place_id = _cached(cache_key)
+    if place_id is not None:
+        return place_id
+
+    place_filter = {'kind': kind, 'parent': parent, 'key': key}
+    place = await db[PLACES].find_one(place_filter, {'_id': 1})
+    if place is None:
+        counter = await db[COUNTERS].find_one_and_update(
+            {'_id': PLACES}, {'$inc': {'seq': 1}}, upsert=True, return_document=ReturnDocument.AFTER
+        )
+        try:
+            await db[PLACES].insert_one({'_id': counter['seq'], **place_filter, 'name': name.strip()})
+            place = {'_id': counter['seq']}
+        except DuplicateKeyError:
+            place = await db[PLACES].with_options(read_preference=ReadPreference.PRIMARY).find_one(place_filter, {'_id': 1})
+    return _remember(cache_key, place['_id'])
+
+
+def place_ids(db, village, district):
+    """{'villageId', 'districtId'} for a pair of names, registering new names"""
+    district_id = _resolve(db, 'district', None, district)
+    village_id = _resolve(db, 'village', district_id, village)
+    return {'villageId': village_id, 'districtId': district_id}
+
+
+async def place_ids_async(db, village, district):
+    """Async (motor) variant of place_ids"""
+    district_id = await _resolve_async(db, 'district', None, district)
+    village_id = await _resolve_async(db, 'village', district_id, village)
+    return {'villageId': village_id, 'districtId': district_id}
+
+
+def user_place_ids(db, user):
+    """A user's place ids, resolved from the names if the user predates the gazetteer"""
+    if user.get('districtId') is not None:
+        return {'villageId': user.get('villageId'), 'districtId': user['districtId']}
+    return place_ids(db, user.get('village', ''), user.get('district', ''))
+
+
+async def user_place_ids_async(db, user):
+    """Async (motor) variant of user_place_ids"""
+    if user.get('districtId') is not None:
+        return {'villageId': user.get('villageId'), 'districtId': user['districtId']}
+    return await place_ids_async(db, user.get('village', ''), user.get('district', ''))
@@ -0,0 +1,131 @@
+"""
+Geohash cells for indexed proximity lookups
+Services and users store the geohash of their location at several precisions
+in a `geoCells` array, so "everything near here" becomes an indexed equality
+match on a cell and its eight neighbours instead of a 2dsphere $near scan.
+"""
+import os
+from math import cos, radians
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+# Precisions stored on every document (approx. cell size at the equator):
+# 4 = 39 x 20 km, 5 = 4.9 x 4.9 km, 6 = 1.2 x 0.6 km, 7 = 153 x 153 m
+GEOCELL_PRECISIONS = (4, 5, 6, 7)
+
+# Largest search radius (km) answered from cells instead of $near; 0 disables.
+# Enable only after running `python manage.py backfill-geocells`.
+GEOCELL_SEARCH_MAX_KM = float(os.getenv('GEOCELL_SEARCH_MAX_KM', 0))
+
+KM_PER_DEGREE = 111.32
+
+
+def encode(lat, lng, precision):
+    """Geohash of a coordinate at the given precision"""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True  # even bits split longitude, odd bits latitude
+
+    while len(chars) < precision:
+        rng, value = (lng_range, lng) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        if value >= mid:
+            bits = (bits << 1) | 1
+            rng[0] = mid
+        else:
+            bits <<= 1
+            rng[1] = mid
+        even = not even
+
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(BASE32[bits])
+            bits = 0
+            bit_count = 0
+
+    return ''.join(chars)
+
+
+def decode(cell):
+    """Centre (lat, lng) of a geohash cell"""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    even = True
+
+    for char in cell:
+        bits = BASE32.index(char)
+        for shift in range(4, -1, -1):
+            rng = lng_range if even else lat_range
+            mid = (rng[0] + rng[1]) / 2
+            if (bits >> shift) & 1:
+                rng[0] = mid
+            else:
+                rng[1] = mid
+            even = not even
+
+    return (lat_range[0] + lat_range[1]) / 2, (lng_range[0] + lng_range[1]) / 2
+
+
+def cell_size_degrees(precision):
+    """(height, width) of a cell in degrees of latitude and longitude"""
+    total_bits = 5 * precision
+    lng_bits = (total_bits + 1) // 2
+    lat_bits = total_bits // 2
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lng_bits)
+
+
+def neighbors(cell):
+    """The eight cells surrounding a cell, at the same precision"""
+    lat, lng = decode(cell)
+    height, width = cell_size_degrees(len(cell))
+
+    result = []
+    for dlat in (-1, 0, 1):
+        for dlng in (-1, 0, 1):
+            if dlat == 0 and dlng == 0:
+                continue
+            n_lat = lat + dlat * height
+            if n_lat > 90 or n_lat < -90:
+                continue
+            n_lng = (lng + dlng * width + 180) % 360 - 180
+            result.append(encode(n_lat, n_lng, len(cell)))
+    return result
+
+
+def geo_cells(lat, lng):
+    """The `geoCells` value stored on a document at this location"""
+    finest = encode(lat, lng, max(GEOCELL_PRECISIONS))
+    return [finest[:precision] for precision in GEOCELL_PRECISIONS]
+
+
+def cells_for_radius(lat, lng, radius_km):
+    """
+    Cells (centre + neighbours) covering a circle of radius_km, using the
+    finest stored precision whose cell is at least radius_km on each side.
+    Returns None if the radius is too large for any stored precision.
+    """
+    for precision in sorted(GEOCELL_PRECISIONS, reverse=True):
+        height, width = cell_size_degrees(precision)
+        height_km = height * KM_PER_DEGREE
+        width_km = width * KM_PER_DEGREE * cos(radians(lat))
+        if height_km >= radius_km and width_km >= radius_km:
+            cell = encode(lat, lng, precision)
+            return [cell] + neighbors(cell)
+    return None
+
+
+def cell_query(lat, lng, radius_km):
+    """
+    Indexed filter matching every document within radius_km, or None when
+    the radius should go through $near instead
+    """
+    if radius_km > GEOCELL_SEARCH_MAX_KM:
+        return None
+
+    cells = cells_for_radius(lat, lng, radius_km)
+    if cells is None:
+        return None
+    return {'geoCells': {'$in': cells}}
@@ -1,4 +1,23 @@
-from math import radians, cos, sin, asin, sqrt
+from math import radians, cos, sin, asin, sqrt, isfinite
+from datetime import datetime
+
+from utils.embeddings import vector_fields, VECTOR_FIELDS
+from utils.fields import response_doc
+from utils.geohash import geo_cells
+
+# AI search keeps services priced up to this much over the customer's budget
+BUDGET_TOLERANCE = 200
+
+PRICE_FIELDS = ('pricePerHour', 'pricePerTrip')
+
+# Server-side twin of effective_price for pipeline updates and backfills
+EFFECTIVE_PRICE_EXPR = {
+    '$cond': [
+        {'$gt': [{'$ifNull': ['$pricePerHour', 0]}, 0]},
+        '$pricePerHour',
+        {'$ifNull': ['$pricePerTrip', 0]}
+    ]
+}
 
 def calculate_distance(lat1, lon1, lat2, lon2):
     """
@@ -23,7 +42,7 @@ def calculate_distance(lat1, lon1, lat2, lon2):
 def format_service_response(service, user_lat=None, user_lng=None):
     """Format service document for API response"""
     response = {
-        '_id': str(service['_id']),
+        '_id': service['_id'],
         'type': service.get('type', ''),
         'providerName': service.get('providerName', ''),
         'phone': service.get('phone', ''),
@@ -33,7 +52,7 @@ def format_service_response(service, user_lat=None, user_lng=None):
         'pricePerTrip': service.get('pricePerTrip'),
         'description': service.get('description', ''),
         'available': service.get('available', True),
-        'createdAt': service.get('createdAt', '').isoformat() if service.get('createdAt') else None
+        'createdAt': service.get('createdAt')
     }
     
     # Calculate distance if user location provided
@@ -49,3 +68,127 @@ def format_service_response(service, user_lat=None, user_lng=None):
     
     return response
 
+
+def nearest_services(services, user_lat, user_lng, max_distance_km, limit):
+    """
+    Keep services within max_distance_km of the user, nearest first
+    (the in-process equivalent of a $near query with $maxDistance and limit)
+    """
+    nearby = []
+    for service in services:
+        coordinates = service.get('location', {}).get('coordinates')
+        if not coordinates:
+            continue
+        distance = calculate_distance(user_lat, user_lng, coordinates[1], coordinates[0])
+        if distance <= max_distance_km:
+            nearby.append((distance, service))
+    
+    nearby.sort(key=lambda x: x[0])
+    return [service for _, service in nearby[:limit]]
+
+
+def effective_price(price_per_hour, price_per_trip):
+    """The price budget matching compares: hourly if set, else per trip, else 0"""
+    return price_per_hour or price_per_trip or 0
+
+
+def parse_price(value):
+    """
+    A price from request data as a number, or None when unset
+
+    Dashboard text inputs send prices as strings ('500', or '' when left
+    empty). Raises ValueError for anything that is not a non-negative number.
+    """
+    if value is None or (isinstance(value, str) and not value.strip()):
+        return None
+    if isinstance(value, bool):
+        raise ValueError('not a number')
+    try:
+        number = float(value)
+    except TypeError:
+        raise ValueError('not a number')
+    if not isfinite(number) or number < 0:
+        raise ValueError('not a non-negative number')
+    return int(number) if number.is_integer() else number
+
+
+def price_error(data):
+    """Error message for a price in request data that parse_price rejects, or None"""
+    for field in PRICE_FIELDS:
+        try:
+            parse_price(data.get(field))
+        except ValueError:
+            return f'{field} must be a non-negative number'
+    return None
+
+
+def budget_filter(budget):
+    """Query condition keeping services within BUDGET_TOLERANCE of the budget"""
+    return {'effectivePrice': {'$lte': budget + BUDGET_TOLERANCE}}
+
+
+def build_service_doc(data, provider):
+    """Build a new service document from request data for the given provider"""
+    now = datetime.utcnow()
+    price_per_hour = parse_price(data.get('pricePerHour'))
+    price_per_trip = parse_price(data.get('pricePerTrip'))
+    service_doc = {
+        'providerId': provider['_id'],
+        'type': data['type'],
+        'pricePerHour': price_per_hour,
+        'pricePerTrip': price_per_trip,
+        'effectivePrice': effective_price(price_per_hour, price_per_trip),
+        'description': data.get('description', ''),
+        'available': data.get('available', True),
+        'village': provider['village'],
+        'district': provider['district'],
+        'villageId': provider.get('villageId'),
+        'districtId': provider.get('districtId'),
+        'location': {
+            'type': 'Point',
+            'coordinates': [0, 0]
+        },
+        'createdAt': now,
+        'updatedAt': now
+    }
+    
+    if data.get('latitude') and data.get('longitude'):
+        lat = float(data['latitude'])
+        lng = float(data['longitude'])
+        service_doc['location']['coordinates'] = [lng, lat]
+        service_doc['geoCells'] = geo_cells(lat, lng)
+    
+    service_doc.update(vector_fields(service_doc['description']))
+    return service_doc
+
+
+def service_response_doc(service_doc):
+    """A stored service document without its description vector or storage-only fields"""
+    return {key: value for key, value in response_doc(service_doc).items() if key not in VECTOR_FIELDS}
+
+def build_service_update(data):
+    """Build the $set document for a service PATCH from request data"""
+    update_doc = {}
+    for field in ('available', 'pricePerHour', 'pricePerTrip', 'description'):
+        if field in data:
+            update_doc[field] = data[field]
+    for field in PRICE_FIELDS:
+        if field in update_doc:
+            update_doc[field] = parse_price(update_doc[field])
+    if 'description' in update_doc:
+        update_doc.update(vector_fields(update_doc['description']))
+    update_doc['updatedAt'] = datetime.utcnow()
+    return update_doc
+
+
+def service_update_pipeline(update_doc):
+    """
+    Update pipeline applying a build_service_update document
+
+    effectivePrice is recomputed from the stored prices, since a PATCH may
+    change only one of them.
+    """
+    return [
+        {'$set': {field: {'$literal': value} for field, value in update_doc.items()}},
+        {'$set': {'effectivePrice': EFFECTIVE_PRICE_EXPR}}
+    ]
@@ -0,0 +1,122 @@
+"""
+Fast JSON encoding for API responses
+Encodes ObjectId and datetime natively, so formatters can hand over raw
+Mongo values instead of building str()/isoformat() strings field by field.
+Uses orjson when installed and falls back to the standard library.
+Clients sending `Accept: application/msgpack` get the same payload packed as
+MessagePack (when msgpack is installed), encoded with the same value rules.
+"""
+import json
+from datetime import date, datetime
+
+from bson import ObjectId
+from flask import has_request_context, request
+from flask.json.provider import JSONProvider
+
+from utils.metrics import timed
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+try:
+    from quart import has_request_context as quart_has_request_context, request as quart_request
+    QUART_AVAILABLE = True
+except ImportError:
+    QUART_AVAILABLE = False
+
+JSON_MIMETYPE = 'application/json'
+MSGPACK_MIMETYPE = 'application/msgpack'
+MSGPACK_MIMETYPES = (MSGPACK_MIMETYPE, 'application/x-msgpack')
+
+if ORJSON_AVAILABLE:
+    ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY
+
+
+def json_default(value):
+    """Encode values the JSON encoders do not know natively"""
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def dumps_bytes(obj):
+    """Serialize to UTF-8 JSON bytes"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj, default=json_default, option=ORJSON_OPTIONS)
+    return json.dumps(obj, default=json_default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def packb(obj):
+    """Serialize to MessagePack bytes"""
+    return msgpack.packb(obj, default=json_default, use_bin_type=True)
+
+
+def current_request():
+    """The active Flask or Quart request, or None outside a request"""
+    if has_request_context():
+        return request
+    if QUART_AVAILABLE and quart_has_request_context():
+        return quart_request
+    return None
+
+
+def response_mimetype():
+    """
+    Representation negotiated from the request's Accept header
+    JSON stays the default, including for `*/*` and missing headers.
+    """
+    current = current_request()
+    if current is None or not MSGPACK_AVAILABLE:
+        return JSON_MIMETYPE
+
+    best = current.accept_mimetypes.best_match((JSON_MIMETYPE,) + MSGPACK_MIMETYPES)
+    return MSGPACK_MIMETYPE if best in MSGPACK_MIMETYPES else JSON_MIMETYPE
+
+
+def loads(data):
+    """Parse JSON from str or bytes"""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class FastJSONProvider(JSONProvider):
+    """
+    JSON provider for Flask (and Quart, which shares Flask's provider API)
+
+    Install with `app.json = FastJSONProvider(app)`; jsonify() then encodes
+    straight to bytes without an intermediate str, as JSON or MessagePack
+    depending on the request's Accept header.
+    """
+
+    mimetype = JSON_MIMETYPE
+
+    def dumps(self, obj, **kwargs):
+        return dumps_bytes(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        with timed('serialize'):
+            if response_mimetype() == MSGPACK_MIMETYPE:
+                mimetype, body = MSGPACK_MIMETYPE, packb(obj)
+            else:
+                mimetype, body = self.mimetype, dumps_bytes(obj)
+        response = self._app.response_class(body, mimetype=mimetype)
+        response.vary.add('Accept')
+        return response
@@ -0,0 +1,336 @@
+"""
+Per-request performance instrumentation
+Time spent in MongoDB commands, waiting for a pooled MongoDB connection, LLM
+calls, auth (bcrypt/JWT) and response serialization is attributed to the current request, returned to the client
+as a Server-Timing header and aggregated into per-route histograms served in
+Prometheus text format at /api/metrics.
+
+Both serving modes are covered: init_metrics registers the hooks on the
+Flask apps, init_metrics_async on the Quart app. Motor runs each command on
+an executor thread under a copy of the awaiting task's context, so the
+listeners below charge async requests too.
+"""
+import contextvars
+import hmac
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request
+from pymongo import monitoring
+
+try:
+    from quart import g as quart_g, request as quart_request
+    QUART_AVAILABLE = True
+except ImportError:
+    QUART_AVAILABLE = False
+
+COMPONENTS = ('db', 'pool', 'llm', 'auth', 'serialize')
+
+# When set, /api/metrics requires `Authorization: Bearer <METRICS_TOKEN>`.
+# Unset, the endpoint is open on a server but closed when serverless (Vercel).
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+METRICS_SERVERLESS = os.getenv('DEPLOYMENT_MODE', 'serverless' if os.getenv('VERCEL') else 'server').lower() == 'serverless'
+
+# Seconds; covers a cached search (~1 ms) up to a slow Gemini round trip
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+# Timings of the request being handled in this thread/context, if any
+_current = contextvars.ContextVar('request_timings', default=None)
+
+
+class RequestTimings:
+    """Accumulated time and call count per component for one request"""
+
+    def __init__(self):
+        self.seconds = dict.fromkeys(COMPONENTS, 0.0)
+        self.calls = dict.fromkeys(COMPONENTS, 0)
+
+    def add(self, component, seconds):
+        self.seconds[component] += seconds
+        self.calls[component] += 1
+
+
+def record(component, seconds):
+    """Charge `seconds` of `component` work to the current request, if any"""
+    timings = _current.get()
+    if timings is not None:
+        timings.add(component, seconds)
+
+
+@contextmanager
+def timed(component):
+    """Time a block as `component` work of the current request"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(component, time.perf_counter() - started)
+
+
+class DBTimingListener(monitoring.CommandListener):
+    """Charges every MongoDB command to the request that issued it"""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        record('db', event.duration_micros / 1e6)
+
+    def failed(self, event):
+        record('db', event.duration_micros / 1e6)
+
+
+db_timing_listener = DBTimingListener()
+
+
+class PoolWaitListener(monitoring.ConnectionPoolListener):
+    """
+    Measures how long each connection checkout waited for the pool
+
+    Checkouts are synchronous in the calling thread, so the start time is
+    kept per thread.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        self._finish()
+
+    def connection_check_out_failed(self, event):
+        self._finish()
+
+    def _finish(self):
+        started = getattr(self._local, 'started', None)
+        if started is None:
+            return
+        self._local.started = None
+        waited = time.perf_counter() - started
+        pool_checkout_wait.observe((), waited)
+        record('pool', waited)
+
+    def connection_checked_in(self, event):
+        pass
+
+    def connection_created(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        pass
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+
+pool_wait_listener = PoolWaitListener()
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by label values"""
+
+    def __init__(self, name, help_text, label_names, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            counts = series[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        """Prometheus text exposition lines"""
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for labels, (counts, total, count) in sorted(self._series.items()):
+                pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.label_names, labels)]
+                for bound, bucket_count in list(zip(self.buckets, counts)) + [('+Inf', count)]:
+                    bucket_labels = ','.join(pairs + [f'le="{bound}"'])
+                    lines.append(f'{self.name}_bucket{{{bucket_labels}}} {bucket_count}')
+                label_text = '{' + ','.join(pairs) + '}' if pairs else ''
+                lines.append(f'{self.name}_sum{label_text} {total}')
+                lines.append(f'{self.name}_count{label_text} {count}')
+        return lines
+
+
+class Counter:
+    """Monotonic counter keyed by label values"""
+
+    def __init__(self, name, help_text, label_names):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values = {}
+        self._lock = threading.Lock()
+        _counters.append(self)
+
+    def inc(self, labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        """Prometheus text exposition lines"""
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                pairs = ','.join(f'{name}="{_escape(label)}"' for name, label in zip(self.label_names, labels))
+                lines.append(f'{self.name}{{{pairs}}} {value}' if pairs else f'{self.name} {value}')
+        return lines
+
+
+# Counters defined by other modules (admission control, ...) register here
+_counters = []
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+request_duration = Histogram(
+    'http_request_duration_seconds', 'Request handling time',
+    ('route', 'method', 'status'), LATENCY_BUCKETS
+)
+component_duration = Histogram(
+    'http_request_component_seconds', 'Time per request spent in db, pool, llm, auth and serialize',
+    ('route', 'component'), LATENCY_BUCKETS
+)
+db_commands = Histogram(
+    'http_request_db_commands', 'MongoDB commands issued per request',
+    ('route',), COUNT_BUCKETS
+)
+pool_checkout_wait = Histogram(
+    'mongo_pool_checkout_wait_seconds', 'Time spent waiting to check a connection out of the pool',
+    (), LATENCY_BUCKETS
+)
+
+
+def _route(current):
+    return current.url_rule.rule if current.url_rule else 'unmatched'
+
+
+def _start(state):
+    state.request_started = time.perf_counter()
+    state.request_timings = RequestTimings()
+    _current.set(state.request_timings)
+
+
+def _finish(state, current, response):
+    timings = state.pop('request_timings', None)
+    if timings is None:
+        return response
+    total = time.perf_counter() - state.pop('request_started')
+
+    server_timing = []
+    for component in COMPONENTS:
+        if timings.calls[component]:
+            server_timing.append(f'{component};dur={timings.seconds[component] * 1000:.1f}')
+    server_timing.append(f'total;dur={total * 1000:.1f}')
+    response.headers['Server-Timing'] = ', '.join(server_timing)
+
+    route = _route(current)
+    if current.method != 'OPTIONS':
+        request_duration.observe((route, current.method, str(response.status_code)), total)
+        for component in COMPONENTS:
+            if timings.calls[component]:
+                component_duration.observe((route, component), timings.seconds[component])
+        db_commands.observe((route,), timings.calls['db'])
+
+    return response
+
+
+def start_request_timing():
+    """before_request hook"""
+    _start(g)
+
+
+def finish_request_timing(response):
+    """after_request hook: add Server-Timing and feed the histograms"""
+    return _finish(g, request, response)
+
+
+def stop_request_timing(exc=None):
+    """teardown_request hook: stop charging work to the finished request"""
+    _current.set(None)
+
+
+# Quart runs sync hooks on a worker thread, where setting _current would not
+# reach the handler, hence coroutine variants
+
+async def start_request_timing_async():
+    """Async (Quart) variant of start_request_timing"""
+    _start(quart_g)
+
+
+async def finish_request_timing_async(response):
+    """Async (Quart) variant of finish_request_timing"""
+    return _finish(quart_g, quart_request, response)
+
+
+async def stop_request_timing_async(exc=None):
+    """Async (Quart) variant of stop_request_timing"""
+    _current.set(None)
+
+
+def metrics_authorized():
+    """True if the request may read /api/metrics"""
+    if not METRICS_TOKEN:
+        return not METRICS_SERVERLESS
+    current = request if has_request_context() else quart_request
+    return hmac.compare_digest(current.headers.get('Authorization', ''), f'Bearer {METRICS_TOKEN}')
+
+
+def metrics_text():
+    """Every histogram in Prometheus text exposition format"""
+    lines = []
+    for histogram in (request_duration, component_duration, db_commands, pool_checkout_wait):
+        lines.extend(histogram.render())
+    for counter in _counters:
+        lines.extend(counter.render())
+    return '\n'.join(lines) + '\n'
+
+
+def init_metrics(app):
+    """
+    Register request timing on a Flask app
+
+    Call before init_compression so the timing hook runs last and the total
+    includes compression.
+    """
+    app.before_request(start_request_timing)
+    app.after_request(finish_request_timing)
+    app.teardown_request(stop_request_timing)
+
+
+def init_metrics_async(app):
+    """Register request timing on a Quart app"""
+    app.before_request(start_request_timing_async)
+    app.after_request(finish_request_timing_async)
+    app.teardown_request(stop_request_timing_async)
@@ -0,0 +1,117 @@
+"""
+Relevance ranking for AI search
+Every candidate is scored in one pass on signals in [0, 1]: distance
+(1 / (1 + km)), budget fit (1 - |price - budget| / budget), intent type
+match, availability and, when the query text is given, semantic similarity
+of the query to the service description (local embeddings, see
+utils/embeddings.py). The score is their weighted mean; weights come from
+RANK_WEIGHT_* and are normalized, so only their ratios matter.
+
+Uses NumPy when installed and falls back to a plain loop.
+"""
+import os
+
+from utils.embeddings import similarities
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+RANK_WEIGHTS = {
+    'distance': float(os.getenv('RANK_WEIGHT_DISTANCE', 0.45)),
+    'budget': float(os.getenv('RANK_WEIGHT_BUDGET', 0.3)),
+    'type': float(os.getenv('RANK_WEIGHT_TYPE', 0.15)),
+    'availability': float(os.getenv('RANK_WEIGHT_AVAILABILITY', 0.1)),
+    'semantic': float(os.getenv('RANK_WEIGHT_SEMANTIC', 0.2)),
+}
+
+# Results that get an LLM explanation, taken from the top of the ranking
+AI_EXPLAIN_TOP_K = int(os.getenv('AI_EXPLAIN_TOP_K', 5))
+
+# Budget fit of a service with no price: unknown, so neither rewarded nor excluded
+UNPRICED_BUDGET_SCORE = 0.5
+
+
+def _price(service):
+    return service.get('pricePerHour') or service.get('pricePerTrip') or 0
+
+
+def _weights(semantic):
+    weights = {signal: weight for signal, weight in RANK_WEIGHTS.items() if semantic or signal != 'semantic'}
+    total = sum(weights.values()) or 1.0
+    return {signal: weight / total for signal, weight in weights.items()}
+
+
+def score_candidates(services, intent, query=None, documents=None):
+    """
+    Relevance score (0-1) for each formatted service, in input order
+
+    `query` is the customer's own words; without it the semantic signal is
+    left out and the other weights are renormalized. `documents` are the
+    stored services the results were formatted from, for their description
+    vectors.
+    """
+    if not services:
+        return []
+    semantic = None
+    if query and RANK_WEIGHTS['semantic']:
+        semantic = similarities(query, documents if documents is not None else services)
+    weights = _weights(semantic is not None)
+    if not NUMPY_AVAILABLE:
+        return [_score_one(service, intent, weights, semantic[i] if semantic else None)
+                for i, service in enumerate(services)]
+
+    budget = intent.get('budget')
+    service_type = intent.get('serviceType')
+
+    distance = np.fromiter((service.get('distance', 10) for service in services), dtype=np.float64, count=len(services))
+    scores = weights['distance'] / (1.0 + distance)
+
+    if budget:
+        price = np.fromiter((_price(service) for service in services), dtype=np.float64, count=len(services))
+        budget_fit = np.clip(1.0 - np.abs(price - budget) / budget, 0.0, 1.0)
+        scores += weights['budget'] * np.where(price > 0, budget_fit, UNPRICED_BUDGET_SCORE)
+    else:
+        scores += weights['budget']
+
+    if service_type:
+        scores += weights['type'] * np.fromiter(
+            (service.get('type') == service_type for service in services), dtype=np.float64, count=len(services)
+        )
+    else:
+        scores += weights['type']
+
+    scores += weights['availability'] * np.fromiter(
+        (bool(service.get('available', True)) for service in services), dtype=np.float64, count=len(services)
+    )
+    if semantic is not None:
+        scores += weights['semantic'] * np.clip(np.asarray(semantic, dtype=np.float64), 0.0, 1.0)
+    return scores.round(2).tolist()
+
+
+def _score_one(service, intent, weights, semantic):
+    budget = intent.get('budget')
+    service_type = intent.get('serviceType')
+
+    score = weights['distance'] / (1.0 + service.get('distance', 10))
+    if budget:
+        price = _price(service)
+        budget_fit = max(0.0, min(1.0, 1.0 - abs(price - budget) / budget)) if price > 0 else UNPRICED_BUDGET_SCORE
+        score += weights['budget'] * budget_fit
+    else:
+        score += weights['budget']
+    score += weights['type'] * (service.get('type') == service_type if service_type else 1.0)
+    score += weights['availability'] * bool(service.get('available', True))
+    if semantic is not None:
+        score += weights['semantic'] * max(0.0, min(1.0, semantic))
+    return round(score, 2)
+
+
+def rank_results(services, intent, query=None, documents=None):
+    """Score every service, store it as relevanceScore and return them best first, nearer first on ties"""
+    scores = score_candidates(services, intent, query, documents)
+    for service, score in zip(services, scores):
+        service['relevanceScore'] = score
+    return sorted(services, key=lambda service: (-service['relevanceScore'], service.get('distance', float('inf'))))
@@ -0,0 +1,135 @@
+"""
+Single-flight coalescing of identical concurrent work
+When many callers ask for the same thing at once (the same ai-search query
+from one village, the same search cell after a cache expiry) the first
+caller runs the work and the others wait for its result instead of repeating
+the LLM call or the geo query.
+
+Followers wait at most SINGLEFLIGHT_TIMEOUT seconds and then do the work
+themselves. A leader's error is never handed to followers: they elect a new
+leader among themselves and try again.
+"""
+import asyncio
+import os
+import re
+import threading
+
+from utils.metrics import Counter
+
+SINGLEFLIGHT_TIMEOUT = float(os.getenv('SINGLEFLIGHT_TIMEOUT', 10))  # seconds a follower waits
+
+coalesced_calls = Counter(
+    'singleflight_calls_total', 'Coalesced work by role (leader, follower, timeout, retry)', ('group', 'role')
+)
+
+
+def normalize_query(text):
+    """Case- and whitespace-insensitive form of a free-text query"""
+    return re.sub(r'\s+', ' ', text.strip().lower())
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time; concurrent callers share its result"""
+
+    def __init__(self, name, timeout=SINGLEFLIGHT_TIMEOUT):
+        self.name = name
+        self.timeout = timeout
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn, retry=True):
+        """
+        Return fn()'s result, shared with concurrent callers using the same key
+
+        The result is shared, not copied: callers must treat it as read-only.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if leader:
+            coalesced_calls.inc((self.name, 'leader'))
+            try:
+                call.result = fn()
+                return call.result
+            except Exception as e:
+                call.error = e
+                raise
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+
+        if not call.done.wait(self.timeout):
+            coalesced_calls.inc((self.name, 'timeout'))
+            return fn()
+
+        if call.error is not None:
+            # The leader's failure may be its own (a timeout, a dropped socket); try again
+            coalesced_calls.inc((self.name, 'retry'))
+            return self.do(key, fn, retry=False) if retry else fn()
+
+        coalesced_calls.inc((self.name, 'follower'))
+        return call.result
+
+
+class AsyncSingleFlight:
+    """asyncio variant of SingleFlight for the async serving mode"""
+
+    def __init__(self, name, timeout=SINGLEFLIGHT_TIMEOUT):
+        self.name = name
+        self.timeout = timeout
+        self._calls = {}
+
+    async def do(self, key, fn, retry=True):
+        """Await fn() (a coroutine function), shared with concurrent callers using the same key"""
+        future = self._calls.get(key)
+        if future is None:
+            coalesced_calls.inc((self.name, 'leader'))
+            future = self._calls[key] = asyncio.get_running_loop().create_future()
+            try:
+                result = await fn()
+                future.set_result(result)
+                return result
+            except Exception as e:
+                future.set_exception(e)
+                raise
+            finally:
+                del self._calls[key]
+                if not future.done():
+                    # Cancelled leader: release the followers into their retry path
+                    future.set_exception(RuntimeError('single-flight leader cancelled'))
+                if future.done() and not future.cancelled():
+                    future.exception()  # mark retrieved even if nobody was waiting
+
+        try:
+            result = await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        except asyncio.TimeoutError:
+            coalesced_calls.inc((self.name, 'timeout'))
+            return await fn()
+        except Exception:
+            coalesced_calls.inc((self.name, 'retry'))
+            return await self.do(key, fn, retry=False) if retry else await fn()
+
+        coalesced_calls.inc((self.name, 'follower'))
+        return result
+
+
+# Shared groups for the request handlers
+intent_flight = SingleFlight('intent')
+explanation_flight = SingleFlight('explanation')
+candidates_flight = SingleFlight('ai_candidates')
+search_flight = SingleFlight('search')
+intent_flight_async = AsyncSingleFlight('intent')
+candidates_flight_async = AsyncSingleFlight('ai_candidates')
@@ -0,0 +1,186 @@
+"""
+Hourly availability slots
+Each service may store the hours its provider has marked free over a rolling
+horizon of SLOT_HORIZON_DAYS days: one bit per UTC hour, packed into
+`slots` (BinData, 42 bytes for 14 days). The bitmap is a ring: hour h
+(counted from the Unix epoch) lives at bit h % HORIZON_HOURS, bit 0 being
+the low bit of the first byte as in MongoDB's $bitsAllSet. `slotsStart` is
+the first hour the ring is valid for, the start of the UTC day it was last
+written, so it covers [slotsStart, slotsStart + HORIZON_HOURS).
+
+A window is (first hour, end hour), end exclusive. Search keeps services
+whose ring is valid for the whole window and has every window bit set; a
+service that never marked slots matches no window.
+"""
+import os
+from datetime import datetime, timezone
+
+from bson import Binary
+from pymongo import ReturnDocument
+
+SLOT_HORIZON_DAYS = int(os.getenv('SLOT_HORIZON_DAYS', 14))
+HORIZON_HOURS = SLOT_HORIZON_DAYS * 24
+SLOT_BYTES = HORIZON_HOURS // 8
+
+SLOT_FIELDS = ('slots', 'slotsStart')
+
+# Concurrent markings of one service retry their compare-and-set this often
+MARK_ATTEMPTS = 5
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def parse_time(value):
+    """UTC naive datetime of an ISO 8601 string; naive input is taken as UTC"""
+    moment = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+def hour_of(moment):
+    """Whole hours from the epoch to a UTC naive datetime, rounded down"""
+    return int((moment - _EPOCH).total_seconds() // 3600)
+
+
+def hour_datetime(hour):
+    """UTC naive datetime at the start of an hour"""
+    return datetime.utcfromtimestamp(hour * 3600)
+
+
+def horizon_start(now=None):
+    """First hour of the current UTC day, where a ring written now starts"""
+    hour = hour_of(now or datetime.utcnow())
+    return hour - hour % 24
+
+
+def parse_window(start, end, now=None):
+    """
+    (first, end) hours covering the requested times, for search and marking
+
+    The start is rounded down and the end up to whole hours. Raises
+    ValueError unless the window is non-empty, starts no earlier than the
+    current hour and ends within the horizon.
+    """
+    now = now or datetime.utcnow()
+    end_moment = parse_time(end)
+    first = hour_of(parse_time(start))
+    last = hour_of(end_moment) + (end_moment > hour_datetime(hour_of(end_moment)))
+    if last <= first:
+        raise ValueError('end must be after start')
+    if first < hour_of(now):
+        raise ValueError('start must not be in the past')
+    if last > horizon_start(now) + HORIZON_HOURS:
+        raise ValueError(f'window must end within {SLOT_HORIZON_DAYS} days')
+    return first, last
+
+
+def window_bits(window):
+    """Ring bit positions of a window's hours"""
+    first, end = window
+    return [hour % HORIZON_HOURS for hour in range(first, end)]
+
+
+def window_mask(window):
+    """The window's ring bits as an int, for checking many bitmaps"""
+    mask = 0
+    for bit in window_bits(window):
+        mask |= 1 << bit
+    return mask
+
+
+def window_filter(window):
+    """Query condition keeping services free for the whole window"""
+    return {
+        'slotsStart': {'$gte': window[1] - HORIZON_HOURS},
+        'slots': {'$bitsAllSet': window_bits(window)}
+    }
+
+
+def is_free(slots, slots_start, window, mask):
+    """In-process twin of window_filter; `mask` is window_mask(window)"""
+    if not slots or slots_start is None or slots_start < window[1] - HORIZON_HOURS:
+        return False
+    return int.from_bytes(slots, 'little') & mask == mask
+
+
+def _advance(slots, slots_start, start):
+    """The ring as an int re-anchored at `start`, hours before it cleared"""
+    if not slots or slots_start is None or start - slots_start >= HORIZON_HOURS:
+        return 0
+    bits = int.from_bytes(slots, 'little')
+    for hour in range(slots_start, start):
+        bits &= ~(1 << hour % HORIZON_HOURS)
+    return bits
+
+
+def mark(slots, slots_start, window, free, now=None):
+    """
+    (slots, slotsStart) after marking a window's hours free or not free
+
+    Hours the old ring covered before today are cleared first, since their
+    bits now stand for hours at the far end of the horizon.
+    """
+    start = max(horizon_start(now), slots_start or 0)
+    bits = _advance(slots, slots_start, start)
+    mask = window_mask(window)
+    bits = bits | mask if free else bits & ~mask
+    return bits.to_bytes(SLOT_BYTES, 'little'), start
+
+
+def free_windows(slots, slots_start, now=None):
+    """Free [start, end) datetime pairs from the current hour to the end of the horizon"""
+    now = now or datetime.utcnow()
+    start = horizon_start(now)
+    bits = _advance(slots, slots_start, start)
+
+    windows = []
+    run = None
+    for hour in range(hour_of(now), start + HORIZON_HOURS):
+        if bits >> hour % HORIZON_HOURS & 1:
+            run = run if run is not None else hour
+        elif run is not None:
+            windows.append((hour_datetime(run), hour_datetime(hour)))
+            run = None
+    if run is not None:
+        windows.append((hour_datetime(run), hour_datetime(start + HORIZON_HOURS)))
+    return windows
+
+
+def _marked_update(service, window, free):
+    """Compare-and-set filter and update applying a marking to a read of the service"""
+    slots, start = mark(service.get('slots'), service.get('slotsStart'), window, free)
+    current = {field: service.get(field) for field in SLOT_FIELDS}
+    update = {'$set': {'slots': Binary(slots), 'slotsStart': start, 'updatedAt': datetime.utcnow()}}
+    return {'_id': service['_id'], **current}, update
+
+
+def mark_slots(db, owned_filter, window, free):
+    """
+    Mark a window of an owned service free or not free
+
+    Returns the updated service, None if no service matches `owned_filter`,
+    or False when concurrent markings kept winning the compare-and-set.
+    """
+    for _ in range(MARK_ATTEMPTS):
+        service = db.services.find_one(owned_filter)
+        if not service:
+            return None
+        cas_filter, update = _marked_update(service, window, free)
+        updated = db.services.find_one_and_update(cas_filter, update, return_document=ReturnDocument.AFTER)
+        if updated:
+            return updated
+    return False
+
+
+async def mark_slots_async(db, owned_filter, window, free):
+    """Async (motor) variant of mark_slots"""
+    for _ in range(MARK_ATTEMPTS):
+        service = await db.services.find_one(owned_filter)
+        if not service:
+            return None
+        cas_filter, update = _marked_update(service, window, free)
+        updated = await db.services.find_one_and_update(cas_filter, update, return_document=ReturnDocument.AFTER)
+        if updated:
+            return updated
+    return False
@@ -0,0 +1,240 @@
+"""
+Slow-query log
+A pymongo CommandListener records every command slower than SLOW_QUERY_MS:
+its shape (literal values replaced by '?'), collection, duration and the
+route that issued it. A sample of slow reads is re-run through explain to
+flag collection scans and plans that examine many documents per result; the
+stored plan keeps stage and index names only, no index bounds or filters.
+Explains and writes happen on a background thread, never in the request.
+
+Records go to a capped `slow_queries` collection, or to a rotating file when
+SLOW_QUERY_LOG_FILE is set. Both serving modes are logged: the async app
+attaches the pymongo database behind its motor client.
+"""
+import hashlib
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+
+from pymongo import monitoring
+from pymongo.errors import CollectionInvalid
+
+from utils.json_provider import current_request
+
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', 100))  # negative disables the log
+SLOW_QUERY_EXPLAIN_RATE = float(os.getenv('SLOW_QUERY_EXPLAIN_RATE', 0.1))  # share of slow reads explained
+SLOW_QUERY_EXPLAIN_INTERVAL = float(os.getenv('SLOW_QUERY_EXPLAIN_INTERVAL', 600))  # seconds per shape
+SLOW_QUERY_EXAMINED_WARN = int(os.getenv('SLOW_QUERY_EXAMINED_WARN', 1000))  # docs examined to flag
+SLOW_QUERY_LOG_FILE = os.getenv('SLOW_QUERY_LOG_FILE', '')
+SLOW_QUERY_CAPPED_BYTES = int(os.getenv('SLOW_QUERY_CAPPED_BYTES', 16 * 1024 * 1024))
+
+SLOW_QUERIES = 'slow_queries'
+QUEUE_SIZE = 1000
+
+# Handshake/session chatter, and our own explains
+IGNORED_COMMANDS = {'hello', 'ismaster', 'isMaster', 'ping', 'saslStart', 'saslContinue', 'endSessions', 'explain'}
+# Driver-added fields that say nothing about the query
+META_FIELDS = {'lsid', '$db', '$clusterTime', '$readPreference', 'txnNumber', 'readConcern', 'writeConcern',
+               'autocommit', 'startTransaction', 'apiVersion', 'apiStrict', 'apiDeprecationErrors'}
+EXPLAINABLE_COMMANDS = {'find', 'aggregate', 'count', 'distinct'}
+# Plan fields kept in the log: they name stages and indexes, never query values
+PLAN_FIELDS = ('stage', 'indexName', 'keyPattern', 'direction', 'isMultiKey', 'shardName')
+# Plan fields holding child stages (classic, slot-based and sharded explain)
+PLAN_CHILDREN = ('queryPlan', 'inputStage', 'inputStages', 'innerStage', 'outerStage', 'thenStage', 'elseStage',
+                 'winningPlan', 'shards')
+
+
+def command_shape(value):
+    """Replace literal values with '?', keeping field names and operators"""
+    if isinstance(value, dict):
+        return {key: command_shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        # $in lists, pipelines and inserted documents vary in length but not in shape
+        return [command_shape(value[0])] if value else []
+    return '?'
+
+
+def _strip_meta(command):
+    return {key: value for key, value in command.items() if key not in META_FIELDS}
+
+
+def plan_shape(plan):
+    """
+    The stage tree of an explain plan without query values
+
+    indexBounds, filter and parsedQuery carry the literal values searched
+    for (emails, coordinates, prices), so only PLAN_FIELDS survive.
+    """
+    if isinstance(plan, list):
+        return [plan_shape(item) for item in plan]
+    if not isinstance(plan, dict):
+        return None
+
+    shape = {field: plan[field] for field in PLAN_FIELDS if field in plan}
+    for field in PLAN_CHILDREN:
+        if field in plan:
+            shape[field] = plan_shape(plan[field])
+    return shape
+
+
+def _summarize_explain(explain):
+    """Flags worth alerting on from executionStats explain output"""
+    planner = explain.get('queryPlanner', {})
+    stats = explain.get('executionStats', {})
+    winning_plan = plan_shape(planner.get('winningPlan', {}))
+    plan_text = json.dumps(winning_plan, default=str)
+
+    examined = stats.get('totalDocsExamined', 0)
+    returned = stats.get('nReturned', 0)
+    return {
+        'collscan': 'COLLSCAN' in plan_text,
+        'docsExamined': examined,
+        'keysExamined': stats.get('totalKeysExamined', 0),
+        'nReturned': returned,
+        'manyExamined': examined >= SLOW_QUERY_EXAMINED_WARN and examined > 10 * max(returned, 1),
+        'winningPlan': winning_plan
+    }
+
+
+class SlowQueryListener(monitoring.CommandListener):
+    """Collects slow commands; see the module docstring"""
+
+    def __init__(self):
+        self._db = None
+        self._in_flight = {}
+        self._explained = {}
+        self._queue = queue.Queue(maxsize=QUEUE_SIZE)
+        self._worker = None
+        self._lock = threading.Lock()
+        self._file_logger = None
+        self._capped_ready = False
+        self.dropped = 0
+
+    def attach(self, db):
+        """Use this database for explains and the capped collection"""
+        self._db = db
+
+    # -- listener callbacks (request thread) --
+
+    def started(self, event):
+        if SLOW_QUERY_MS < 0 or event.command_name in IGNORED_COMMANDS:
+            return
+        if event.command.get(event.command_name) == SLOW_QUERIES:
+            return
+        # Motor runs commands under a copy of the task's context, so Quart requests resolve too
+        current = current_request()
+        route = current.url_rule.rule if current is not None and current.url_rule else None
+        self._in_flight[(event.connection_id, event.request_id)] = (event.command, route)
+
+    def succeeded(self, event):
+        self._finish(event, None)
+
+    def failed(self, event):
+        # codeName, not errmsg: a duplicate key message quotes the key's value
+        self._finish(event, str(event.failure.get('codeName') or event.failure.get('code') or 'failed'))
+
+    def _finish(self, event, error):
+        entry = self._in_flight.pop((event.connection_id, event.request_id), None)
+        if entry is None:
+            return
+
+        duration_ms = event.duration_micros / 1000
+        if duration_ms < SLOW_QUERY_MS:
+            return
+
+        command, route = entry
+        command = _strip_meta(command)
+        shape = command_shape(command)
+        shape[event.command_name] = command.get(event.command_name)  # keep the collection name
+        shape_hash = hashlib.sha1(json.dumps(shape, sort_keys=True, default=str).encode('utf-8')).hexdigest()[:16]
+
+        record = {
+            'ts': datetime.utcnow(),
+            'db': event.database_name,
+            'command': event.command_name,
+            'collection': command.get(event.command_name),
+            'shape': shape,
+            'shapeHash': shape_hash,
+            'durationMs': round(duration_ms, 2),
+            'route': route,
+        }
+        if error:
+            record['error'] = error
+
+        explain_command = None
+        if event.command_name in EXPLAINABLE_COMMANDS and self._should_explain(shape_hash):
+            explain_command = command
+
+        self._enqueue((record, explain_command))
+
+    def _should_explain(self, shape_hash):
+        if random.random() >= SLOW_QUERY_EXPLAIN_RATE:
+            return False
+        now = time.monotonic()
+        with self._lock:
+            if now - self._explained.get(shape_hash, -SLOW_QUERY_EXPLAIN_INTERVAL) < SLOW_QUERY_EXPLAIN_INTERVAL:
+                return False
+            self._explained[shape_hash] = now
+            return True
+
+    def _enqueue(self, job):
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name='slow-query-log', daemon=True)
+                self._worker.start()
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            self.dropped += 1
+
+    # -- background thread --
+
+    def _run(self):
+        while True:
+            record, explain_command = self._queue.get()
+            try:
+                if explain_command is not None and self._db is not None:
+                    explain = self._db.command({'explain': explain_command, 'verbosity': 'executionStats'})
+                    record['explain'] = _summarize_explain(explain)
+            except Exception as e:
+                record['explainError'] = str(e)
+            try:
+                self._write(record)
+            except Exception as e:
+                print(f"Slow query log write failed: {e}")
+
+    def _write(self, record):
+        if SLOW_QUERY_LOG_FILE:
+            if self._file_logger is None:
+                self._file_logger = _rotating_logger(SLOW_QUERY_LOG_FILE)
+            self._file_logger.info(json.dumps(record, default=str))
+            return
+
+        if self._db is None:
+            return
+        if not self._capped_ready:
+            try:
+                self._db.create_collection(SLOW_QUERIES, capped=True, size=SLOW_QUERY_CAPPED_BYTES)
+            except CollectionInvalid:
+                pass  # already created, possibly by another process
+            self._capped_ready = True
+        self._db[SLOW_QUERIES].insert_one(record)
+
+
+def _rotating_logger(path):
+    logger = logging.getLogger('slow_queries')
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    handler = RotatingFileHandler(path, maxBytes=10 * 1024 * 1024, backupCount=5)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(handler)
+    return logger
+
+
+slow_query_listener = SlowQueryListener()
@@ -0,0 +1,263 @@
+"""
+Optional in-process spatial index of available services
+A uniform lat/lng grid over compact parallel arrays, loaded from MongoDB at
+startup and kept fresh by a background thread that tails the services change
+stream (or polls an updatedAt high-water mark when change streams are not
+supported). Enable with SPATIAL_INDEX=1 on long-running servers; it is off by
+default because serverless instances do not keep background threads alive.
+"""
+import os
+import threading
+import time
+from array import array
+from math import ceil, cos, floor, radians
+
+from bson import ObjectId
+from pymongo.errors import OperationFailure, PyMongoError
+
+from utils.helpers import calculate_distance
+from utils.slots import SLOT_BYTES, is_free, window_mask
+
+SPATIAL_INDEX_ENABLED = os.getenv('SPATIAL_INDEX', '0') == '1'
+SPATIAL_INDEX_CELL_KM = float(os.getenv('SPATIAL_INDEX_CELL_KM', 5))
+SPATIAL_INDEX_POLL_SECONDS = float(os.getenv('SPATIAL_INDEX_POLL_SECONDS', 5))
+# Polling cannot see deletes from other processes, so reload in full periodically
+SPATIAL_INDEX_RELOAD_SECONDS = float(os.getenv('SPATIAL_INDEX_RELOAD_SECONDS', 300))
+
+KM_PER_DEGREE = 111.32
+PROJECTION = {'location': 1, 'type': 1, 'available': 1, 'updatedAt': 1, 'slots': 1, 'slotsStart': 1}
+
+NO_SLOTS = bytes(SLOT_BYTES)
+
+
+class SpatialIndex:
+    """
+    Uniform grid of service locations
+
+    Rows live in parallel arrays (lat, lng, type code, 12-byte id, alive flag,
+    availability slot bitmap and its start hour, see utils/slots.py); each
+    grid cell holds an array of row numbers. Removed rows are tombstoned
+    and reclaimed when the index is compacted.
+    """
+
+    def __init__(self, cell_km=SPATIAL_INDEX_CELL_KM):
+        self.cell_deg = cell_km / KM_PER_DEGREE
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self.lats = array('d')
+        self.lngs = array('d')
+        self.type_codes = array('H')
+        self.ids = bytearray()
+        self.alive = bytearray()
+        self.slots = bytearray()
+        self.slot_starts = array('q')
+        self.types = []          # type code -> type name
+        self._type_codes = {}    # type name -> type code
+        self._rows = {}          # 12-byte id -> row number
+        self._grid = {}          # (row, col) cell -> array of row numbers
+        self.dead = 0
+
+    def __len__(self):
+        return len(self._rows)
+
+    def _cell(self, lat, lng):
+        return floor(lat / self.cell_deg), floor(lng / self.cell_deg)
+
+    def _type_code(self, service_type):
+        code = self._type_codes.get(service_type)
+        if code is None:
+            code = len(self.types)
+            self.types.append(service_type)
+            self._type_codes[service_type] = code
+        return code
+
+    def upsert(self, service):
+        """Add or move a service document; unavailable services are removed"""
+        coordinates = (service.get('location') or {}).get('coordinates')
+        if not service.get('available', True) or not coordinates or coordinates == [0, 0]:
+            self.remove(service['_id'])
+            return
+
+        lng, lat = float(coordinates[0]), float(coordinates[1])
+        with self._lock:
+            self.remove(service['_id'])
+
+            row = len(self.lats)
+            key = ObjectId(service['_id']).binary
+            self.lats.append(lat)
+            self.lngs.append(lng)
+            self.type_codes.append(self._type_code(service.get('type', '')))
+            self.ids.extend(key)
+            self.alive.append(1)
+            slots = service.get('slots')
+            has_slots = slots is not None and len(slots) == SLOT_BYTES and service.get('slotsStart') is not None
+            self.slots.extend(bytes(slots) if has_slots else NO_SLOTS)
+            self.slot_starts.append(service['slotsStart'] if has_slots else -1)
+            self._rows[key] = row
+            self._grid.setdefault(self._cell(lat, lng), array('I')).append(row)
+
+    def remove(self, service_id):
+        """Tombstone a service; compacts once a quarter of the rows are dead"""
+        with self._lock:
+            row = self._rows.pop(ObjectId(service_id).binary, None)
+            if row is None:
+                return
+            self.alive[row] = 0
+            self.dead += 1
+            if self.dead > 1000 and self.dead * 4 > len(self.alive):
+                self._compact()
+
+    def _compact(self):
+        """Rebuild arrays and grid without tombstoned rows"""
+        lats, lngs, type_codes, ids = self.lats, self.lngs, self.type_codes, self.ids
+        slots, slot_starts = self.slots, self.slot_starts
+        live = [row for row in range(len(lats)) if self.alive[row]]
+        types = self.types
+
+        self._reset()
+        for row in live:
+            self.upsert({
+                '_id': ObjectId(bytes(ids[row * 12:(row + 1) * 12])),
+                'type': types[type_codes[row]],
+                'location': {'coordinates': [lngs[row], lats[row]]},
+                'slots': bytes(slots[row * SLOT_BYTES:(row + 1) * SLOT_BYTES]),
+                'slotsStart': slot_starts[row] if slot_starts[row] >= 0 else None
+            })
+
+    def load(self, services):
+        """Replace the index contents with the given service documents"""
+        with self._lock:
+            self._reset()
+            for service in services:
+                self.upsert(service)
+
+    def _free(self, row, window, mask):
+        start = self.slot_starts[row]
+        return start >= 0 and is_free(self.slots[row * SLOT_BYTES:(row + 1) * SLOT_BYTES], start, window, mask)
+
+    def _scan(self, lat, lng, cell_radius, type_code, window=None):
+        """Yield (distance, row) for live rows in the cells within cell_radius cells, free for window if given"""
+        mask = window_mask(window) if window else None
+        center_row, center_col = self._cell(lat, lng)
+        # Longitude degrees shrink with latitude: widen the column span to match
+        col_radius = ceil(cell_radius / max(cos(radians(lat)), 0.01))
+        for cell_row in range(center_row - cell_radius, center_row + cell_radius + 1):
+            for cell_col in range(center_col - col_radius, center_col + col_radius + 1):
+                rows = self._grid.get((cell_row, cell_col))
+                if not rows:
+                    continue
+                for row in rows:
+                    if not self.alive[row]:
+                        continue
+                    if type_code is not None and self.type_codes[row] != type_code:
+                        continue
+                    if window and not self._free(row, window, mask):
+                        continue
+                    yield calculate_distance(lat, lng, self.lats[row], self.lngs[row]), row
+
+    def _hit(self, distance, row):
+        return distance, ObjectId(bytes(self.ids[row * 12:(row + 1) * 12]))
+
+    def radius_query(self, lat, lng, radius_km, service_type=None, limit=None, window=None):
+        """(distance_km, service_id) within radius_km, nearest first; only services free for the slot window if given"""
+        with self._lock:
+            type_code = self._type_codes.get(service_type) if service_type else None
+            if service_type and type_code is None:
+                return []
+
+            cell_radius = ceil(radius_km / (self.cell_deg * KM_PER_DEGREE))
+            hits = [(d, row) for d, row in self._scan(lat, lng, cell_radius, type_code, window) if d <= radius_km]
+            hits.sort()
+            if limit is not None:
+                hits = hits[:limit]
+            return [self._hit(d, row) for d, row in hits]
+
+    def nearest(self, lat, lng, k, service_type=None, max_km=None):
+        """The k nearest (distance_km, service_id), optionally within max_km"""
+        with self._lock:
+            type_code = self._type_codes.get(service_type) if service_type else None
+            if (service_type and type_code is None) or not self._rows:
+                return []
+
+            cell_km = self.cell_deg * KM_PER_DEGREE
+            cell_radius = 1
+            while True:
+                hits = sorted(self._scan(lat, lng, cell_radius, type_code))
+                covered_km = cell_radius * cell_km
+                # Rings within covered_km are complete; stop once the k-th hit is inside them
+                done = len(hits) >= k and hits[k - 1][0] <= covered_km
+                exhausted = (max_km is not None and covered_km >= max_km) or covered_km > 20000
+                if done or exhausted:
+                    if max_km is not None:
+                        hits = [hit for hit in hits if hit[0] <= max_km]
+                    return [self._hit(d, row) for d, row in hits[:k]]
+                cell_radius *= 2
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_spatial_index(db):
+    """
+    Return the process-wide index, loading it and starting the refresher on
+    first use. Returns None when the index is disabled.
+    """
+    global _index
+
+    if not SPATIAL_INDEX_ENABLED or db is None:
+        return None
+
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                index = SpatialIndex()
+                high_water = _full_load(db, index)
+                threading.Thread(
+                    target=_refresh_loop, args=(db, index, high_water), daemon=True, name='spatial-index'
+                ).start()
+                _index = index
+    return _index
+
+
+def _full_load(db, index):
+    """Load every available service; returns the newest updatedAt seen"""
+    started = time.perf_counter()
+    services = list(db.services.find({'available': True}, PROJECTION))
+    index.load(services)
+    print(f"Spatial index loaded {len(index)} services in {time.perf_counter() - started:.2f}s")
+    return max((s['updatedAt'] for s in services if s.get('updatedAt')), default=None)
+
+
+def _refresh_loop(db, index, high_water):
+    """Apply catalog changes to the index until the process exits"""
+    try:
+        with db.services.watch(full_document='updateLookup') as stream:
+            for change in stream:
+                if change['operationType'] == 'delete':
+                    index.remove(change['documentKey']['_id'])
+                elif change.get('fullDocument'):
+                    index.upsert(change['fullDocument'])
+    except OperationFailure as e:
+        # Standalone mongod: change streams need a replica set
+        print(f"Spatial index: change streams unavailable ({e}), polling updatedAt")
+    except PyMongoError as e:
+        print(f"Spatial index: change stream failed ({e}), polling updatedAt")
+
+    last_reload = time.monotonic()
+    while True:
+        time.sleep(SPATIAL_INDEX_POLL_SECONDS)
+        try:
+            if time.monotonic() - last_reload > SPATIAL_INDEX_RELOAD_SECONDS:
+                high_water = _full_load(db, index)
+                last_reload = time.monotonic()
+                continue
+
+            query = {'updatedAt': {'$gt': high_water}} if high_water else {'updatedAt': {'$exists': True}}
+            for service in db.services.find(query, PROJECTION).sort('updatedAt', 1):
+                index.upsert(service)
+                high_water = service['updatedAt']
+        except PyMongoError as e:
+            print(f"Spatial index refresh error: {e}")
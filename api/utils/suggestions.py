@@ -0,0 +1,241 @@
+"""
+Materialized suggestion lists
+One `suggestions` document per (villageId, districtId) holds two ranked tiers of
+available services with provider snapshots: `sameLocation` (the village
+itself) and `nearby` (the rest of the district), most recently updated
+first, at most SUGGESTIONS_PER_TIER each. The endpoint reads one document.
+
+Single service writes patch the district's documents in place, in both
+serving modes; bulk writes mark them stale. A stale or missing document is
+rebuilt on read, and `python manage.py rebuild-suggestions` rebuilds
+everything.
+"""
+import os
+from datetime import datetime
+
+from pymongo import UpdateOne
+
+from utils.db import with_profile
+
+SUGGESTIONS = 'suggestions'
+SUGGESTIONS_PER_TIER = int(os.getenv('SUGGESTIONS_PER_TIER', 50))
+TIERS = ('sameLocation', 'nearby')
+
+# Fields copied from the service into each entry
+ENTRY_FIELDS = ('type', 'village', 'district', 'villageId', 'districtId', 'pricePerHour', 'pricePerTrip',
+                'description', 'createdAt', 'updatedAt')
+SERVICE_PROJECTION = {field: 1 for field in ENTRY_FIELDS + ('providerId', 'available')}
+PROVIDER_PROJECTION = {'name': 1, 'phone': 1}
+
+
+def suggestion_entry(service, provider):
+    """Snapshot of a service and its provider as stored in a tier"""
+    entry = {'_id': service['_id'], 'providerId': service['providerId']}
+    for field in ENTRY_FIELDS:
+        entry[field] = service.get(field)
+    entry['providerName'] = provider.get('name', 'Unknown')
+    entry['phone'] = provider.get('phone', '')
+    return entry
+
+
+def _rank_key(entry):
+    return entry.get('updatedAt') or entry.get('createdAt') or datetime.min
+
+
+def _providers(db, services):
+    provider_ids = list({service['providerId'] for service in services})
+    return {provider['_id']: provider for provider in db.users.find({'_id': {'$in': provider_ids}}, PROVIDER_PROJECTION)}
+
+
+def _ranked_entries(services, providers):
+    entries = [suggestion_entry(service, providers[service['providerId']])
+               for service in services if service['providerId'] in providers]
+    entries.sort(key=_rank_key, reverse=True)
+    return entries
+
+
+def _district_entries(db, district_id):
+    """Every available service of a district as ranked entries"""
+    services = list(db.services.find({'available': True, 'districtId': district_id}, SERVICE_PROJECTION))
+    return _ranked_entries(services, _providers(db, services))
+
+
+async def _district_entries_async(db, district_id):
+    """Async (motor) variant of _district_entries"""
+    services = await db.services.find({'available': True, 'districtId': district_id}, SERVICE_PROJECTION).to_list(length=None)
+    provider_ids = list({service['providerId'] for service in services})
+    providers = await db.users.find({'_id': {'$in': provider_ids}}, PROVIDER_PROJECTION).to_list(length=None)
+    return _ranked_entries(services, {provider['_id']: provider for provider in providers})
+
+
+def _village_doc(village_id, district_id, entries, revision=0):
+    same_location = [entry for entry in entries if entry.get('villageId') == village_id]
+    nearby = [entry for entry in entries if entry.get('villageId') != village_id]
+    return {
+        'villageId': village_id,
+        'districtId': district_id,
+        'sameLocation': same_location[:SUGGESTIONS_PER_TIER],
+        'nearby': nearby[:SUGGESTIONS_PER_TIER],
+        # A removal from a truncated tier cannot be patched in place: the next entry is unknown
+        'truncated': {'sameLocation': len(same_location) > SUGGESTIONS_PER_TIER,
+                      'nearby': len(nearby) > SUGGESTIONS_PER_TIER},
+        'stale': False,
+        'revision': revision,
+        'builtAt': datetime.utcnow()
+    }
+
+
+def get_suggestions_doc(db, village_id, district_id):
+    """
+    The (villageId, districtId) document, rebuilt first if stale or missing
+
+    The document is read from the primary: its revision feeds the ETag, and
+    a lagging copy would answer 304 for a list a write already changed.
+    """
+    doc = with_profile(db, 'read_primary')[SUGGESTIONS].find_one({'districtId': district_id, 'villageId': village_id})
+    if doc is not None and not doc.get('stale'):
+        return doc
+
+    # Rebuild from the primary: a lagging secondary would be frozen in until the next write
+    revision = doc['revision'] + 1 if doc else 0
+    doc = _village_doc(village_id, district_id, _district_entries(with_profile(db, 'read_primary'), district_id), revision)
+    db[SUGGESTIONS].replace_one({'districtId': district_id, 'villageId': village_id}, doc, upsert=True)
+    return doc
+
+
+async def get_suggestions_doc_async(db, village_id, district_id):
+    """Async (motor) variant of get_suggestions_doc"""
+    doc = await with_profile(db, 'read_primary')[SUGGESTIONS].find_one({'districtId': district_id, 'villageId': village_id})
+    if doc is not None and not doc.get('stale'):
+        return doc
+
+    revision = doc['revision'] + 1 if doc else 0
+    entries = await _district_entries_async(with_profile(db, 'read_primary'), district_id)
+    doc = _village_doc(village_id, district_id, entries, revision)
+    await db[SUGGESTIONS].replace_one({'districtId': district_id, 'villageId': village_id}, doc, upsert=True)
+    return doc
+
+
+def rebuild_district(db, district_id, village_ids=()):
+    """Rebuild every document of a district (plus any extra villages); returns the count"""
+    entries = _district_entries(db, district_id)
+    existing = {doc['villageId']: doc.get('revision', 0)
+                for doc in db[SUGGESTIONS].find({'districtId': district_id}, {'villageId': 1, 'revision': 1})}
+    village_ids = set(village_ids) | set(existing) | {entry['villageId'] for entry in entries}
+
+    ops = [
+        UpdateOne(
+            {'districtId': district_id, 'villageId': village_id},
+            {'$set': _village_doc(village_id, district_id, entries, existing.get(village_id, -1) + 1)},
+            upsert=True
+        )
+        for village_id in village_ids
+    ]
+    if ops:
+        db[SUGGESTIONS].bulk_write(ops, ordered=False)
+    return len(ops)
+
+
+def _removal_updates(district_id, service_id):
+    """(filter, update) pairs taking a service out of every tier of a district"""
+    updates = [
+        # Its replacement was sliced away at build time: rebuild on next read
+        ({'districtId': district_id, f'{tier}._id': service_id, f'truncated.{tier}': True}, {'$set': {'stale': True}})
+        for tier in TIERS
+    ]
+    updates.append((
+        {'districtId': district_id, '$or': [{f'{tier}._id': service_id} for tier in TIERS]},
+        {'$pull': {tier: {'_id': service_id} for tier in TIERS}, '$inc': {'revision': 1}}
+    ))
+    return updates
+
+
+def _insertion_updates(service, entry):
+    """(filter, update) pairs pushing an entry into the tiers of its district"""
+    district_id = service.get('districtId')
+    village_id = service.get('villageId')
+    updates = []
+    for tier, village_filter in (('sameLocation', village_id), ('nearby', {'$ne': village_id})):
+        target = {'districtId': district_id, 'villageId': village_filter}
+        # Pushing into a full tier slices off its last entry
+        updates.append(({**target, f'{tier}.{SUGGESTIONS_PER_TIER - 1}': {'$exists': True}},
+                        {'$set': {f'truncated.{tier}': True}}))
+        updates.append((target, {
+            '$push': {tier: {'$each': [entry], '$sort': {'updatedAt': -1}, '$slice': SUGGESTIONS_PER_TIER}},
+            '$inc': {'revision': 1}
+        }))
+    return updates
+
+
+def service_suggestions_changed(db, service):
+    """
+    Patch the district's documents after one service was created or updated
+
+    `service` is the current document. It is removed from every tier, then
+    pushed back into the village's sameLocation tier and the other villages'
+    nearby tiers if still available.
+    """
+    collection = db[SUGGESTIONS]
+    for query, update in _removal_updates(service.get('districtId'), service['_id']):
+        collection.update_many(query, update)
+
+    if not service.get('available', True):
+        return
+
+    provider = db.users.find_one({'_id': service['providerId']}, PROVIDER_PROJECTION)
+    if provider is None:
+        return
+
+    full_service = service
+    if any(field not in service for field in ENTRY_FIELDS):
+        full_service = db.services.find_one({'_id': service['_id']}, SERVICE_PROJECTION) or service
+
+    for query, update in _insertion_updates(service, suggestion_entry(full_service, provider)):
+        collection.update_many(query, update)
+
+
+async def service_suggestions_changed_async(db, service):
+    """Async (motor) variant of service_suggestions_changed"""
+    collection = db[SUGGESTIONS]
+    for query, update in _removal_updates(service.get('districtId'), service['_id']):
+        await collection.update_many(query, update)
+
+    if not service.get('available', True):
+        return
+
+    provider = await db.users.find_one({'_id': service['providerId']}, PROVIDER_PROJECTION)
+    if provider is None:
+        return
+
+    full_service = service
+    if any(field not in service for field in ENTRY_FIELDS):
+        full_service = await db.services.find_one({'_id': service['_id']}, SERVICE_PROJECTION) or service
+
+    for query, update in _insertion_updates(service, suggestion_entry(full_service, provider)):
+        await collection.update_many(query, update)
+
+
+def service_suggestions_deleted(db, service):
+    """Patch the district's documents after one service was deleted"""
+    for query, update in _removal_updates(service.get('districtId'), service['_id']):
+        db[SUGGESTIONS].update_many(query, update)
+
+
+async def service_suggestions_deleted_async(db, service):
+    """Async (motor) variant of service_suggestions_deleted"""
+    for query, update in _removal_updates(service.get('districtId'), service['_id']):
+        await db[SUGGESTIONS].update_many(query, update)
+
+
+def mark_districts_stale(db, district_ids):
+    """Bulk writes: let readers rebuild the touched districts instead of patching"""
+    district_ids = list(set(district_ids))
+    if district_ids:
+        db[SUGGESTIONS].update_many({'districtId': {'$in': district_ids}}, {'$set': {'stale': True}, '$inc': {'revision': 1}})
+
+
+async def mark_districts_stale_async(db, district_ids):
+    """Async (motor) variant of mark_districts_stale"""
+    district_ids = list(set(district_ids))
+    if district_ids:
+        await db[SUGGESTIONS].update_many({'districtId': {'$in': district_ids}}, {'$set': {'stale': True}, '$inc': {'revision': 1}})